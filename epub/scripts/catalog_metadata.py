@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+批量提取整个书库的元数据,输出为 JSONL 或 SQLite 目录
+使用方法: python catalog_metadata.py <目录或文件>... [选项]
+
+选项:
+  --jobs N              并行工作进程数 (默认: CPU 核数)
+  --files-from FILE     从文件读取 EPUB 路径列表(每行一个, - 表示标准输入)
+  --jsonl FILE          将记录写入 JSONL 文件 (默认: 标准输出)
+  --sqlite FILE         将记录写入(更新)SQLite 目录
+  --incremental         增量刷新 SQLite 目录,只重新提取新增或修改过的书籍
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+
+from epub_zip import read_file_list
+from extract_metadata import extract_metadata
+
+
+# 每个工作进程一次领取的任务数,减少进程间通信次数
+CHUNK_SIZE = 64
+
+# SQLite 每写入多少条记录提交一次
+COMMIT_EVERY = 1000
+
+# 快速指纹读取文件头尾的字节数
+FINGERPRINT_BLOCK = 64 * 1024
+
+CATALOG_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS books (
+    file TEXT PRIMARY KEY,
+    title TEXT,
+    authors TEXT,
+    language TEXT,
+    publisher TEXT,
+    publish_date TEXT,
+    isbn TEXT,
+    description TEXT,
+    chapters_count INTEGER,
+    images_count INTEGER,
+    error TEXT,
+    record TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    fingerprint TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0
+)
+'''
+
+# 旧版目录缺少的列,打开时自动补齐
+FILE_STATE_COLUMNS = {
+    'size': 'INTEGER',
+    'mtime_ns': 'INTEGER',
+    'fingerprint': 'TEXT',
+    'deleted': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+
+def iter_epub_files(paths):
+    """展开目录,按稳定顺序产出所有 EPUB 文件路径"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.epub'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _central_directory_range(tail):
+    """从文件尾部块中找到 EOCD 记录,返回中央目录的 (偏移, 大小);找不到时返回 None"""
+    # EOCD 记录的固定部分为 22 字节,其后只有注释
+    pos = tail.rfind(b'PK\x05\x06', 0, max(len(tail) - 18, 0))
+    if pos < 0:
+        return None
+    cd_size, cd_offset = struct.unpack('<II', tail[pos + 12:pos + 20])
+    # ZIP64 的实际偏移记录在别处,这里只覆盖尾部块
+    if cd_offset == 0xFFFFFFFF or cd_size == 0xFFFFFFFF:
+        return None
+    return cd_offset, cd_size
+
+
+def file_fingerprint(path, size):
+    """计算文件的快速指纹:文件大小、头尾各 64KB 以及整个中央目录的哈希
+
+    ZIP 的中央目录记录了每个成员的 CRC 和大小,任何成员的变化都会反映在其中。
+    中央目录超出尾部块时,按 EOCD 记录的偏移补读其余部分;ZIP64 文件只哈希
+    头尾两块。中央目录完全落在尾部块内时,结果与只哈希头尾两块相同。
+    """
+    digest = hashlib.blake2b(str(size).encode('ascii'), digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BLOCK))
+        if size > FINGERPRINT_BLOCK:
+            tail_start = max(FINGERPRINT_BLOCK, size - FINGERPRINT_BLOCK)
+            f.seek(tail_start)
+            tail = f.read(FINGERPRINT_BLOCK)
+            digest.update(tail)
+
+            # 头尾两块之间的那部分中央目录
+            cd_range = _central_directory_range(tail)
+            if cd_range is not None:
+                cd_offset, cd_size = cd_range
+                start = max(cd_offset, FINGERPRINT_BLOCK)
+                end = min(cd_offset + cd_size, tail_start)
+                f.seek(start)
+                while start < end:
+                    block = f.read(min(FINGERPRINT_BLOCK, end - start))
+                    if not block:
+                        break
+                    digest.update(block)
+                    start += len(block)
+    return digest.hexdigest()
+
+
+def file_state(path):
+    """返回 (size, mtime_ns, fingerprint),文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns, file_fingerprint(path, st.st_size)
+    except OSError:
+        return None
+
+
+def catalog_record(epub_path):
+    """提取单本书的记录,出错时返回错误记录而不是抛出异常"""
+    try:
+        return extract_metadata(epub_path)
+    except Exception as e:
+        return {'file': epub_path, 'error': str(e)}
+
+
+def catalog_entry(epub_path, with_state=True):
+    """工作进程任务:返回 (记录, 文件状态);with_state 为 False 时文件状态为 None"""
+    return catalog_record(epub_path), file_state(epub_path) if with_state else None
+
+
+def iter_catalog_entries(epub_paths, jobs=None, with_state=True):
+    """按输入顺序产出每本书的 (记录, 文件状态)
+
+    jobs 为 1 或只有一本书时在当前进程中执行,否则分发到进程池。
+    文件状态(含快速指纹)只在 with_state 为 True 时计算。
+    """
+    if jobs == 1 or len(epub_paths) <= 1:
+        for epub_path in epub_paths:
+            yield catalog_entry(epub_path, with_state)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(partial(catalog_entry, with_state=with_state), epub_paths,
+                                chunksize=CHUNK_SIZE)
+
+
+def iter_catalog_records(epub_paths, jobs=None):
+    """按输入顺序产出每本书的记录"""
+    for record, _ in iter_catalog_entries(epub_paths, jobs=jobs, with_state=False):
+        yield record
+
+
+class JsonlWriter:
+    """逐行写出 JSON 记录"""
+
+    # 不需要文件状态,提取时跳过指纹计算
+    needs_state = False
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record, state=None):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.stream.flush()
+
+
+class SqliteWriter:
+    """以文件路径为主键写入(更新)SQLite 目录"""
+
+    # 记录文件状态,供之后的增量刷新比较
+    needs_state = True
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(CATALOG_SCHEMA)
+        existing = {row[1] for row in self.conn.execute('PRAGMA table_info(books)')}
+        for column, column_type in FILE_STATE_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f'ALTER TABLE books ADD COLUMN {column} {column_type}')
+        self.pending = 0
+
+    def write(self, record, state=None):
+        authors = record.get('authors')
+        size, mtime_ns, fingerprint = state if state else (None, None, None)
+        self.conn.execute(
+            '''INSERT INTO books (file, title, authors, language, publisher, publish_date,
+                                  isbn, description, chapters_count, images_count, error, record,
+                                  size, mtime_ns, fingerprint, deleted)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+               ON CONFLICT(file) DO UPDATE SET
+                   title = excluded.title,
+                   authors = excluded.authors,
+                   language = excluded.language,
+                   publisher = excluded.publisher,
+                   publish_date = excluded.publish_date,
+                   isbn = excluded.isbn,
+                   description = excluded.description,
+                   chapters_count = excluded.chapters_count,
+                   images_count = excluded.images_count,
+                   error = excluded.error,
+                   record = excluded.record,
+                   size = excluded.size,
+                   mtime_ns = excluded.mtime_ns,
+                   fingerprint = excluded.fingerprint,
+                   deleted = 0''',
+            (
+                record['file'],
+                record.get('title'),
+                json.dumps(authors, ensure_ascii=False) if authors is not None else None,
+                record.get('language'),
+                record.get('publisher'),
+                record.get('publish_date'),
+                record.get('isbn'),
+                record.get('description'),
+                record.get('chapters_count'),
+                record.get('images_count'),
+                record.get('error'),
+                json.dumps(record, ensure_ascii=False),
+                size,
+                mtime_ns,
+                fingerprint,
+            )
+        )
+        self._count_pending()
+
+    def load_states(self):
+        """读取目录中所有书籍的 {路径: (size, mtime_ns, fingerprint, deleted)}"""
+        rows = self.conn.execute('SELECT file, size, mtime_ns, fingerprint, deleted FROM books')
+        return {row[0]: row[1:] for row in rows}
+
+    def touch(self, file, state):
+        """内容未变时只更新文件状态"""
+        size, mtime_ns, fingerprint = state
+        self.conn.execute('UPDATE books SET size = ?, mtime_ns = ?, fingerprint = ? WHERE file = ?',
+                          (size, mtime_ns, fingerprint, file))
+        self._count_pending()
+
+    def tombstone(self, file):
+        """将已删除的书籍标记为删除,保留原有记录"""
+        self.conn.execute('UPDATE books SET deleted = 1 WHERE file = ?', (file,))
+        self._count_pending()
+
+    def _count_pending(self):
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def catalog_metadata(epub_paths, writers, jobs=None):
+    """批量提取元数据并写入所有 writer
+
+    参数:
+        epub_paths: EPUB 文件路径列表
+        writers: 具有 write(record) 方法的输出对象列表
+        jobs: 并行进程数, None 表示使用 CPU 核数
+
+    返回:
+        统计信息字典 {'total': ..., 'ok': ..., 'errors': ...}
+    """
+    stats = {'total': 0, 'ok': 0, 'errors': 0}
+    with_state = any(getattr(writer, 'needs_state', True) for writer in writers)
+
+    for record, state in iter_catalog_entries(epub_paths, jobs=jobs, with_state=with_state):
+        for writer in writers:
+            writer.write(record, state)
+        stats['total'] += 1
+        if 'error' in record:
+            stats['errors'] += 1
+            print(f"✗ {record['file']}: {record['error']}", file=sys.stderr)
+        else:
+            stats['ok'] += 1
+
+    return stats
+
+
+def _under_roots(path, roots):
+    """判断规范化后的路径是否位于本次扫描的某个目录或就是某个给定文件"""
+    return any(path == root or path.startswith(os.path.join(root, '')) for root in roots)
+
+
+def refresh_catalog(paths, writer, jobs=None):
+    """增量刷新 SQLite 目录
+
+    大小和 mtime 都未变的书籍直接跳过;变化了的先比较快速指纹,
+    指纹相同只更新文件状态,否则重新提取元数据。扫描范围内已不存在的
+    书籍会被标记为删除。
+
+    路径按 os.path.realpath 规范化后比较,lib/、./lib 和绝对路径指向同一本书
+    时共用目录中的同一行;已有的行保持原来记录的路径。
+
+    参数:
+        paths: 要扫描的文件或目录
+        writer: SqliteWriter 实例
+        jobs: 并行进程数, None 表示使用 CPU 核数
+
+    返回:
+        统计信息字典
+    """
+    stats = {'total': 0, 'unchanged': 0, 'touched': 0, 'extracted': 0,
+             'errors': 0, 'deleted': 0}
+    known = writer.load_states()
+    # 规范化路径 -> 目录中记录的路径
+    known_files = {os.path.realpath(file): file for file in known}
+    seen = set()
+    to_extract = []
+    catalog_files = []
+
+    for epub_path in iter_epub_files(paths):
+        real_path = os.path.realpath(epub_path)
+        file = known_files.get(real_path, epub_path)
+        previous = known.get(file)
+
+        try:
+            st = os.stat(epub_path)
+        except OSError:
+            # 已知的文件会在下面被标记为删除,未知的交给提取流程记录错误
+            if previous is None:
+                stats['total'] += 1
+                to_extract.append(epub_path)
+                catalog_files.append(file)
+            continue
+
+        seen.add(real_path)
+        stats['total'] += 1
+
+        if previous is not None and not previous[3]:
+            size, mtime_ns, fingerprint, _ = previous
+            if (size, mtime_ns) == (st.st_size, st.st_mtime_ns):
+                stats['unchanged'] += 1
+                continue
+            new_fingerprint = file_fingerprint(epub_path, st.st_size)
+            if size == st.st_size and fingerprint == new_fingerprint:
+                writer.touch(file, (st.st_size, st.st_mtime_ns, new_fingerprint))
+                stats['touched'] += 1
+                continue
+
+        to_extract.append(epub_path)
+        catalog_files.append(file)
+
+    entries = iter_catalog_entries(to_extract, jobs=jobs)
+    for file, (record, state) in zip(catalog_files, entries, strict=True):
+        # 按目录中已有的路径更新,不因写法不同而新增一行
+        record['file'] = file
+        writer.write(record, state)
+        stats['extracted'] += 1
+        if 'error' in record:
+            stats['errors'] += 1
+            print(f"✗ {record['file']}: {record['error']}", file=sys.stderr)
+
+    roots = [os.path.realpath(path) for path in paths]
+    for file, (_, _, _, deleted) in known.items():
+        real_path = os.path.realpath(file)
+        if not deleted and real_path not in seen and _under_roots(real_path, roots):
+            writer.tombstone(file)
+            stats['deleted'] += 1
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='批量提取书库中 EPUB 文件的元数据',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 扫描目录,输出 JSONL 到标准输出
+  python catalog_metadata.py library/ > catalog.jsonl
+
+  # 使用 16 个进程,写入 SQLite 目录
+  python catalog_metadata.py library/ --jobs 16 --sqlite catalog.db
+
+  # 从路径列表读取
+  find library -name '*.epub' | python catalog_metadata.py --files-from - --jsonl catalog.jsonl
+
+  # 每晚增量刷新:只处理新增和修改过的书籍,标记已删除的书籍
+  python catalog_metadata.py library/ --sqlite catalog.db --incremental
+        """
+    )
+
+    parser.add_argument('paths', nargs='*', help='EPUB 文件或目录')
+    parser.add_argument('--files-from', metavar='FILE',
+                        help='从文件读取 EPUB 路径列表 (- 表示标准输入)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='并行工作进程数 (默认: CPU 核数)')
+    parser.add_argument('--jsonl', metavar='FILE',
+                        help='JSONL 输出文件 (默认: 标准输出)')
+    parser.add_argument('--sqlite', metavar='FILE',
+                        help='SQLite 目录文件')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量刷新 SQLite 目录 (需要 --sqlite)')
+
+    args = parser.parse_args()
+
+    if not args.paths and not args.files_from:
+        parser.print_help()
+        print("\n错误: 至少需要指定一个文件、目录或 --files-from", file=sys.stderr)
+        sys.exit(1)
+
+    if args.jobs is not None and args.jobs < 1:
+        print("错误: --jobs 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+
+    if args.incremental and not args.sqlite:
+        print("错误: --incremental 需要同时指定 --sqlite", file=sys.stderr)
+        sys.exit(1)
+
+    paths = list(args.paths)
+    if args.files_from:
+        paths.extend(read_file_list(args.files_from))
+
+    if args.incremental:
+        writer = SqliteWriter(args.sqlite)
+        try:
+            stats = refresh_catalog(paths, writer, jobs=args.jobs)
+        finally:
+            writer.close()
+
+        print("\n完成!", file=sys.stderr)
+        print(f"  扫描书籍: {stats['total']}", file=sys.stderr)
+        print(f"  未变化: {stats['unchanged'] + stats['touched']}", file=sys.stderr)
+        print(f"  重新提取: {stats['extracted']}", file=sys.stderr)
+        print(f"  已删除: {stats['deleted']}", file=sys.stderr)
+        if stats['errors'] > 0:
+            print(f"  失败: {stats['errors']}", file=sys.stderr)
+        return
+
+    epub_paths = list(iter_epub_files(paths))
+
+    with ExitStack() as stack:
+        writers = []
+        if args.jsonl:
+            writers.append(JsonlWriter(stack.enter_context(open(args.jsonl, 'w', encoding='utf-8'))))
+        elif not args.sqlite:
+            writers.append(JsonlWriter(sys.stdout))
+        if args.sqlite:
+            writers.append(SqliteWriter(args.sqlite))
+        # 写入器先于 JSONL 文件关闭
+        for writer in writers:
+            stack.callback(writer.close)
+
+        stats = catalog_metadata(epub_paths, writers, jobs=args.jobs)
+
+    print("\n完成!", file=sys.stderr)
+    print(f"  处理书籍: {stats['total']}", file=sys.stderr)
+    print(f"  成功: {stats['ok']}", file=sys.stderr)
+    if stats['errors'] > 0:
+        print(f"  失败: {stats['errors']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+直接基于 ZIP 中央目录读取 EPUB 结构的共享工具
+
+只解析 META-INF/container.xml 和 OPF 包文件,不加载章节和图片内容,
+供各脚本在不需要完整 ebooklib 对象时使用。
+"""
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import quote, unquote, urlsplit
+
+from ebooklib import (
+    EXTENSIONS,
+    ITEM_COVER,
+    ITEM_DOCUMENT,
+    ITEM_IMAGE,
+    ITEM_NAVIGATION,
+    ITEM_SMIL,
+    ITEM_UNKNOWN,
+)
+from lxml import etree
+
+
+NAMESPACES = {
+    'OPF': 'http://www.idpf.org/2007/opf',
+    'CONTAINERNS': 'urn:oasis:names:tc:opendocument:xmlns:container',
+    'DC': 'http://purl.org/dc/elements/1.1/',
+    'XHTML': 'http://www.w3.org/1999/xhtml',
+    'DAISY': 'http://www.daisy.org/z3986/2005/ncx/',
+}
+
+CONTAINER_PATH = 'META-INF/container.xml'
+
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+EPUB_NS = 'http://www.idpf.org/2007/ops'
+NCX_MEDIA_TYPE = 'application/x-dtbncx+xml'
+
+# 生成新 EPUB 时的布局,与 ebooklib 写出的结构一致
+OPF_DIR = 'EPUB'
+NAV_HREF = 'nav.xhtml'
+NCX_HREF = 'toc.ncx'
+
+CONTAINER_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+'''
+
+# 原样复制压缩数据时每次读写的字节数
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 计算成员内容哈希时每次解压的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ZIP 本地文件头的固定部分
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# CSS 中的 url(...) 引用(第 2 组)和 @import "..." 引用(第 4 组)
+CSS_REFERENCE_RE = re.compile(r'''url\(\s*(['"]?)([^'")]+?)\1\s*\)|@import\s+(['"])([^'"]+)\3''', re.IGNORECASE)
+
+# 与 ebooklib 保持一致的图片媒体类型
+IMAGE_MEDIA_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/svg+xml']
+
+
+def parse_xml(data):
+    """使用与 ebooklib 相同的容错设置解析 XML"""
+    parser = etree.XMLParser(recover=True, resolve_entities=False)
+    root = etree.fromstring(data, parser=parser)
+    if root is None:
+        raise ValueError("无法解析 XML 文档")
+    return root
+
+
+class ManifestItem:
+    """OPF manifest 中的一个条目"""
+
+    def __init__(self, item_id, href, media_type, properties, path):
+        self.id = item_id
+        self.href = href
+        self.media_type = media_type
+        self.properties = properties
+        # ZIP 中的完整成员名
+        self.path = path
+
+    def get_type(self):
+        """按 ebooklib 读取时的规则推断条目类型"""
+        if self.media_type == 'application/xhtml+xml':
+            return ITEM_DOCUMENT
+        if self.media_type in IMAGE_MEDIA_TYPES:
+            if 'cover-image' in self.properties:
+                return ITEM_COVER
+            return ITEM_IMAGE
+        if self.media_type == NCX_MEDIA_TYPE:
+            return ITEM_NAVIGATION
+        if self.media_type == 'application/smil+xml':
+            return ITEM_SMIL
+
+        # 其余类型与 ebooklib.EpubItem 一样按扩展名推断
+        ext = posixpath.splitext(self.href)[1].lower()
+        for item_type, ext_list in EXTENSIONS.items():
+            if ext in ext_list:
+                return item_type
+        return ITEM_UNKNOWN
+
+
+class OpfPackage:
+    """解析后的 OPF 包文件"""
+
+    def __init__(self, opf_path, root):
+        self.opf_path = opf_path
+        self.opf_dir = posixpath.dirname(opf_path)
+        self.root = root
+        self.metadata = {}
+        self.manifest = []
+        self.spine = []
+
+        self._load_metadata()
+        self._load_manifest()
+        self._load_spine()
+
+    def _load_metadata(self):
+        metadata = self.root.find(f"{{{NAMESPACES['OPF']}}}metadata")
+        if metadata is None:
+            raise ValueError("OPF 文件缺少 metadata 元素")
+
+        for elem in metadata:
+            if not isinstance(elem.tag, str):
+                continue
+            qname = etree.QName(elem)
+            values = self.metadata.setdefault(qname.namespace, {}).setdefault(qname.localname, [])
+            values.append((elem.text, dict(elem.items())))
+
+    def _load_manifest(self):
+        manifest = self.root.find(f"{{{NAMESPACES['OPF']}}}manifest")
+        if manifest is None:
+            return
+
+        for elem in manifest.iterfind(f"{{{NAMESPACES['OPF']}}}item"):
+            media_type = elem.get('media-type')
+            # 有些书使用了错误的媒体类型
+            if media_type == 'image/jpg':
+                media_type = 'image/jpeg'
+            href = unquote(elem.get('href', ''))
+            properties = elem.get('properties', '').split()
+            path = posixpath.normpath(posixpath.join(self.opf_dir, href))
+            self.manifest.append(ManifestItem(elem.get('id'), href, media_type, properties, path))
+
+    def _load_spine(self):
+        spine = self.root.find(f"{{{NAMESPACES['OPF']}}}spine")
+        if spine is None:
+            return
+        self.spine = [elem.get('idref') for elem in spine.iterfind(f"{{{NAMESPACES['OPF']}}}itemref")]
+
+    def iter_spine_items(self, include_nav=False):
+        """按书脊顺序产出 XHTML 文档条目,默认跳过 EPUB3 导航文档"""
+        items_by_id = {item.id: item for item in self.manifest}
+        for idref in self.spine:
+            item = items_by_id.get(idref)
+            if item is None or item.get_type() != ITEM_DOCUMENT:
+                continue
+            if 'nav' in item.properties and not include_nav:
+                continue
+            yield item
+
+    def get_metadata(self, namespace, name):
+        """按命名空间和名称获取元数据,返回 (值, 属性) 列表"""
+        namespace = NAMESPACES.get(namespace, namespace)
+        return self.metadata.get(namespace, {}).get(name, [])
+
+    def get_item_by_id(self, item_id):
+        """根据 id 查找 manifest 条目"""
+        for item in self.manifest:
+            if item.id == item_id:
+                return item
+        return None
+
+
+def opf_relative_path(package, item):
+    """条目相对 OPF 目录的路径;位于 OPF 目录之外的条目返回完整的 ZIP 路径"""
+    if package.opf_dir:
+        relative = posixpath.relpath(item.path, package.opf_dir)
+        if not relative.startswith('../'):
+            return relative
+    return item.path
+
+
+def find_opf_path(zf):
+    """从 container.xml 中找到 OPF 包文件的路径"""
+    root = parse_xml(zf.read(CONTAINER_PATH))
+    for rootfile in root.iter(f"{{{NAMESPACES['CONTAINERNS']}}}rootfile"):
+        if rootfile.get('media-type') == 'application/oebps-package+xml':
+            return rootfile.get('full-path')
+    raise ValueError("container.xml 中没有找到 OPF 包文件")
+
+
+def read_package(zf):
+    """读取已打开 ZIP 中的 OPF 包文件"""
+    opf_path = find_opf_path(zf)
+    try:
+        data = zf.read(opf_path)
+    except KeyError:
+        raise ValueError(f"找不到 OPF 文件: {opf_path}") from None
+    return OpfPackage(opf_path, parse_xml(data))
+
+
+def read_file_list(list_path):
+    """读取路径列表文件,忽略空行"""
+    if list_path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(list_path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip()]
+
+
+def open_epub(epub_path):
+    """以只读方式打开 EPUB 的 ZIP 容器"""
+    return zipfile.ZipFile(epub_path, 'r')
+
+
+def iter_spine_documents(zf, package, include_nav=False):
+    """按书脊顺序逐个解压章节,产出 (条目, 内容字节)
+
+    每次只解压当前章节,消费者处理完后进入下一次迭代时上一章的内容即被释放。
+    """
+    for item in package.iter_spine_items(include_nav=include_nav):
+        content = zf.read(item.path)
+        yield item, content
+        del content
+
+
+def iter_chapters(epub_path, include_nav=False):
+    """打开 EPUB 并按书脊顺序逐章产出 (条目, 内容字节)"""
+    with open_epub(epub_path) as zf:
+        package = read_package(zf)
+        yield from iter_spine_documents(zf, package, include_nav=include_nav)
+
+
+def iter_spine_streams(zf, package, include_nav=False):
+    """按书脊顺序逐个打开章节,产出 (条目, 文件对象)
+
+    与 iter_spine_documents 不同,章节内容不会一次性解压到内存中,
+    消费者从文件对象中按需分块读取;进入下一次迭代时文件对象即被关闭。
+    """
+    for item in package.iter_spine_items(include_nav=include_nav):
+        with zf.open(item.path) as stream:
+            yield item, stream
+
+
+def copy_member_raw(src_file, info, dst_zf, arcname=None):
+    """把源 ZIP 成员的压缩数据原样写入目标 ZIP,不解压也不重新压缩
+
+    参数:
+        src_file: 以二进制方式打开的源 ZIP 文件对象
+        info: 源成员的 ZipInfo(来自源 ZIP 的中央目录)
+        dst_zf: 以写模式打开的目标 ZipFile,底层文件必须可定位
+        arcname: 目标中的成员名,默认与源相同
+
+    CRC、大小和压缩方式沿用中央目录中的值,数据按 COPY_CHUNK_SIZE 分块复制。
+    """
+    if info.flag_bits & 0x1:
+        raise ValueError(f"不支持复制加密的成员: {info.filename}")
+    if dst_zf._writing:
+        raise ValueError("目标 ZIP 正有其他成员在写入")
+
+    # 跳过本地文件头,定位到压缩数据
+    src_file.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(src_file.read(_LOCAL_HEADER.size))
+    if header[0] != _LOCAL_HEADER_SIGNATURE:
+        raise ValueError(f"ZIP 本地文件头损坏: {info.filename}")
+    src_file.seek(header[10] + header[11], 1)
+
+    zinfo = _clone_info(info, arcname)
+    return _append_raw(dst_zf, zinfo, _iter_raw_chunks(src_file, info))
+
+
+def _clone_info(info, arcname=None):
+    """复制成员的压缩参数,得到可写入另一个 ZIP 的新 ZipInfo"""
+    zinfo = zipfile.ZipInfo(arcname or info.filename, date_time=info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.external_attr = info.external_attr
+    # 保留压缩选项位,去掉数据描述符位(大小已写在本地文件头中)
+    zinfo.flag_bits = info.flag_bits & 0x06
+    return zinfo
+
+
+def _iter_raw_chunks(src_file, info):
+    """从本地文件头之后按块读出成员的压缩数据"""
+    remaining = info.compress_size
+    while remaining:
+        chunk = src_file.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise ValueError(f"ZIP 成员数据不完整: {info.filename}")
+        yield chunk
+        remaining -= len(chunk)
+
+
+def _append_raw(dst_zf, zinfo, chunks):
+    """在目标 ZIP 末尾写入本地文件头和已压缩的数据,并登记到中央目录"""
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+
+    dst_zf._writecheck(zinfo)
+    dst_zf._didModify = True
+    dst_zf.fp.seek(dst_zf.start_dir)
+    zinfo.header_offset = dst_zf.fp.tell()
+    dst_zf.fp.write(zinfo.FileHeader(zip64))
+    for chunk in chunks:
+        dst_zf.fp.write(chunk)
+
+    dst_zf.start_dir = dst_zf.fp.tell()
+    dst_zf.filelist.append(zinfo)
+    dst_zf.NameToInfo[zinfo.filename] = zinfo
+    return zinfo
+
+
+def precompress(arcname, data, compress_type=zipfile.ZIP_DEFLATED):
+    """预先压缩一个成员,返回 (ZipInfo, 压缩数据)
+
+    结果可以用 write_precompressed 写入任意多个 ZIP,每个输出都相同的成员
+    只需压缩一次。
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = compress_type
+    zinfo.external_attr = 0o600 << 16
+    zinfo.file_size = len(data)
+    zinfo.CRC = zlib.crc32(data)
+    if compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush()
+    elif compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"不支持的压缩方式: {compress_type}")
+    zinfo.compress_size = len(data)
+    return zinfo, data
+
+
+def write_precompressed(dst_zf, member, arcname=None):
+    """把 precompress 的结果原样写入目标 ZIP,返回新的 ZipInfo"""
+    if dst_zf._writing:
+        raise ValueError("目标 ZIP 正有其他成员在写入")
+    info, data = member
+    return _append_raw(dst_zf, _clone_info(info, arcname), [data])
+
+
+def member_digest(zf, info):
+    """分块解压成员并计算内容哈希"""
+    digest = hashlib.blake2b(digest_size=32)
+    with zf.open(info) as stream:
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def rewrite_epub(epub_path, replacements):
+    """原子地替换 EPUB 中的若干成员
+
+    参数:
+        replacements: {成员名: 新内容(bytes)},被替换的成员保持原来的位置和压缩方式
+
+    其余成员按原始压缩数据复制,不解压也不重新压缩。新文件先写到同一目录下的
+    临时文件,完成后用 os.replace 替换原文件,中途失败时原文件不受影响。
+    """
+    directory = os.path.dirname(os.path.abspath(epub_path))
+    fd, temp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+        with open(epub_path, 'rb') as src_file, zipfile.ZipFile(src_file) as src, \
+                zipfile.ZipFile(temp_path, 'w') as out:
+            missing = set(replacements) - set(src.namelist())
+            if missing:
+                raise ValueError(f"EPUB 中没有成员: {', '.join(sorted(missing))}")
+
+            for info in src.infolist():
+                if info.filename in replacements:
+                    zinfo = zipfile.ZipInfo(info.filename, date_time=time.localtime(time.time())[:6])
+                    zinfo.compress_type = info.compress_type
+                    zinfo.external_attr = info.external_attr
+                    out.writestr(zinfo, replacements[info.filename])
+                else:
+                    copy_member_raw(src_file, info, out)
+            out.comment = src.comment
+
+        shutil.copymode(epub_path, temp_path)
+        os.replace(temp_path, epub_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def iter_css_references(text):
+    """按出现顺序产出 CSS 文本中 url() 和 @import 引用的地址"""
+    for match in CSS_REFERENCE_RE.finditer(text):
+        yield match.group(2) or match.group(4)
+
+
+def resolve_reference(base_path, reference):
+    """把成员 base_path 中的相对引用解析为同一路径空间中的规范路径
+
+    外部链接、绝对路径、data: URI 和纯片段引用返回 None;查询和片段部分被忽略。
+    """
+    reference = reference.strip()
+    if not reference or reference.startswith(('#', '/')):
+        return None
+    parts = urlsplit(reference)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_path), unquote(parts.path)))
+
+
+def iter_document_references(data):
+    """按出现顺序产出 XHTML/SVG 文档引用的资源地址
+
+    包括各元素的 src、<link> 的 href、SVG <image>/<use> 的 href 和 xlink:href、
+    <object> 的 data、<video> 的 poster,以及 <style> 元素和 style 属性中的
+    CSS url()/@import。<a> 等指向其他文档的链接不算资源引用。
+    """
+    try:
+        root = parse_xml(data)
+    except (etree.XMLSyntaxError, ValueError):
+        return
+
+    for elem in root.iter():
+        if not isinstance(elem.tag, str):
+            continue
+        name = etree.QName(elem).localname.lower()
+
+        if elem.get('src'):
+            yield elem.get('src')
+        if name == 'link' and elem.get('href'):
+            yield elem.get('href')
+        elif name in ('image', 'use'):
+            href = elem.get(XLINK_HREF) or elem.get('href')
+            if href:
+                yield href
+        elif name == 'object' and elem.get('data'):
+            yield elem.get('data')
+        elif name == 'video' and elem.get('poster'):
+            yield elem.get('poster')
+        elif name == 'style' and elem.text:
+            yield from iter_css_references(elem.text)
+
+        if elem.get('style'):
+            yield from iter_css_references(elem.get('style'))
+
+
+# 每个新 EPUB 开头都相同的成员,导入时压缩一次;mimetype 必须是第一个且不压缩的成员
+EPUB_HEADER_MEMBERS = (
+    precompress('mimetype', 'application/epub+zip', zipfile.ZIP_STORED),
+    precompress(CONTAINER_PATH, CONTAINER_XML),
+)
+
+
+def start_epub(out):
+    """写入新 EPUB 开头固定的 mimetype 和 container.xml"""
+    for member in EPUB_HEADER_MEMBERS:
+        write_precompressed(out, member)
+
+
+def build_opf(identifier, title, language, manifest, spine, creators=(), modified=None):
+    """生成 EPUB 3 的 OPF 包文件
+
+    参数:
+        manifest: [(id, 相对 OPF 目录的 href, 媒体类型, properties 列表)],不含导航文档和 NCX
+        spine: [id],导航文档自动排在最前面
+        creators: 作者列表
+        modified: dcterms:modified 时间戳,默认为当前时间
+    """
+    opf = NAMESPACES['OPF']
+    dc = NAMESPACES['DC']
+    package = etree.Element(f'{{{opf}}}package', nsmap={None: opf},
+                            attrib={'version': '3.0', 'unique-identifier': 'id'})
+
+    metadata = etree.SubElement(package, f'{{{opf}}}metadata', nsmap={'dc': dc})
+    etree.SubElement(metadata, f'{{{dc}}}identifier', id='id').text = identifier
+    etree.SubElement(metadata, f'{{{dc}}}title').text = title
+    etree.SubElement(metadata, f'{{{dc}}}language').text = language
+    for num, creator in enumerate(creators, start=1):
+        etree.SubElement(metadata, f'{{{dc}}}creator', id=f'creator_{num}').text = creator
+    if modified is None:
+        modified = modified_timestamp()
+    etree.SubElement(metadata, f'{{{opf}}}meta', property='dcterms:modified').text = modified
+
+    manifest_elem = etree.SubElement(package, f'{{{opf}}}manifest')
+    etree.SubElement(manifest_elem, f'{{{opf}}}item', id='ncx', href=NCX_HREF,
+                     attrib={'media-type': NCX_MEDIA_TYPE})
+    etree.SubElement(manifest_elem, f'{{{opf}}}item', id='nav', href=NAV_HREF,
+                     attrib={'media-type': 'application/xhtml+xml', 'properties': 'nav'})
+    for item_id, href, media_type, properties in manifest:
+        attrib = {'media-type': media_type}
+        if properties:
+            attrib['properties'] = ' '.join(properties)
+        etree.SubElement(manifest_elem, f'{{{opf}}}item', id=item_id, href=quote(href), attrib=attrib)
+
+    spine_elem = etree.SubElement(package, f'{{{opf}}}spine', toc='ncx')
+    etree.SubElement(spine_elem, f'{{{opf}}}itemref', idref='nav')
+    for item_id in spine:
+        etree.SubElement(spine_elem, f'{{{opf}}}itemref', idref=item_id)
+
+    return etree.tostring(package, encoding='utf-8', xml_declaration=True, pretty_print=True)
+
+
+def modified_timestamp():
+    """返回 OPF dcterms:modified 格式的当前 UTC 时间"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def build_nav(title, language, toc):
+    """生成 EPUB 3 导航文档, toc 为 [(标题, href)]"""
+    xhtml = NAMESPACES['XHTML']
+    html = etree.Element(f'{{{xhtml}}}html', nsmap={None: xhtml, 'epub': EPUB_NS},
+                         attrib={'lang': language})
+    head = etree.SubElement(html, f'{{{xhtml}}}head')
+    etree.SubElement(head, f'{{{xhtml}}}title').text = title
+    body = etree.SubElement(html, f'{{{xhtml}}}body')
+    nav = etree.SubElement(body, f'{{{xhtml}}}nav', id='id', attrib={f'{{{EPUB_NS}}}type': 'toc'})
+    etree.SubElement(nav, f'{{{xhtml}}}h2').text = title
+    ol = etree.SubElement(nav, f'{{{xhtml}}}ol')
+    for label, href in toc:
+        li = etree.SubElement(ol, f'{{{xhtml}}}li')
+        etree.SubElement(li, f'{{{xhtml}}}a', href=quote(href)).text = label
+
+    return etree.tostring(html, encoding='utf-8', xml_declaration=True, pretty_print=True,
+                          doctype='<!DOCTYPE html>')
+
+
+def build_ncx(identifier, title, toc):
+    """生成 EPUB 2 的 NCX 目录, toc 为 [(标题, href)]"""
+    daisy = NAMESPACES['DAISY']
+    ncx = etree.Element(f'{{{daisy}}}ncx', nsmap={None: daisy}, version='2005-1')
+    head = etree.SubElement(ncx, f'{{{daisy}}}head')
+    etree.SubElement(head, f'{{{daisy}}}meta', content=identifier, name='dtb:uid')
+    doc_title = etree.SubElement(ncx, f'{{{daisy}}}docTitle')
+    etree.SubElement(doc_title, f'{{{daisy}}}text').text = title
+    nav_map = etree.SubElement(ncx, f'{{{daisy}}}navMap')
+    for num, (label, href) in enumerate(toc, start=1):
+        nav_point = etree.SubElement(nav_map, f'{{{daisy}}}navPoint', id=f'navpoint-{num}',
+                                     playOrder=str(num))
+        nav_label = etree.SubElement(nav_point, f'{{{daisy}}}navLabel')
+        etree.SubElement(nav_label, f'{{{daisy}}}text').text = label
+        etree.SubElement(nav_point, f'{{{daisy}}}content', src=quote(href))
+
+    return etree.tostring(ncx, encoding='utf-8', xml_declaration=True, pretty_print=True)
+
+
+def write_package(out, identifier, title, language, manifest, spine, toc, creators=(), modified=None):
+    """写入新 EPUB 的导航文档、NCX 和 OPF"""
+    out.writestr(f'{OPF_DIR}/{NAV_HREF}', build_nav(title, language, toc))
+    out.writestr(f'{OPF_DIR}/{NCX_HREF}', build_ncx(identifier, title, toc))
+    out.writestr(f'{OPF_DIR}/content.opf',
+                 build_opf(identifier, title, language, manifest, spine, creators, modified))
@@ -8,51 +8,65 @@
   --separate               将每章保存为单独文件
   --toc                    生成目录索引文件
   --metadata               在输出中包含元数据
+  --parser lxml|html.parser  HTML 解析器 (默认: lxml)
+  --jobs N                 并行转换章节的进程数 (默认: 1)
 """
 import sys
 import os
+import re
 import argparse
-from ebooklib import epub
-from ebooklib import ITEM_DOCUMENT, ITEM_IMAGE, ITEM_STYLE
-from bs4 import BeautifulSoup
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 
+from epub_zip import open_epub, read_package, iter_spine_documents
+from html_engine import parse_html, PARSERS, DEFAULT_PARSER
 
-def extract_chapter_title(content, default_title):
-    """从章节 HTML 内容中提取标题"""
-    try:
-        soup = BeautifulSoup(content, 'html.parser')
 
-        # 尝试查找 h1-h3 标题
-        for tag_name in ['h1', 'h2', 'h3']:
-            title_tag = soup.find(tag_name)
-            if title_tag:
-                title = title_tag.get_text(strip=True)
-                if title:
-                    return title
+# 并行转换时每个工作进程最多排队的章节数,限制同时驻留内存的原始章节
+PENDING_PER_JOB = 4
 
-        # 如果没有找到标题,使用默认标题
-        return default_title
+# 渲染前从章节中移除的标签
+REMOVED_TAGS = ['script', 'style', 'nav', 'noscript']
+
+
+def find_chapter_title(doc, default_title):
+    """从已解析的章节文档中查找 h1-h3 标题"""
+    for tag_name in ['h1', 'h2', 'h3']:
+        title_tag = doc.find(tag_name)
+        if title_tag:
+            title = title_tag.get_text(strip=True)
+            if title:
+                return title
+
+    # 如果没有找到标题,使用默认标题
+    return default_title
+
+
+def extract_chapter_title(content, default_title, parser=DEFAULT_PARSER):
+    """从章节 HTML 内容中提取标题"""
+    try:
+        return find_chapter_title(parse_html(content, parser), default_title)
     except:
         return default_title
 
 
-def clean_html_content(content):
+def clean_html_content(content, parser=DEFAULT_PARSER):
     """清理 HTML 内容,移除脚本和样式"""
-    soup = BeautifulSoup(content, 'html.parser')
+    doc = parse_html(content, parser)
 
     # 移除不需要的标签
-    for tag in soup(['script', 'style', 'nav', 'noscript']):
-        tag.decompose()
+    doc.remove_tags(REMOVED_TAGS)
 
-    return soup
+    return doc
 
 
-def html_to_text(soup, preserve_structure=True):
+def html_to_text(doc, preserve_structure=True):
     """将 HTML 转换为纯文本,可选择保留结构"""
     if preserve_structure:
         # 保留标题和段落结构
         text_parts = []
-        for elem in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'br']):
+        for elem in doc.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'br']):
             text = elem.get_text(strip=True)
             if text:
                 if elem.name.startswith('h'):
@@ -67,59 +81,290 @@ def html_to_text(soup, preserve_structure=True):
 
         return '\n'.join(text_parts)
     else:
-        return soup.get_text(separator='\n', strip=True)
-
-
-def html_to_markdown(soup):
-    """将 HTML 转换为 Markdown 格式"""
-    markdown_lines = []
-
-    for elem in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'strong', 'em', 'br', 'a', 'img']):
-        if elem.name.startswith('h'):
-            level = int(elem.name[1])
-            text = elem.get_text(strip=True)
-            markdown_lines.append(f"\n{'#' * level} {text}\n")
-
-        elif elem.name == 'p':
-            text = elem.get_text(strip=True)
-            if text:
-                # 处理段落内的格式
-                for strong in elem.find_all('strong'):
-                    strong.replace_with(f"**{strong.get_text()}**")
-                for em in elem.find_all('em'):
-                    em.replace_with(f"*{em.get_text()}*")
-                text = elem.get_text(strip=True)
-                markdown_lines.append(f"\n{text}\n")
-
-        elif elem.name == 'strong':
-            text = elem.get_text(strip=True)
-            markdown_lines.append(f"**{text}**")
-
-        elif elem.name == 'em':
-            text = elem.get_text(strip=True)
-            markdown_lines.append(f"*{text}*")
-
-        elif elem.name == 'br':
-            markdown_lines.append('\n')
-
-        elif elem.name == 'a':
-            text = elem.get_text(strip=True)
-            href = elem.get('href', '')
-            if text and href:
-                markdown_lines.append(f"[{text}]({href})")
+        return doc.get_text(separator='\n', strip=True)
+
+
+# Markdown 转换中作为块分隔的标签
+MARKDOWN_BLOCK_TAGS = {
+    'html', 'body', 'div', 'section', 'article', 'header', 'footer', 'main', 'aside',
+    'figure', 'figcaption', 'address', 'dl', 'dt', 'dd', 'p', 'center',
+}
+
+# 行内强调标签对应的 Markdown 标记
+MARKDOWN_INLINE_MARKS = {
+    'strong': '**', 'b': '**',
+    'em': '*', 'i': '*',
+    'code': '`',
+}
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_SPACES_RE = re.compile(r' {2,}')
+
+
+class MarkdownWriter:
+    """单次深度优先遍历生成 Markdown
+
+    按 iter_events() 的事件顺序处理文档,每个文本节点只输出一次,不修改文档树,
+    耗时与文档大小成线性关系。支持标题、段落、强调、链接、图片、列表、
+    引用、表格和代码块。
+    """
+
+    def __init__(self):
+        self.blocks = []        # [(文本, 是否为列表项, 引用层级)]
+        self.inline = []        # 当前块的行内片段
+        self.text_length = 0    # 已输出的非空白文本长度,用于判断强调/链接是否为空
+        self.marks = []         # 未闭合的行内标记: [标签, 开始位置, 开始时的 text_length, href]
+        self.lists = []         # 列表栈: {'ordered', 'count', 'prefix', 'indent'}
+        self.heading = 0
+        self.quote_depth = 0
+        self.pre_depth = 0
+        self.pre_parts = []
+        self.skip_depth = 0
+        self.table_depth = 0
+        self.rows = []
+        self.row = None
+        self.in_cell = False
+
+    def convert(self, doc):
+        for event, value, attrs in doc.iter_events():
+            if event == 'text':
+                self.text(value)
+            elif event == 'start':
+                self.start(value, attrs)
+            else:
+                self.end(value)
+        self.flush()
+        return self.result()
+
+    def start(self, tag, attrs):
+        if self.skip_depth:
+            self.skip_depth += 1
+            return
+        if tag == 'head':
+            self.skip_depth = 1
+            return
+
+        if self.pre_depth:
+            if tag == 'pre':
+                self.pre_depth += 1
+            elif tag == 'br':
+                self.pre_parts.append('\n')
+            return
+
+        if tag in MARKDOWN_INLINE_MARKS:
+            self.open_mark(tag, MARKDOWN_INLINE_MARKS[tag])
+        elif tag == 'a':
+            self.open_mark(tag, '[', attrs.get('href'))
+        elif tag == 'img':
+            self.inline.append(f"![{attrs.get('alt', '')}]({attrs.get('src', '')})")
+            self.text_length += 1
+        elif tag == 'br':
+            self.inline.append(' ' if self.in_cell else '\n')
+        elif tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            self.flush()
+            self.heading = int(tag[1])
+        elif tag == 'pre':
+            self.flush()
+            self.pre_depth = 1
+            self.pre_parts = []
+        elif tag == 'blockquote':
+            self.flush()
+            self.quote_depth += 1
+        elif tag in ('ul', 'ol'):
+            self.flush()
+            indent = self.lists[-1]['indent'] + '    ' if self.lists else ''
+            self.lists.append({'ordered': tag == 'ol', 'count': 0, 'prefix': None, 'indent': indent})
+        elif tag == 'li':
+            self.flush()
+            if not self.lists:
+                self.lists.append({'ordered': False, 'count': 0, 'prefix': None, 'indent': ''})
+            current = self.lists[-1]
+            current['count'] += 1
+            marker = f"{current['count']}. " if current['ordered'] else '- '
+            current['prefix'] = current['indent'] + marker
+        elif tag == 'table':
+            self.table_depth += 1
+            if self.table_depth == 1:
+                self.flush()
+                self.rows = []
+        elif tag == 'tr' and self.table_depth == 1:
+            self.row = []
+        elif tag in ('td', 'th') and self.table_depth == 1:
+            self.in_cell = True
+        elif tag == 'hr':
+            self.flush()
+            self.add_block('---')
+        elif tag in MARKDOWN_BLOCK_TAGS:
+            self.flush()
+
+    def end(self, tag):
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+
+        if self.pre_depth:
+            if tag == 'pre':
+                self.pre_depth -= 1
+                if not self.pre_depth:
+                    code = ''.join(self.pre_parts).strip('\n')
+                    self.add_block(f"```\n{code}\n```")
+            return
+
+        if tag in MARKDOWN_INLINE_MARKS or tag == 'a':
+            self.close_mark(tag)
+        elif tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            self.flush()
+            self.heading = 0
+        elif tag == 'blockquote':
+            self.flush()
+            self.quote_depth -= 1
+        elif tag in ('ul', 'ol'):
+            self.flush()
+            if self.lists:
+                self.lists.pop()
+        elif tag == 'li':
+            self.flush()
+            if self.lists:
+                self.lists[-1]['prefix'] = None
+        elif tag == 'table':
+            self.table_depth -= 1
+            if self.table_depth == 0:
+                self.add_table()
+        elif tag == 'tr' and self.table_depth == 1:
+            if self.row:
+                self.rows.append(self.row)
+            self.row = None
+        elif tag in ('td', 'th') and self.table_depth == 1:
+            self.in_cell = False
+            cell = self.take_inline().replace('\n', ' ').replace('|', '\\|')
+            if self.row is None:
+                self.row = []
+            self.row.append(cell)
+        elif tag in MARKDOWN_BLOCK_TAGS:
+            self.flush()
+
+    def text(self, value):
+        if self.skip_depth:
+            return
+        if self.pre_depth:
+            self.pre_parts.append(value)
+            return
+
+        value = _WHITESPACE_RE.sub(' ', value)
+        self.inline.append(value)
+        self.text_length += len(value.strip())
+
+    def open_mark(self, tag, marker, href=None):
+        self.marks.append([tag, len(self.inline), self.text_length, href])
+        self.inline.append(marker)
+
+    def close_mark(self, tag):
+        if not self.marks or self.marks[-1][0] != tag:
+            return
+        tag, position, length, href = self.marks.pop()
+        self._finish_mark(tag, position, length, href)
+
+    def _finish_mark(self, tag, position, length, href):
+        if self.text_length == length or (tag == 'a' and not href):
+            # 空的强调或没有地址的链接只保留其中的文本
+            self.inline[position] = ''
+        elif tag == 'a':
+            self.inline.append(f"]({href})")
+        else:
+            self.inline.append(MARKDOWN_INLINE_MARKS[tag])
+
+    def take_inline(self):
+        """取出当前行内内容并规范空白,同时闭合并在新块中重新打开未闭合的行内标记"""
+        for tag, position, length, href in reversed(self.marks):
+            self._finish_mark(tag, position, length, href)
+
+        text = ''.join(self.inline)
+        self.inline = []
+        for mark in self.marks:
+            mark[1] = len(self.inline)
+            mark[2] = self.text_length
+            self.inline.append('[' if mark[0] == 'a' else MARKDOWN_INLINE_MARKS[mark[0]])
+
+        lines = [_SPACES_RE.sub(' ', line).strip() for line in text.split('\n')]
+        while lines and not lines[0]:
+            lines.pop(0)
+        while lines and not lines[-1]:
+            lines.pop()
+        return '\n'.join(lines)
+
+    def flush(self):
+        """结束当前块"""
+        if self.in_cell:
+            self.inline.append(' ')
+            return
+
+        body = self.take_inline()
+        if not body:
+            return
+
+        if self.heading:
+            body = f"{'#' * self.heading} {body.replace(chr(10), ' ')}"
+
+        is_item = False
+        if self.lists:
+            current = self.lists[-1]
+            continuation = ' ' * (len(current['indent']) + (4 if current['ordered'] else 2))
+            first = current['prefix']
+            if first is None or first == continuation:
+                first = continuation
+            else:
+                current['prefix'] = continuation
+                is_item = True
+            lines = body.split('\n')
+            body = '\n'.join([first + lines[0]] + [continuation + line for line in lines[1:]])
+
+        self.add_block(body, is_item)
+
+    def add_block(self, body, is_item=False):
+        if self.quote_depth:
+            prefix = '> ' * self.quote_depth
+            body = '\n'.join(prefix + line for line in body.split('\n'))
+        self.blocks.append((body, is_item, self.quote_depth))
+
+    def add_table(self):
+        rows = self.rows
+        self.rows = []
+        if not rows:
+            return
+        width = max(len(row) for row in rows)
+        rows = [row + [''] * (width - len(row)) for row in rows]
+        lines = ['| ' + ' | '.join(rows[0]) + ' |',
+                 '| ' + ' | '.join(['---'] * width) + ' |']
+        lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+        self.add_block('\n'.join(lines))
+
+    def result(self):
+        output = []
+        previous_item = False
+        previous_quote = 0
+        for body, is_item, quote_depth in self.blocks:
+            if output:
+                if is_item and previous_item:
+                    output.append('\n')
+                elif quote_depth and previous_quote:
+                    # 同一引用中的相邻块用 ">" 空行分隔,保持在同一个引用内
+                    output.append('\n' + ('> ' * min(quote_depth, previous_quote)).rstrip() + '\n')
+                else:
+                    output.append('\n\n')
+            output.append(body)
+            previous_item = is_item
+            previous_quote = quote_depth
+        return ''.join(output)
 
-        elif elem.name == 'img':
-            alt = elem.get('alt', '')
-            src = elem.get('src', '')
-            markdown_lines.append(f"![{alt}]({src})")
 
-    return '\n'.join(markdown_lines)
+def html_to_markdown(doc):
+    """将 HTML 转换为 Markdown 格式(单次遍历)"""
+    return MarkdownWriter().convert(doc)
 
 
-def format_chapter_as_text(content, title, metadata=None):
-    """将章节内容格式化为纯文本"""
-    soup = clean_html_content(content)
-    text = html_to_text(soup, preserve_structure=True)
+def render_chapter_as_text(doc, title, metadata=None):
+    """将已清理的章节文档渲染为纯文本"""
+    text = html_to_text(doc, preserve_structure=True)
 
     output = []
     output.append("=" * 70)
@@ -139,10 +384,9 @@ def format_chapter_as_text(content, title, metadata=None):
     return '\n'.join(output)
 
 
-def format_chapter_as_markdown(content, title, metadata=None):
-    """将章节内容格式化为 Markdown"""
-    soup = clean_html_content(content)
-    markdown = html_to_markdown(soup)
+def render_chapter_as_markdown(doc, title, metadata=None):
+    """将已清理的章节文档渲染为 Markdown"""
+    markdown = html_to_markdown(doc)
 
     output = []
     output.append(f"# {title}\n")
@@ -160,10 +404,8 @@ def format_chapter_as_markdown(content, title, metadata=None):
     return '\n'.join(output)
 
 
-def format_chapter_as_html(content, title, metadata=None):
-    """将章节内容格式化为 HTML"""
-    soup = clean_html_content(content)
-
+def render_chapter_as_html(doc, title, metadata=None):
+    """将已清理的章节文档渲染为 HTML"""
     # 构建 HTML 文档
     html_parts = []
     html_parts.append("<!DOCTYPE html>")
@@ -196,7 +438,7 @@ def format_chapter_as_html(content, title, metadata=None):
 
     # 内容
     html_parts.append("  <div class=\"content\">")
-    html_parts.append(str(soup))
+    html_parts.append(str(doc))
     html_parts.append("  </div>")
 
     html_parts.append("</body>")
@@ -205,95 +447,174 @@ def format_chapter_as_html(content, title, metadata=None):
     return '\n'.join(html_parts)
 
 
-def extract_chapters(epub_path, output_dir, output_format='txt', separate=False,
-                     include_metadata=False, generate_toc=False):
-    """从 EPUB 中抽取章节"""
-    try:
-        # 创建输出目录
-        os.makedirs(output_dir, exist_ok=True)
-
-        # 读取 EPUB
-        book = epub.read_epub(epub_path)
-
-        # 提取元数据
-        metadata = {}
-        if include_metadata:
-            titles = book.get_metadata('DC', 'title')
-            metadata['书名'] = titles[0][0] if titles else None
-
-            authors = book.get_metadata('DC', 'creator')
-            metadata['作者'] = ', '.join([a[0] for a in authors]) if authors else None
-
-            languages = book.get_metadata('DC', 'language')
-            metadata['语言'] = languages[0][0] if languages else None
-
-            publishers = book.get_metadata('DC', 'publisher')
-            metadata['出版社'] = publishers[0][0] if publishers else None
-
-        # 抽取章节
-        chapters = []
-        chapter_num = 0
-
-        for item in book.get_items():
-            # 跳过导航文件(nav.xhtml),只处理真正的章节内容
-            if item.get_type() == ITEM_DOCUMENT:
-                file_name = item.get_name()
-
-                # 跳过导航文件
-                if file_name == 'nav.xhtml':
-                    continue
+RENDERERS = {
+    'txt': render_chapter_as_text,
+    'md': render_chapter_as_markdown,
+    'html': render_chapter_as_html,
+}
 
-                chapter_num += 1
-                content = item.get_content()
 
-                # 提取章节标题
-                default_title = f"第 {chapter_num} 章"
-                chapter_title = extract_chapter_title(content, default_title)
-
-                # 格式化内容
-                if output_format == 'txt':
-                    formatted_content = format_chapter_as_text(content, chapter_title, metadata)
-                elif output_format == 'md':
-                    formatted_content = format_chapter_as_markdown(content, chapter_title, metadata)
-                elif output_format == 'html':
-                    formatted_content = format_chapter_as_html(content, chapter_title, metadata)
-                else:
-                    raise ValueError(f"不支持的输出格式: {output_format}")
+def format_chapter_as_text(content, title, metadata=None, parser=DEFAULT_PARSER):
+    """将章节内容格式化为纯文本"""
+    return render_chapter_as_text(clean_html_content(content, parser), title, metadata)
 
-                chapters.append({
-                    'num': chapter_num,
-                    'title': chapter_title,
-                    'content': formatted_content,
-                    'filename': file_name
-                })
 
-        # 输出结果
-        if separate:
-            # 每章保存为单独文件
-            for chapter in chapters:
-                ext = output_format
-                filename = f"chapter_{chapter['num']:03d}.{ext}"
-                filepath = os.path.join(output_dir, filename)
+def format_chapter_as_markdown(content, title, metadata=None, parser=DEFAULT_PARSER):
+    """将章节内容格式化为 Markdown"""
+    return render_chapter_as_markdown(clean_html_content(content, parser), title, metadata)
 
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(chapter['content'])
 
-                print(f"✓ 已保存: {filename}")
+def format_chapter_as_html(content, title, metadata=None, parser=DEFAULT_PARSER):
+    """将章节内容格式化为 HTML"""
+    return render_chapter_as_html(clean_html_content(content, parser), title, metadata)
+
+
+def process_chapter(content, default_title, output_format='txt', metadata=None,
+                    parser=DEFAULT_PARSER):
+    """只解析一次章节,从同一个文档得到标题和格式化后的内容
+
+    返回:
+        (章节标题, 格式化内容)
+    """
+    renderer = RENDERERS.get(output_format)
+    if renderer is None:
+        raise ValueError(f"不支持的输出格式: {output_format}")
+
+    doc = parse_html(content, parser)
+    # 标题在清理前查找,与 extract_chapter_title 的结果一致
+    title = find_chapter_title(doc, default_title)
+    doc.remove_tags(REMOVED_TAGS)
+
+    return title, renderer(doc, title, metadata)
+
+
+def _process_chapter_task(task):
+    """进程池中执行的任务,参数只包含章节原始字节和简单值"""
+    return process_chapter(*task)
+
+
+def iter_processed_chapters(zf, book, output_format='txt', metadata=None,
+                            parser=DEFAULT_PARSER, jobs=1):
+    """按书脊顺序产出 (章节序号, 条目, 标题, 格式化内容)
+
+    jobs 大于 1 时章节转换分发到进程池,发送给工作进程的只有章节的原始字节;
+    结果仍按书脊顺序产出,最多 jobs * PENDING_PER_JOB 个章节同时在途。
+    """
+    chapters = enumerate(iter_spine_documents(zf, book), start=1)
+
+    if jobs == 1:
+        for chapter_num, (item, content) in chapters:
+            default_title = f"第 {chapter_num} 章"
+            title, formatted = process_chapter(content, default_title, output_format, metadata, parser)
+            yield chapter_num, item, title, formatted
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        max_pending = (jobs or os.cpu_count() or 1) * PENDING_PER_JOB
+        for chapter_num, (item, content) in chapters:
+            task = (content, f"第 {chapter_num} 章", output_format, metadata, parser)
+            pending.append((chapter_num, item, executor.submit(_process_chapter_task, task)))
+            if len(pending) >= max_pending:
+                chapter_num, item, future = pending.popleft()
+                yield (chapter_num, item, *future.result())
+        while pending:
+            chapter_num, item, future = pending.popleft()
+            yield (chapter_num, item, *future.result())
+
+
+class ChapterWriter:
+    """把格式化后的章节逐个写入输出目录
+
+    separate 为 True 时每章写入单独的 chapter_NNN.<格式> 文件,
+    否则依次追加到调用方打开的合并输出文件 combined(chapters.<格式>),
+    章节之间以换行分隔。
+    """
+
+    def __init__(self, output_dir, output_format, separate=False, combined=None):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.separate = separate
+        self.combined = combined
+        self.count = 0
+
+    def write(self, chapter_num, content):
+        """写出一个章节,返回写入的文件名"""
+        self.count += 1
+        if self.separate:
+            filename = f"chapter_{chapter_num:03d}.{self.output_format}"
+            with open(os.path.join(self.output_dir, filename), 'w', encoding='utf-8') as f:
+                f.write(content)
+            print(f"✓ 已保存: {filename}")
+            return filename
+
+        if self.count > 1:
+            self.combined.write('\n')
+        self.combined.write(content)
+        return combined_filename(self.output_format)
+
+
+def combined_filename(output_format):
+    """合并输出文件的文件名"""
+    return f"chapters.{output_format}"
 
-        else:
-            # 合并保存到单个文件
-            ext = output_format
-            filename = f"chapters.{ext}"
-            filepath = os.path.join(output_dir, filename)
 
-            all_content = []
-            for chapter in chapters:
-                all_content.append(chapter['content'])
+def extract_chapters(epub_path, output_dir, output_format='txt', separate=False,
+                     include_metadata=False, generate_toc=False, parser=DEFAULT_PARSER,
+                     jobs=1):
+    """从 EPUB 中抽取章节
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(all_content))
+    jobs 为并行转换章节的进程数,None 表示使用 CPU 核数。
+    """
+    try:
+        # 创建输出目录
+        os.makedirs(output_dir, exist_ok=True)
 
-            print(f"✓ 已保存所有章节到: {filename}")
+        with open_epub(epub_path) as zf:
+            # 只读取 OPF,章节内容在下面按书脊顺序逐个解压
+            book = read_package(zf)
+
+            # 提取元数据
+            metadata = {}
+            if include_metadata:
+                titles = book.get_metadata('DC', 'title')
+                metadata['书名'] = titles[0][0] if titles else None
+
+                authors = book.get_metadata('DC', 'creator')
+                metadata['作者'] = ', '.join([a[0] for a in authors]) if authors else None
+
+                languages = book.get_metadata('DC', 'language')
+                metadata['语言'] = languages[0][0] if languages else None
+
+                publishers = book.get_metadata('DC', 'publisher')
+                metadata['出版社'] = publishers[0][0] if publishers else None
+
+            # 抽取章节(导航文档已由书脊迭代器跳过),每章转换后立即写出,
+            # 只保留目录所需的序号、标题和文件名
+            chapters = []
+            chapter_num = 0
+
+            # 合并输出文件在这里打开,中途出错时也会被关闭;没有章节时也生成空文件
+            with ExitStack() as files:
+                combined = None
+                if not separate:
+                    combined = files.enter_context(open(
+                        os.path.join(output_dir, combined_filename(output_format)), 'w', encoding='utf-8'))
+                writer = ChapterWriter(output_dir, output_format, separate, combined)
+
+                # 提取标题并格式化内容(每章只解析一次)
+                for chapter_num, _, chapter_title, formatted_content in iter_processed_chapters(
+                        zf, book, output_format, metadata, parser, jobs):
+                    filename = writer.write(chapter_num, formatted_content)
+                    del formatted_content
+                    chapters.append({
+                        'num': chapter_num,
+                        'title': chapter_title,
+                        'filename': filename
+                    })
+
+            if not separate:
+                print(f"✓ 已保存所有章节到: {combined_filename(output_format)}")
 
         # 生成目录
         if generate_toc:
@@ -307,8 +628,7 @@ def extract_chapters(epub_path, output_dir, output_format='txt', separate=False,
                 for chapter in chapters:
                     f.write(f"{chapter['num']}. {chapter['title']}\n")
                     if separate:
-                        ext = output_format
-                        f.write(f"   文件: chapter_{chapter['num']:03d}.{ext}\n")
+                        f.write(f"   文件: {chapter['filename']}\n")
                     f.write("\n")
 
             print(f"✓ 已生成目录: {toc_filename}")
@@ -340,6 +660,9 @@ def main():
 
   # 生成带元数据和目录的 HTML 文件
   python extract_chapters.py book.epub output/ --format html --metadata --toc
+
+  # 使用 8 个进程并行转换章节
+  python extract_chapters.py book.epub output/ --format md --jobs 8
         """
     )
 
@@ -353,9 +676,17 @@ def main():
                       help='生成目录索引文件')
     parser.add_argument('--metadata', action='store_true',
                       help='在输出中包含元数据')
+    parser.add_argument('--parser', choices=PARSERS, default=DEFAULT_PARSER,
+                      help='HTML 解析器 (默认: lxml)')
+    parser.add_argument('--jobs', type=int, default=1,
+                      help='并行转换章节的进程数 (默认: 1)')
 
     args = parser.parse_args()
 
+    if args.jobs < 1:
+        print("错误: --jobs 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+
     if not os.path.exists(args.epub_path):
         print(f"错误: 找不到文件 {args.epub_path}", file=sys.stderr)
         sys.exit(1)
@@ -366,7 +697,9 @@ def main():
         output_format=args.format,
         separate=args.separate,
         include_metadata=args.metadata,
-        generate_toc=args.toc
+        generate_toc=args.toc,
+        parser=args.parser,
+        jobs=args.jobs
     )
 
 
@@ -1,19 +1,568 @@
 #!/usr/bin/env python3
-from ebooklib import ITEM_IMAGE
 """
 从 EPUB 文件中提取所有图片
-使用方法: python extract_images.py <epub文件路径> [输出目录]
+使用方法: python extract_images.py <epub文件路径> [输出目录] [--keep-paths] [--dedup link|manifest] [--jobs N]
+          python extract_images.py <epub文件路径> --inventory [清单.json] [--min-width N] [--types jpeg,png]
+
+图片列表取自 OPF manifest,每张图片直接从 ZIP 成员分块解压写入磁盘,
+不会把整本书或整张图片读入内存。
+
+选项:
+  --keep-paths        保留图片在书中的目录结构 (默认全部放在同一目录)
+  --dedup link        内容相同的图片只解压一次,其余用硬链接
+  --dedup manifest    内容相同的图片只写一份,images.json 记录每张图片对应的文件
+  --jobs N            并行写出图片的线程数 (默认: 1)
+  --inventory [FILE]  不提取图片,只根据图片头部输出格式、宽高和大小的 JSON 清单(含封面)
+  --min-width N       只处理宽度不小于 N 像素的图片
+  --types LIST        只处理这些格式的图片,如 jpeg,png (可选 jpeg png gif webp svg)
 """
 import sys
 import os
-from ebooklib import epub
+import json
+import time
+import shutil
+import argparse
+import struct
+import posixpath
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from ebooklib import ITEM_COVER, ITEM_IMAGE, ITEM_UNKNOWN
+from lxml import etree
+
+from epub_zip import member_digest, open_epub, opf_relative_path, read_package
+
+
+# 解压写出图片时每次复制的字节数;zipfile 内部还会再缓冲数倍于此的数据,
+# 因此不使用原样复制时的 1MB 块
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# --dedup manifest 时写出的图片清单
+MANIFEST_NAME = 'images.json'
+
+DEDUP_MODES = [None, 'link', 'manifest']
+
+# 并行写出时每个线程最多排队的图片数
+PENDING_PER_JOB = 4
+
+# 每写出多少张图片输出一次进度
+PROGRESS_EVERY = 100
+
+# 嗅探图片格式时先读取的字节数
+SNIFF_SIZE = 512
+
+IMAGE_FORMATS = ['jpeg', 'png', 'gif', 'webp', 'svg']
+TYPE_ALIASES = {'jpg': 'jpeg'}
+
+# 带尺寸的 JPEG SOF 段(排除 DHT、JPG 和 DAC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# SVG 中可以换算为像素的长度
+SVG_LENGTH_RE = re.compile(r'^\s*([0-9]*\.?[0-9]+)\s*(px)?\s*$')
+
+
+def iter_image_items(package, include_cover=False):
+    """按 manifest 顺序产出图片条目
+
+    与 ebooklib 的 ITEM_IMAGE 判定一致,另外包括 ebooklib 不认识的
+    image/* 类型(如 WebP);封面图片与以前一样默认不包括在内,
+    include_cover 为 True 时一并产出。
+    """
+    for item in package.manifest:
+        item_type = item.get_type()
+        if item_type == ITEM_IMAGE or (include_cover and item_type == ITEM_COVER) or \
+                (item_type == ITEM_UNKNOWN and (item.media_type or '').startswith('image/')):
+            yield item
+
+
+def stream_member(zf, member, output_path, chunk_size=IMAGE_CHUNK_SIZE):
+    """把 ZIP 成员(名称或 ZipInfo)分块解压写入文件,返回写入的字节数
+
+    内存占用只与 chunk_size 有关,与图片大小无关;写入失败时删除不完整的文件。
+    """
+    try:
+        with zf.open(member) as src, open(output_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, chunk_size)
+            return dst.tell()
+    except BaseException:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+
+class _PrefixedStream:
+    """先返回已读出的头部字节,再继续读取原始流"""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        if not self.head:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b''
+            return data
+        data, self.head = self.head[:size], self.head[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("图片头部不完整")
+    return data
+
+
+def _jpeg_size(stream):
+    """依次跳过 JPEG 段,直到 SOF 段取出尺寸"""
+    _read_exact(stream, 2)
+    while True:
+        byte = _read_exact(stream, 1)
+        if byte != b'\xff':
+            continue
+        marker = _read_exact(stream, 1)[0]
+        while marker == 0xFF:
+            marker = _read_exact(stream, 1)[0]
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            # 到了图像数据仍没有 SOF
+            return None, None
+        length = struct.unpack('>H', _read_exact(stream, 2))[0]
+        if length < 2:
+            # 段长度包含自身的两个字节,更小的值说明数据已损坏
+            raise ValueError("JPEG 段长度无效")
+        if marker in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack('>BHH', _read_exact(stream, 5))
+            return width, height
+        _read_exact(stream, length - 2)
+
 
+def _webp_size(head):
+    """从 VP8 / VP8L / VP8X 块头取出 WebP 尺寸"""
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and len(head) >= 30:
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(head) >= 25:
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(head) >= 30:
+        return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    return None, None
 
-def extract_images(epub_path, output_dir=None):
-    """提取 EPUB 中的所有图片"""
+
+def _svg_length(value):
+    """把 SVG 的 width/height 转换为像素数,百分比等相对单位返回 None"""
+    match = SVG_LENGTH_RE.match(value or '')
+    return round(float(match.group(1))) if match else None
+
+
+def _svg_size(stream):
+    """只解析 SVG 根元素的 width、height,缺少时使用 viewBox;根元素不是 svg 时返回 None"""
+    parser = etree.XMLPullParser(events=('start',), resolve_entities=False, no_network=True)
+    while True:
+        data = stream.read(SNIFF_SIZE)
+        if not data:
+            return None
+        parser.feed(data)
+        for _, root in parser.read_events():
+            if etree.QName(root).localname != 'svg':
+                return None
+            width, height = _svg_length(root.get('width')), _svg_length(root.get('height'))
+            view_box = (root.get('viewBox') or '').replace(',', ' ').split()
+            if (width is None or height is None) and len(view_box) == 4:
+                try:
+                    width = width if width is not None else round(float(view_box[2]))
+                    height = height if height is not None else round(float(view_box[3]))
+                except ValueError:
+                    pass
+            return width, height
+
+
+def sniff_image(stream):
+    """只读取图片头部,返回 (格式, 宽, 高);无法识别的格式返回 (None, None, None)
+
+    PNG、GIF、WebP 只需要开头的 SNIFF_SIZE 字节;JPEG 逐段跳到 SOF;
+    SVG 只解析到根元素。不解码任何像素数据。
+    """
+    head = stream.read(SNIFF_SIZE)
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', head[16:24])
+        return 'png', width, height
+    if head[:6] in (b'GIF87a', b'GIF89a') and len(head) >= 10:
+        width, height = struct.unpack('<HH', head[6:10])
+        return 'gif', width, height
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return ('webp', *_webp_size(head))
+    if head[:2] == b'\xff\xd8':
+        try:
+            return ('jpeg', *_jpeg_size(_PrefixedStream(head, stream)))
+        except (ValueError, struct.error):
+            return 'jpeg', None, None
+    if head.removeprefix(b'\xef\xbb\xbf').lstrip().startswith(b'<'):
+        try:
+            size = _svg_size(_PrefixedStream(head, stream))
+        except etree.XMLSyntaxError:
+            size = None
+        if size is not None:
+            return ('svg', *size)
+    return None, None, None
+
+
+def read_image_header(zf, info):
+    """从 ZIP 成员中嗅探图片格式和尺寸"""
+    with zf.open(info) as stream:
+        return sniff_image(stream)
+
+
+def image_matches(header, min_width=None, types=None):
+    """判断图片是否满足筛选条件;尺寸未知的图片不满足 min_width"""
+    image_format, width, _ = header
+    if types is not None and image_format not in types:
+        return False
+    return min_width is None or (width is not None and width >= min_width)
+
+
+def parse_types(value):
+    """解析逗号分隔的图片格式列表,jpg 视为 jpeg"""
+    types = set()
+    for name in value.split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        name = TYPE_ALIASES.get(name, name)
+        if name not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {name}")
+        types.add(name)
+    return types
+
+
+def inventory_images(epub_path, min_width=None, types=None):
+    """列出书中图片的格式、尺寸和大小,不解压图片内容
+
+    封面图片也包括在内,记录中的 cover 为 True。
+
+    返回:
+        按 manifest 顺序排列的记录列表,每条记录包含 source、media_type、
+        format、width、height、size(未压缩字节数)、cover;
+        头部无法读取或 ZIP 中缺失的图片不参与筛选,记录中格式和尺寸为 None
+        (缺失时 size 也为 None),另有 error 说明原因
+    """
     try:
-        book = epub.read_epub(epub_path)
+        with open_epub(epub_path) as zf:
+            package = read_package(zf)
+            records = []
+            for item in iter_image_items(package, include_cover=True):
+                info = zf.NameToInfo.get(item.path)
+                header = (None, None, None)
+                error = None
+                if info is None:
+                    error = 'EPUB 中没有该文件'
+                else:
+                    try:
+                        header = read_image_header(zf, info)
+                    except Exception as e:
+                        error = str(e)
+                if error is None and not image_matches(header, min_width, types):
+                    continue
+                image_format, width, height = header
+                record = {
+                    'source': item.href,
+                    'media_type': item.media_type,
+                    'format': image_format,
+                    'width': width,
+                    'height': height,
+                    'size': info.file_size if info is not None else None,
+                    'cover': item.get_type() == ITEM_COVER,
+                }
+                if error is not None:
+                    record['error'] = error
+                records.append(record)
+            return records
+    except Exception as e:
+        # 在库函数中抛出异常而不是调用 sys.exit
+        raise RuntimeError(f"无法读取 EPUB 文件: {e}") from e
+
+
+class NameAllocator:
+    """在内存中分配不冲突的输出文件名
+
+    开始时一次性读取输出目录中已有的文件,之后每次分配只是集合查询,
+    不再为每个候选名调用 os.path.exists。冲突时与以前一样依次尝试
+    name_1、name_2 ...,并记住每个名字下一次从哪个序号开始。
+    比较时忽略大小写,避免在不区分大小写的文件系统上互相覆盖。
+    """
+
+    def __init__(self, existing=()):
+        self.used = {name.casefold() for name in existing}
+        self.next_counter = {}
+
+    def allocate(self, name):
+        key = name.casefold()
+        if key not in self.used:
+            self.used.add(key)
+            return name
+
+        base, ext = os.path.splitext(name)
+        counter = self.next_counter.get(key, 1)
+        while True:
+            candidate = f"{base}_{counter}{ext}"
+            counter += 1
+            if candidate.casefold() not in self.used:
+                break
+        self.next_counter[key] = counter
+        self.used.add(candidate.casefold())
+        return candidate
+
+
+def list_existing_files(output_dir, recursive=False):
+    """返回输出目录中已有文件的相对路径(使用 / 分隔)"""
+    if not recursive:
+        return os.listdir(output_dir)
+
+    existing = []
+    for root, dirs, files in os.walk(output_dir):
+        relative = os.path.relpath(root, output_dir)
+        for name in files + dirs:
+            existing.append(name if relative == '.' else f'{relative}/{name}'.replace(os.sep, '/'))
+    return existing
+
+
+def output_name(package, item, keep_paths=False):
+    """图片的输出相对路径:默认只取文件名,keep_paths 时保留书内相对 OPF 目录的路径"""
+    if not keep_paths:
+        return posixpath.basename(item.path)
+    # 去掉 ..、绝对路径等成分,保证输出不会跑到目标目录之外
+    parts = [part for part in opf_relative_path(package, item).split('/') if part not in ('', '.', '..')]
+    return '/'.join(parts)
 
+
+class DuplicateFinder:
+    """按内容识别重复图片
+
+    先用中央目录中的 (大小, CRC) 筛选候选,只有候选相同时才解压计算哈希确认,
+    因此没有重复的书不会多读任何数据。
+    """
+
+    def __init__(self, zf):
+        self.zf = zf
+        self.extracted = {}
+        self.digests = {}
+
+    def _digest(self, info):
+        digest = self.digests.get(info.filename)
+        if digest is None:
+            digest = self.digests[info.filename] = member_digest(self.zf, info)
+        return digest
+
+    def find(self, info):
+        """返回内容相同的已提取图片的输出名,没有时返回 None"""
+        candidates = self.extracted.get((info.file_size, info.CRC))
+        if not candidates:
+            return None
+        digest = self._digest(info)
+        for candidate, name in candidates:
+            if self._digest(candidate) == digest:
+                return name
+        return None
+
+    def add(self, info, name):
+        """登记已提取的图片"""
+        self.extracted.setdefault((info.file_size, info.CRC), []).append((info, name))
+
+
+def link_or_copy(source_path, target_path):
+    """为重复图片创建硬链接,文件系统不支持时退回为复制"""
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+
+
+class ImageTask:
+    """一张图片的处理计划
+
+    action: 'extract' 解压写出;'link' 链接到已写出的相同图片;
+            'listed' 只在清单中指向相同图片;'missing' 成员不存在;
+            'filtered' 不满足筛选条件;'error' 筛选时无法读取图片头部
+    """
+
+    __slots__ = ('action', 'error', 'info', 'item', 'name', 'original', 'path')
+
+    def __init__(self, item, info, action, name=None, path=None, original=None, error=None):
+        self.item = item
+        self.info = info
+        self.action = action
+        self.name = name
+        self.path = path
+        self.original = original
+        self.error = error
+
+
+def plan_image_tasks(zf, package, output_dir, keep_paths=False, dedup=None, min_width=None, types=None):
+    """按 manifest 顺序产出每张图片的处理计划
+
+    文件名分配和去重判断都在这里按顺序完成,与之后是否并行写出无关,
+    因此结果总是确定的。指定 min_width 或 types 时先嗅探图片头部,
+    不满足条件的图片不会被解压写出。
+    """
+    names = NameAllocator(list_existing_files(output_dir, recursive=keep_paths))
+    if dedup == 'manifest':
+        names.allocate(MANIFEST_NAME)
+    duplicates = DuplicateFinder(zf) if dedup else None
+
+    for item in iter_image_items(package):
+        try:
+            info = zf.getinfo(item.path)
+        except KeyError:
+            yield ImageTask(item, None, 'missing')
+            continue
+
+        if min_width is not None or types is not None:
+            try:
+                header = read_image_header(zf, info)
+            except Exception as e:
+                # 损坏的图片只跳过这一张
+                yield ImageTask(item, info, 'error', error=e)
+                continue
+            if not image_matches(header, min_width, types):
+                yield ImageTask(item, info, 'filtered')
+                continue
+
+        # 内容相同的图片不再重复解压写出;无法解压比较时按不重复处理,
+        # 损坏的图片在写出时再报告跳过
+        original = None
+        if duplicates is not None:
+            with suppress(Exception):
+                original = duplicates.find(info)
+        if original is not None and dedup == 'manifest':
+            yield ImageTask(item, info, 'listed', name=original)
+            continue
+
+        # 在内存中分配不冲突的文件名
+        image_name = names.allocate(output_name(package, item, keep_paths))
+        image_path = os.path.join(output_dir, *image_name.split('/'))
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+
+        if original is not None:
+            original_path = os.path.join(output_dir, *original.split('/'))
+            yield ImageTask(item, info, 'link', image_name, image_path, original_path)
+        else:
+            if duplicates is not None:
+                duplicates.add(info, image_name)
+            yield ImageTask(item, info, 'extract', image_name, image_path)
+
+
+def run_image_task(zf, task):
+    """执行写出或链接,返回写入的字节数"""
+    if task.action == 'link':
+        try:
+            link_or_copy(task.original, task.path)
+            return task.info.file_size
+        except OSError:
+            # 原图写出失败时直接从 EPUB 中解压
+            pass
+    return stream_member(zf, task.info, task.path)
+
+
+def iter_image_results(zf, tasks, jobs=1):
+    """按计划顺序产出 (任务, 写入字节数, 异常)
+
+    jobs 大于 1 时写出交给线程池,最多 jobs * PENDING_PER_JOB 张图片同时在途,
+    读取速度快于写出速度时主线程会等待,内存占用有界。链接任务在所有写出
+    完成后再执行,保证链接的原图已经存在。
+    """
+    links = []
+
+    def run(task):
+        try:
+            return task, run_image_task(zf, task), None
+        except Exception as e:
+            return task, 0, e
+
+    if jobs == 1:
+        for task in tasks:
+            if task.action == 'link':
+                links.append(task)
+            elif task.action == 'extract':
+                yield run(task)
+            else:
+                yield task, 0, task.error
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = deque()
+            max_pending = jobs * PENDING_PER_JOB
+            for task in tasks:
+                if task.action == 'link':
+                    links.append(task)
+                    continue
+                if task.action != 'extract':
+                    # 不需要写出的任务也按顺序排队,保持产出顺序
+                    pending.append((task, None))
+                else:
+                    pending.append((task, executor.submit(run, task)))
+                while len(pending) >= max_pending or (pending and pending[0][1] is None):
+                    task, future = pending.popleft()
+                    yield future.result() if future is not None else (task, 0, task.error)
+            while pending:
+                task, future = pending.popleft()
+                yield future.result() if future is not None else (task, 0, task.error)
+
+    for task in links:
+        yield run(task)
+
+
+class Progress:
+    """按批输出提取进度和吞吐量,代替逐张图片输出"""
+
+    def __init__(self, total, every=None):
+        self.total = total
+        self.every = PROGRESS_EVERY if every is None else every
+        self.files = 0
+        self.bytes = 0
+        self.start = time.monotonic()
+
+    def update(self, size):
+        self.files += 1
+        self.bytes += size
+        if self.every and self.files % self.every == 0:
+            print(f"进度: {self.files}/{self.total} 张, {self.rates()}")
+
+    def rates(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        return f"{self.files / elapsed:.1f} 张/秒, {self.bytes / elapsed / 1024 / 1024:.1f} MB/秒"
+
+
+def extract_images(epub_path, output_dir=None, keep_paths=False, dedup=None, jobs=1,
+                   min_width=None, types=None):
+    """提取 EPUB 中的所有图片
+
+    参数:
+        keep_paths: 保留图片在书中的目录结构,而不是全部放在同一目录
+        dedup: 内容相同的图片的处理方式
+               None 每张都写出;'link' 重复的图片用硬链接;
+               'manifest' 重复的图片不写出,在 images.json 中指向同一个文件
+        jobs: 并行写出图片的线程数,适合单个文件延迟较高的网络文件系统
+        min_width: 只提取宽度不小于该值的图片(根据图片头部判断)
+        types: 只提取这些格式的图片,如 {'jpeg', 'png'}
+    """
+    if dedup not in DEDUP_MODES:
+        raise ValueError(f"不支持的去重方式: {dedup}")
+
+    try:
+        # 只读取中央目录和 OPF,图片内容在写出时才逐个解压
+        zf = open_epub(epub_path)
+        package = read_package(zf)
+    except Exception as e:
+        print(f"错误: 无法读取 EPUB 文件 - {e}", file=sys.stderr)
+        sys.exit(1)
+
+    with zf:
         # 默认输出目录
         if output_dir is None:
             base_name = os.path.splitext(os.path.basename(epub_path))[0]
@@ -23,62 +572,119 @@ def extract_images(epub_path, output_dir=None):
         os.makedirs(output_dir, exist_ok=True)
 
         image_count = 0
+        duplicate_count = 0
         skipped_count = 0
+        filtered_count = 0
+        manifest = []
+        progress = Progress(sum(1 for _ in iter_image_items(package)))
 
-        for item in book.get_items():
-            if item.get_type() == ITEM_IMAGE:
-                # 获取图片文件名
-                image_name = item.get_name()
-
-                # 替换路径中的目录,确保所有图片在同一目录
-                image_name = os.path.basename(image_name)
+        tasks = plan_image_tasks(zf, package, output_dir, keep_paths, dedup, min_width, types)
+        for task, size, error in iter_image_results(zf, tasks, jobs):
+            if task.action == 'filtered':
+                filtered_count += 1
+                continue
+            if task.action == 'missing':
+                print(f"✗ 跳过: {task.item.href} (EPUB 中没有该文件)", file=sys.stderr)
+                skipped_count += 1
+                continue
+            if error is not None:
+                print(f"✗ 跳过: {task.item.href} ({error})", file=sys.stderr)
+                skipped_count += 1
+                continue
 
-                # 如果文件名冲突,添加数字后缀
-                base, ext = os.path.splitext(image_name)
-                counter = 1
-                while os.path.exists(os.path.join(output_dir, image_name)):
-                    image_name = f"{base}_{counter}{ext}"
-                    counter += 1
+            if task.action == 'extract':
+                image_count += 1
+            else:
+                duplicate_count += 1
+            manifest.append({'source': task.item.href, 'file': task.name})
+            progress.update(size)
 
-                # 保存图片
-                image_path = os.path.join(output_dir, image_name)
-
-                try:
-                    with open(image_path, 'wb') as f:
-                        f.write(item.get_content())
-                    image_count += 1
-                    print(f"✓ 提取: {image_name}")
-                except Exception as e:
-                    print(f"✗ 跳过: {item.get_name()} ({e})", file=sys.stderr)
-                    skipped_count += 1
-
-        print(f"\n完成!")
-        print(f"  提取图片: {image_count} 张")
-        if skipped_count > 0:
-            print(f"  跳过图片: {skipped_count} 张")
-        print(f"  保存位置: {output_dir}")
+        if dedup == 'manifest':
+            # 清单按 manifest 顺序排列,与写出完成的先后无关
+            order = {item.href: num for num, item in enumerate(iter_image_items(package))}
+            manifest.sort(key=lambda entry: order[entry['source']])
+            with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
 
-    except Exception as e:
-        print(f"错误: 无法读取 EPUB 文件 - {e}", file=sys.stderr)
-        sys.exit(1)
+    print(f"\n完成!")
+    print(f"  提取图片: {image_count} 张")
+    if dedup:
+        print(f"  重复图片: {duplicate_count} 张")
+    if filtered_count > 0:
+        print(f"  筛除图片: {filtered_count} 张")
+    if skipped_count > 0:
+        print(f"  跳过图片: {skipped_count} 张")
+    print(f"  速度: {progress.rates()}")
+    print(f"  保存位置: {output_dir}")
 
 
 def main():
     if len(sys.argv) < 2:
-        print("使用方法: python extract_images.py <epub文件路径> [输出目录]", file=sys.stderr)
+        print("使用方法: python extract_images.py <epub文件路径> [输出目录] [--keep-paths] [--dedup link|manifest] "
+              "[--jobs N] [--min-width N] [--types jpeg,png]", file=sys.stderr)
+        print("          python extract_images.py <epub文件路径> --inventory [清单.json]", file=sys.stderr)
         print("\n示例:")
         print("  python extract_images.py book.epub")
         print("  python extract_images.py book.epub my_images/", file=sys.stderr)
+        print("  python extract_images.py book.epub my_images/ --keep-paths --dedup link", file=sys.stderr)
+        print("  python extract_images.py book.epub /mnt/nfs/images/ --jobs 8", file=sys.stderr)
+        print("  python extract_images.py book.epub --inventory --min-width 600", file=sys.stderr)
         sys.exit(1)
 
-    epub_path = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) >= 3 else None
+    parser = argparse.ArgumentParser(description='从 EPUB 文件中提取所有图片')
+    parser.add_argument('epub_path', help='EPUB 文件路径')
+    parser.add_argument('output_dir', nargs='?', help='输出目录 (默认: <书名>_images)')
+    parser.add_argument('--keep-paths', action='store_true',
+                        help='保留图片在书中的目录结构')
+    parser.add_argument('--dedup', choices=['link', 'manifest'],
+                        help='内容相同的图片: link 使用硬链接; manifest 只写一份并记录在 images.json 中')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='并行写出图片的线程数 (默认: 1)')
+    parser.add_argument('--inventory', nargs='?', const='-', metavar='FILE',
+                        help='不提取图片,只输出图片格式、尺寸和大小的 JSON 清单 (默认输出到标准输出)')
+    parser.add_argument('--min-width', type=int, metavar='N',
+                        help='只处理宽度不小于 N 像素的图片')
+    parser.add_argument('--types', metavar='LIST',
+                        help=f"只处理这些格式的图片,逗号分隔 ({', '.join(IMAGE_FORMATS)})")
+    args = parser.parse_args()
 
-    if not os.path.exists(epub_path):
-        print(f"错误: 找不到文件 {epub_path}", file=sys.stderr)
+    if args.jobs < 1:
+        print("错误: --jobs 必须大于 0", file=sys.stderr)
         sys.exit(1)
 
-    extract_images(epub_path, output_dir)
+    types = None
+    if args.types is not None:
+        try:
+            types = parse_types(args.types)
+        except ValueError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.inventory and args.output_dir:
+        print("错误: --inventory 只输出清单,不能同时指定输出目录", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.exists(args.epub_path):
+        print(f"错误: 找不到文件 {args.epub_path}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.inventory:
+        try:
+            records = inventory_images(args.epub_path, min_width=args.min_width, types=types)
+        except RuntimeError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+
+        document = json.dumps({'file': args.epub_path, 'images': records}, ensure_ascii=False, indent=2)
+        if args.inventory == '-':
+            print(document)
+        else:
+            with open(args.inventory, 'w', encoding='utf-8') as f:
+                f.write(document + '\n')
+        return
+
+    extract_images(args.epub_path, args.output_dir, keep_paths=args.keep_paths, dedup=args.dedup,
+                   jobs=args.jobs, min_width=args.min_width, types=types)
 
 
 if __name__ == "__main__":
@@ -5,15 +5,25 @@
 """
 import sys
 import json
-from ebooklib import epub
-from ebooklib import ITEM_DOCUMENT, ITEM_IMAGE, ITEM_STYLE, ITEM_NAVIGATION
+from ebooklib import ITEM_DOCUMENT, ITEM_IMAGE
+
+from epub_zip import open_epub, read_package
 
 
 def extract_metadata(epub_path):
-    """提取并返回 EPUB 的元数据"""
+    """提取并返回 EPUB 的元数据
+
+    只读取 container.xml 和 OPF 包文件,章节和图片内容不会被解压,
+    因此耗时与书籍大小无关。
+    """
     try:
-        # 使用 ignore_ncx 选项避免 ebooklib 的 NCX 处理 bug
-        book = epub.read_epub(epub_path, options={'ignore_ncx': True})
+        with open_epub(epub_path) as zf:
+            book = read_package(zf)
+            # 与 ebooklib 一样,manifest 引用的文件必须存在(只查中央目录)
+            names = set(zf.namelist())
+            for item in book.manifest:
+                if item.path not in names:
+                    raise ValueError(f"找不到 manifest 引用的文件: {item.path}")
 
         metadata = {
             'file': epub_path,
@@ -66,8 +76,8 @@ def extract_metadata(epub_path):
         if descriptions:
             metadata['description'] = descriptions[0][0]
 
-        # 统计章节和图片
-        for item in book.get_items():
+        # 根据 manifest 媒体类型统计章节和图片
+        for item in book.manifest:
             if item.get_type() == ITEM_DOCUMENT:
                 metadata['chapters_count'] += 1
             elif item.get_type() == ITEM_IMAGE:
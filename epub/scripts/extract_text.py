@@ -1,67 +1,145 @@
 #!/usr/bin/env python3
 """
 从 EPUB 文件中提取纯文本内容
-使用方法: python extract_text.py <epub文件路径> [输出文件路径]
+使用方法: python extract_text.py <epub文件路径> [输出文件路径] [--parser lxml|html.parser] [--stream]
 """
+import os
 import sys
-from ebooklib import epub
-from ebooklib import ITEM_DOCUMENT, ITEM_IMAGE, ITEM_STYLE, ITEM_NAVIGATION
-from bs4 import BeautifulSoup
+import argparse
+from contextlib import ExitStack
 
+from epub_zip import iter_chapters, iter_spine_streams, open_epub, read_package
+from html_engine import parse_html, iter_text_stream, PARSERS, DEFAULT_PARSER
 
-def extract_text_from_epub(epub_path):
-    """从 EPUB 中提取所有纯文本"""
-    try:
-        book = epub.read_epub(epub_path)
-        full_text = []
-        chapter_num = 0
 
-        for item in book.get_items():
-            if item.get_type() == ITEM_DOCUMENT:
-                chapter_num += 1
-                content = item.get_content().decode('utf-8')
-                soup = BeautifulSoup(content, 'html.parser')
+# 提取文本时整体移除的标签;head 中的 <title> 不属于正文
+REMOVED_TAGS = ['head', 'script', 'style', 'nav']
+
+
+def chapter_header(chapter_num):
+    """章节之间的分隔标题"""
+    return f"\n{'='*60}\n第 {chapter_num} 章\n{'='*60}\n"
+
+
+def stream_text_from_epub(epub_path):
+    """以事件驱动方式提取纯文本,逐段产出文本片段
+
+    章节从 ZIP 中分块解压并送入增量解析器,不构建文档树,
+    head/script/style/nav 子树在解析时直接跳过。所有片段依次拼接后
+    与 extract_text_from_epub 的结果相同。
+    """
+    with open_epub(epub_path) as zf:
+        package = read_package(zf)
+        for chapter_num, (_, stream) in enumerate(iter_spine_streams(zf, package), start=1):
+            prefix = '\n' if chapter_num > 1 else ''
+            yield prefix + chapter_header(chapter_num) + '\n'
+
+            separator = ''
+            for text in iter_text_stream(stream, REMOVED_TAGS):
+                yield separator + text
+                separator = '\n'
+
 
-                # 移除脚本和样式
-                for script in soup(['script', 'style', 'nav']):
-                    script.decompose()
+def iter_chapter_texts(epub_path, parser=DEFAULT_PARSER):
+    """按书脊顺序逐章产出 (章节序号, 章节纯文本)
 
-                # 提取文本
-                text = soup.get_text(separator='\n', strip=True)
+    每次只解压和解析一个章节,调用方处理完一章后才会读取下一章。
+    """
+    for chapter_num, (_, content) in enumerate(iter_chapters(epub_path), start=1):
+        doc = parse_html(content, parser)
 
-                # 添加章节标题
-                full_text.append(f"\n{'='*60}\n第 {chapter_num} 章\n{'='*60}\n")
-                full_text.append(text)
+        # 移除 head、脚本和样式
+        doc.remove_tags(REMOVED_TAGS)
 
-        return '\n'.join(full_text)
+        # 提取文本
+        yield chapter_num, doc.get_text(separator='\n', strip=True)
+
+
+def iter_text_chunks(epub_path, parser=DEFAULT_PARSER, stream=False):
+    """产出带章节标题的文本片段,依次拼接即为 extract_text_from_epub 的结果
+
+    默认每章一个片段;stream 为 True 时使用事件驱动解析,片段更细,
+    单个超大章节也不会整体驻留内存。
+    """
+    if stream:
+        yield from stream_text_from_epub(epub_path)
+        return
+
+    for chapter_num, text in iter_chapter_texts(epub_path, parser):
+        # 添加章节标题
+        prefix = '\n' if chapter_num > 1 else ''
+        yield prefix + chapter_header(chapter_num) + '\n' + text
+
+
+def extract_text_from_epub(epub_path, parser=DEFAULT_PARSER, stream=False):
+    """从 EPUB 中提取所有纯文本,章节按书脊顺序逐个解压和解析
+
+    参数:
+        epub_path: EPUB 文件路径
+        parser: HTML 解析器, 'lxml'(默认)或 'html.parser'
+        stream: 使用事件驱动的流式解析,不构建文档树(忽略 parser)
+    """
+    try:
+        return ''.join(iter_text_chunks(epub_path, parser, stream))
 
     except Exception as e:
         print(f"错误: 无法读取 EPUB 文件 - {e}", file=sys.stderr)
         sys.exit(1)
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("使用方法: python extract_text.py <epub文件路径> [输出文件路径]", file=sys.stderr)
-        sys.exit(1)
+def write_text(epub_path, output_path=None, parser=DEFAULT_PARSER, stream=False):
+    """边提取边把文本片段写入文件或标准输出,每个片段写完立即刷新
 
-    epub_path = sys.argv[1]
+    通过管道交给下游程序时,第一章解析完成即可开始消费。
+    """
+    # 文件和标准输出共用同一条关闭路径,只有打开的文件会被关闭
+    with ExitStack() as files:
+        if output_path:
+            try:
+                output = files.enter_context(open(output_path, 'w', encoding='utf-8'))
+            except Exception as e:
+                print(f"错误: 无法写入输出文件 - {e}", file=sys.stderr)
+                sys.exit(1)
+        else:
+            output = sys.stdout
 
-    # 提取文本
-    text = extract_text_from_epub(epub_path)
-
-    # 输出到文件或标准输出
-    if len(sys.argv) >= 3:
-        output_path = sys.argv[2]
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(text)
-            print(f"文本已提取到: {output_path}")
+            for chunk in iter_text_chunks(epub_path, parser, stream):
+                output.write(chunk)
+                output.flush()
+            if not output_path:
+                output.write('\n')
+                output.flush()
+        except BrokenPipeError:
+            # 下游程序提前关闭了管道(例如 head),静默退出
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            sys.exit(1)
         except Exception as e:
-            print(f"错误: 无法写入输出文件 - {e}", file=sys.stderr)
+            print(f"错误: 无法读取 EPUB 文件 - {e}", file=sys.stderr)
             sys.exit(1)
-    else:
-        print(text)
+
+    if output_path:
+        print(f"文本已提取到: {output_path}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("使用方法: python extract_text.py <epub文件路径> [输出文件路径] "
+              "[--parser lxml|html.parser] [--stream]", file=sys.stderr)
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description='从 EPUB 文件中提取纯文本内容')
+    parser.add_argument('epub_path', help='EPUB 文件路径')
+    parser.add_argument('output_path', nargs='?', help='输出文件路径 (默认: 标准输出)')
+    parser.add_argument('--parser', choices=PARSERS, default=DEFAULT_PARSER,
+                        help='HTML 解析器 (默认: lxml)')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式解析章节,边读边输出,适合超大的单文件章节')
+    args = parser.parse_args()
+
+    # 逐章提取并输出到文件或标准输出
+    write_text(args.epub_path, args.output_path, parser=args.parser, stream=args.stream)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+章节 HTML 解析层,支持 lxml 和 BeautifulSoup 两种后端
+
+默认使用 lxml.html(libxml2 实现,速度快);lxml 无法解析的文档会自动
+回退到 BeautifulSoup 的纯 Python 'html.parser'。两种后端提供相同的接口:
+
+    doc = parse_html(content, parser='lxml')
+    doc.remove_tags(['script', 'style'])
+    doc.find('h1'), doc.find_all(['h1', 'p']), doc.get_text(), str(doc)
+    for event, value, attrs in doc.iter_events(): ...
+
+iter_events() 以深度优先顺序产出 ('start', 标签, 属性)、('text', 文本, None)
+和 ('end', 标签, None) 事件,每个文本节点只产出一次,注释等非文本节点被跳过。
+
+元素对象提供 name、get()、get_text()、find()、find_all() 和 replace_with()。
+
+parse_counts 记录每种后端实际完成的解析次数,便于确认每个章节只解析一次。
+
+iter_text_stream() 不构建文档树,而是把章节分块送入 lxml 的事件式解析器,
+边读边产出文本,适合单个章节就有几十 MB 的书籍:
+
+    for text in iter_text_stream(stream, skip_tags=['script', 'style']): ...
+"""
+import lxml.html
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from lxml import etree
+
+
+PARSERS = ['lxml', 'html.parser']
+DEFAULT_PARSER = 'lxml'
+
+# EPUB 章节统一按 UTF-8 解码,与 ebooklib 读取时一致
+_LXML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+
+# 流式解析时每次送入解析器的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 各后端的解析次数
+parse_counts = dict.fromkeys(PARSERS, 0)
+
+
+def reset_parse_counts():
+    """将解析计数清零"""
+    for name in parse_counts:
+        parse_counts[name] = 0
+
+
+def _join_text(strings, separator, strip):
+    """按 BeautifulSoup.get_text 的规则拼接文本片段"""
+    if strip:
+        strings = [s.strip() for s in strings]
+        strings = [s for s in strings if s]
+    return separator.join(strings)
+
+
+class LxmlElement:
+    """lxml 元素的适配器,提供与 bs4 Tag 相同的常用方法"""
+
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def name(self):
+        return self.element.tag
+
+    def get(self, key, default=None):
+        return self.element.get(key, default)
+
+    def get_text(self, separator='', strip=False):
+        return _join_text(list(self.element.itertext()), separator, strip)
+
+    def find(self, name):
+        for element in self.element.iter(name):
+            if element is not self.element:
+                return LxmlElement(element)
+        return None
+
+    def find_all(self, names):
+        if isinstance(names, str):
+            names = [names]
+        return [LxmlElement(e) for e in self.element.iter(*names) if e is not self.element]
+
+    def replace_with(self, text):
+        """用纯文本替换该元素,保留其后的尾随文本"""
+        element = self.element
+        parent = element.getparent()
+        if parent is None:
+            return
+        addition = text + (element.tail or '')
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + addition
+        else:
+            parent.text = (parent.text or '') + addition
+        parent.remove(element)
+
+
+class LxmlDocument:
+    """基于 lxml.html 的文档"""
+
+    parser = 'lxml'
+
+    def __init__(self, root):
+        self.root = root
+
+    def remove_tags(self, names):
+        for element in list(self.root.iter(*names)):
+            element.drop_tree()
+
+    def find(self, name):
+        element = next(self.root.iter(name), None)
+        return LxmlElement(element) if element is not None else None
+
+    def find_all(self, names):
+        if isinstance(names, str):
+            names = [names]
+        return [LxmlElement(e) for e in self.root.iter(*names)]
+
+    def get_text(self, separator='\n', strip=True):
+        return _join_text(list(self.root.itertext()), separator, strip)
+
+    def iter_events(self):
+        root = self.root
+        yield 'start', root.tag, root.attrib
+        if root.text:
+            yield 'text', root.text, None
+
+        # 显式栈代替递归,深层嵌套的文档也不会超出递归深度
+        parents = [root]
+        stack = [iter(root)]
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                element = parents.pop()
+                yield 'end', element.tag, None
+                if stack and element.tail:
+                    yield 'text', element.tail, None
+            elif isinstance(child.tag, str):
+                yield 'start', child.tag, child.attrib
+                if child.text:
+                    yield 'text', child.text, None
+                parents.append(child)
+                stack.append(iter(child))
+            elif child.tail:
+                # 注释和处理指令本身跳过,但保留其后的文本
+                yield 'text', child.tail, None
+
+    def __str__(self):
+        return lxml.html.tostring(self.root, encoding='unicode')
+
+
+class SoupDocument:
+    """基于 BeautifulSoup 的文档,元素直接使用 bs4 Tag"""
+
+    parser = 'html.parser'
+
+    def __init__(self, soup):
+        self.soup = soup
+
+    def remove_tags(self, names):
+        for tag in self.soup(names):
+            tag.decompose()
+
+    def find(self, name):
+        return self.soup.find(name)
+
+    def find_all(self, names):
+        return self.soup.find_all(names)
+
+    def get_text(self, separator='\n', strip=True):
+        return self.soup.get_text(separator=separator, strip=strip)
+
+    def iter_events(self):
+        parents = []
+        stack = [iter(self.soup.contents)]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                if parents:
+                    yield 'end', parents.pop().name, None
+            elif isinstance(node, Tag):
+                yield 'start', node.name, node.attrs
+                parents.append(node)
+                stack.append(iter(node.contents))
+            elif type(node) in (NavigableString, CData):
+                yield 'text', str(node), None
+
+    def __str__(self):
+        return str(self.soup)
+
+
+def parse_html(content, parser=DEFAULT_PARSER):
+    """解析章节 HTML,返回 LxmlDocument 或 SoupDocument
+
+    参数:
+        content: 章节内容(bytes 或 str)
+        parser: 'lxml' 或 'html.parser'
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"不支持的解析器: {parser}")
+
+    if parser == 'lxml':
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        try:
+            root = lxml.html.document_fromstring(data, parser=_LXML_PARSER)
+        except (etree.ParserError, ValueError):
+            # lxml 无法处理的文档回退到纯 Python 解析器
+            pass
+        else:
+            parse_counts['lxml'] += 1
+            return LxmlDocument(root)
+
+    parse_counts['html.parser'] += 1
+    return SoupDocument(BeautifulSoup(content, 'html.parser'))
+
+
+class _TextTarget:
+    """lxml 解析器的事件接收器,收集文本节点并跳过指定标签的子树
+
+    连续的 data 回调(跨块或被实体拆开)会先合并成完整的文本节点再输出,
+    因此结果与 get_text(separator, strip=True) 的切分方式一致。
+    """
+
+    def __init__(self, skip_tags):
+        self.skip_tags = frozenset(skip_tags)
+        self.skip_depth = 0
+        self.buffer = []
+        self.texts = []
+
+    def _flush(self):
+        if self.buffer:
+            text = ''.join(self.buffer).strip()
+            self.buffer = []
+            if text:
+                self.texts.append(text)
+
+    def start(self, tag, attrib):
+        self._flush()
+        if self.skip_depth or tag in self.skip_tags:
+            self.skip_depth += 1
+
+    def end(self, tag):
+        self._flush()
+        if self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, text):
+        if not self.skip_depth:
+            self.buffer.append(text)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def close(self):
+        self._flush()
+
+
+def iter_text_stream(stream, skip_tags=(), chunk_size=STREAM_CHUNK_SIZE):
+    """从文件对象中分块读取 HTML,逐个产出去除首尾空白后的非空文本节点
+
+    参数:
+        stream: 以二进制方式打开的文件对象(如 ZipFile.open() 的返回值)
+        skip_tags: 整个子树都跳过的标签,例如 script、style、nav
+        chunk_size: 每次读取的字节数
+
+    内存占用只与块大小和单个文本节点的长度有关,与章节大小无关。
+    """
+    target = _TextTarget(skip_tags)
+    parser = etree.HTMLParser(encoding='utf-8', target=target)
+    fed = False
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        fed = True
+        if target.texts:
+            yield from target.texts
+            target.texts = []
+    # 空章节从未送入数据,此时 close() 会报 "no element found"
+    if fed:
+        parser.close()
+        yield from target.texts
@@ -2,97 +2,448 @@
 """
 合并多个 EPUB 文件为一个
 使用方法: python merge_epubs.py <输出文件.epub> <输入文件1.epub> <输入文件2.epub> ...
+          python merge_epubs.py <输出文件.epub> --files-from <路径列表文件>
+
+合并直接在 ZIP 层完成:每本书 manifest 中的成员(章节、图片、字体、样式等)
+连同原始压缩数据一起搬到输出文件的 EPUB/book<N>/ 目录下,保持书内的相对路径,
+不解压也不重新压缩;只有 OPF、NCX 和导航文档是重新生成的。
+
+输入逐本处理:一本书的成员写入输出后即关闭该书,跨书只保留 MergeIndex 中
+生成 OPF 和目录所需的条目,因此合并几百本书时峰值内存约为一本书加上索引。
+后面几本书的 OPF 解析在线程池中提前进行(--prefetch),写入顺序始终与输入顺序一致。
+
+各书之间内容相同的图片、字体和样式表只保存一份,引用它们的章节改写为指向
+规范副本(--no-dedup 关闭)。
 """
 import sys
 import os
-from ebooklib import epub
-from ebooklib import ITEM_DOCUMENT, ITEM_IMAGE, ITEM_STYLE, ITEM_NAVIGATION
+import re
+import argparse
+import posixpath
+import shutil
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from ebooklib import ITEM_COVER, ITEM_DOCUMENT, ITEM_FONT, ITEM_IMAGE, ITEM_STYLE
+
+from epub_zip import (
+    CSS_REFERENCE_RE, NCX_MEDIA_TYPE, OPF_DIR, copy_member_raw, iter_css_references,
+    member_digest, open_epub, opf_relative_path, read_file_list, read_package, resolve_reference, start_epub,
+    write_package,
+)
+
+
+# 默认在后台提前准备的输入数量
+PREFETCH = 4
+
+# 后台预读输入文件时每次读取的字节数,只用于填充页缓存,不保留数据
+WARM_CHUNK_SIZE = 64 * 1024
+
+# 按内容去重的资源类型
+DEDUP_TYPES = {ITEM_IMAGE, ITEM_COVER, ITEM_FONT, ITEM_STYLE}
+
+# SVG 虽然属于 ITEM_IMAGE,但可能引用书内其他文件,不参与去重,
+# 而是与章节一样改写其中的引用
+SVG_MEDIA_TYPE = 'image/svg+xml'
+
+# 章节中可能指向资源的属性
+HTML_REFERENCE_RE = re.compile(r'''(\s(?:src|href|xlink:href)\s*=\s*)(["'])(.*?)\2''', re.IGNORECASE | re.DOTALL)
+
+
+
+def book_member_href(package, item, prefix):
+    """计算条目在合并后相对于 OPF 目录的路径
+
+    书内成员保持相对 OPF 目录的布局,章节之间以及章节到图片的相对链接无需改写。
+    """
+    return f'{prefix}/{opf_relative_path(package, item)}'
+
+
+class StoredResource:
+    """已写入输出的可去重资源"""
+
+    __slots__ = ('digest', 'href', 'info', 'input_file', 'targets')
+
+    def __init__(self, href, input_file, info, targets, digest=None):
+        self.href = href
+        self.input_file = input_file
+        self.info = info
+        # 样式表引用的资源(去重后的规范路径),只有引用也相同的样式表才视为重复
+        self.targets = targets
+        self.digest = digest
+
+
+class MergeIndex:
+    """合并过程中跨书保留的索引:manifest、书脊和目录条目
+
+    只保存字符串元组和已写入资源的中央目录信息,不引用任何输入书的
+    ZIP、OPF 树或成员内容。
+    """
+
+    def __init__(self):
+        self.manifest = []     # [(id, href, 媒体类型, properties)]
+        self.spine = []        # [id]
+        self.toc = []          # [(标题, href)]
+        self.has_cover = False
+        self.resources = {}    # {(原始大小, CRC): [StoredResource]}
+        self.duplicates = 0
+        self.bytes_saved = 0
+
+    def find_duplicate(self, zf, info, targets=()):
+        """查找内容相同的已写入资源,返回 (规范 href 或 None, 本成员的哈希)
+
+        先用中央目录中的大小和 CRC 筛选,只有可能重复时才解压计算哈希,
+        因此各不相同的资源仍然不需要解压。
+        """
+        candidates = self.resources.get((info.file_size, info.CRC))
+        if not candidates:
+            return None, None
+
+        digest = member_digest(zf, info)
+        for stored in candidates:
+            if stored.targets != targets:
+                continue
+            if stored.digest is None:
+                with open_epub(stored.input_file) as stored_zf:
+                    stored.digest = member_digest(stored_zf, stored.info)
+            if stored.digest == digest:
+                return stored.href, digest
+        return None, digest
+
+    def add_resource(self, href, input_file, info, targets=(), digest=None):
+        """登记一个已写入的资源,供后面的书去重"""
+        key = (info.file_size, info.CRC)
+        self.resources.setdefault(key, []).append(StoredResource(href, input_file, info, targets, digest))
+
+
+class PreparedBook:
+    """已读取 OPF 并确定了搬运计划的输入书,不包含任何成员内容"""
+
+    def __init__(self, input_file, book_num, title):
+        self.input_file = input_file
+        self.book_num = book_num
+        self.title = title
+        self.members = []      # [(ZipInfo, href, id, 媒体类型, properties, 条目类型)]
+        self.chapters = []     # [(id, href)],按书脊顺序
+        self.warnings = []
+
+
+def prepare_book(input_file, book_num):
+    """打开一本输入书,解析 OPF 并生成搬运计划
+
+    只读取 ZIP 中央目录、container.xml 和 OPF,可以在线程池中提前执行。
+    """
+    with open_epub(input_file) as zf:
+        package = read_package(zf)
+        prefix = f'book{book_num}'
+
+        # 获取原书名作为章节组标题
+        titles = package.get_metadata('DC', 'title')
+        book_title = titles[0][0] if titles and titles[0][0] else f'书{book_num}'
+        book = PreparedBook(input_file, book_num, book_title)
+
+        item_ids = {}
+        for item in package.manifest:
+            # 导航文档和 NCX 由合并后的目录替代
+            if item.media_type == NCX_MEDIA_TYPE or 'nav' in item.properties:
+                continue
+            try:
+                info = zf.getinfo(item.path)
+            except KeyError:
+                book.warnings.append(f"找不到 manifest 引用的文件 {item.path}, 跳过")
+                continue
+
+            href = book_member_href(package, item, prefix)
+            item_id = f'{prefix}_{item.id}'
+            item_ids[item.id] = (item_id, href)
+            book.members.append((info, href, item_id, item.media_type, list(item.properties),
+                                 item.get_type()))
+
+        for item in package.iter_spine_items():
+            if item.id in item_ids:
+                book.chapters.append(item_ids[item.id])
+
+    return book
+
+
+def rewrite_reference(reference, base_href, aliases):
+    """若引用指向被去重的资源,改为指向规范副本的相对路径"""
+    target = resolve_reference(base_href, reference)
+    canonical = aliases.get(target)
+    if canonical is None:
+        return reference
+    fragment = reference[len(reference.split('#', 1)[0]):]
+    base_dir = posixpath.dirname(base_href) or '.'
+    return quote(posixpath.relpath(canonical, base_dir)) + fragment
+
+
+def rewrite_css(text, base_href, aliases):
+    """改写 CSS 中 url() 和 @import 的引用"""
+    def replace(match):
+        if match.group(2) is not None:
+            reference = match.group(2)
+            new = rewrite_reference(reference, base_href, aliases)
+            return match.group(0) if new == reference else f'url({match.group(1)}{new}{match.group(1)})'
+        reference = match.group(4)
+        new = rewrite_reference(reference, base_href, aliases)
+        return match.group(0) if new == reference else f'@import {match.group(3)}{new}{match.group(3)}'
+
+    return CSS_REFERENCE_RE.sub(replace, text)
+
+
+def rewrite_document(text, base_href, aliases):
+    """改写章节中 src/href/xlink:href 属性以及内联样式的引用"""
+    def replace(match):
+        reference = match.group(3)
+        new = rewrite_reference(reference, base_href, aliases)
+        if new == reference:
+            return match.group(0)
+        return f'{match.group(1)}{match.group(2)}{new}{match.group(2)}'
+
+    return rewrite_css(HTML_REFERENCE_RE.sub(replace, text), base_href, aliases)
+
+
+def is_dedup_member(media_type, item_type):
+    """判断成员是否按内容去重"""
+    return item_type in DEDUP_TYPES and media_type != SVG_MEDIA_TYPE
 
 
-def merge_epubs(input_files, output_file):
+def _member_order(member):
+    """先写图片和字体,再写样式表,最后写章节、SVG 等其他成员,使改写引用前别名已经确定"""
+    media_type, item_type = member[3], member[5]
+    if item_type == ITEM_STYLE:
+        return 1
+    return 0 if is_dedup_member(media_type, item_type) else 2
+
+
+def order_members(members, zf):
+    """按 _member_order 排序,样式表之间再按 @import 依赖排序,返回 (成员列表, 样式表文本)
+
+    被导入的样式表排在导入它的样式表之前,这样导入方计算引用目标和改写
+    @import 时,被导入方是否被去重已经确定。循环导入按 manifest 顺序打断。
+    """
+    members = sorted(members, key=_member_order)
+    styles = [member for member in members if member[5] == ITEM_STYLE]
+    if not styles:
+        return members, {}
+
+    texts = {member[1]: zf.read(member[0]).decode('utf-8', errors='surrogateescape') for member in styles}
+    by_href = {member[1]: member for member in styles}
+    ordered = []
+    visited = set()
+    for member in styles:
+        if member[1] in visited:
+            continue
+        # 显式栈的后序遍历,导入链很长时也不会超出递归深度
+        visited.add(member[1])
+        stack = [(member, iter(iter_css_references(texts[member[1]])))]
+        while stack:
+            current, references = stack[-1]
+            for reference in references:
+                target = resolve_reference(current[1], reference)
+                if target in by_href and target not in visited:
+                    visited.add(target)
+                    stack.append((by_href[target], iter(iter_css_references(texts[target]))))
+                    break
+            else:
+                stack.pop()
+                ordered.append(current)
+
+    # 排序后样式表是连续的一段,原位替换为依赖顺序
+    start = members.index(styles[0])
+    return members[:start] + ordered + members[start + len(styles):], texts
+
+
+def write_book(book, out, index, dedup=True):
+    """把准备好的书复制到输出 ZIP 并登记到索引中,返回章节数
+
+    成员默认按原始压缩数据复制。dedup 为 True 时,与已写入资源内容相同的
+    图片、字体和样式表不再写入,本书中引用它们的章节、SVG 和样式表改写为指向规范副本。
+    """
+    aliases = {}
+    with open(book.input_file, 'rb') as src_file, open_epub(book.input_file) as zf:
+        members, style_texts = order_members(book.members, zf) if dedup else (book.members, {})
+        for info, href, item_id, media_type, properties, item_type in members:
+            data = None
+            if dedup and is_dedup_member(media_type, item_type):
+                targets = ()
+                if item_type == ITEM_STYLE:
+                    text = style_texts[href]
+                    targets = tuple(aliases.get(target, target) for target in
+                                    (resolve_reference(href, ref) for ref in iter_css_references(text)))
+                    if aliases:
+                        rewritten = rewrite_css(text, href, aliases)
+                        if rewritten != text:
+                            data = rewritten.encode('utf-8', errors='surrogateescape')
+
+                canonical, digest = index.find_duplicate(zf, info, targets)
+                if canonical is not None:
+                    aliases[href] = canonical
+                    index.duplicates += 1
+                    index.bytes_saved += info.compress_size
+                    continue
+                index.add_resource(href, book.input_file, info, targets, digest)
+
+            elif aliases and (item_type == ITEM_DOCUMENT or media_type == SVG_MEDIA_TYPE):
+                try:
+                    text = zf.read(info).decode('utf-8')
+                except UnicodeDecodeError:
+                    text = None
+                if text is not None:
+                    rewritten = rewrite_document(text, href, aliases)
+                    if rewritten != text:
+                        data = rewritten.encode('utf-8')
+
+            if data is None:
+                copy_member_raw(src_file, info, out, f'{OPF_DIR}/{href}')
+            else:
+                out.writestr(f'{OPF_DIR}/{href}', data, compress_type=info.compress_type)
+
+            # 合并后的书只保留第一本书的封面
+            if 'cover-image' in properties:
+                if index.has_cover:
+                    properties.remove('cover-image')
+                index.has_cover = True
+
+            index.manifest.append((item_id, href, media_type, properties))
+
+    for chapter_num, (item_id, href) in enumerate(book.chapters, start=1):
+        index.spine.append(item_id)
+        index.toc.append((f'{book.title} - 第{chapter_num}章', href))
+
+    return len(book.chapters)
+
+
+def warm_input(input_file):
+    """顺序读一遍输入文件并丢弃数据,让操作系统把它读入页缓存
+
+    之后主线程原样复制成员时直接命中缓存,磁盘或网络读取与上一本书的写入
+    重叠进行;每个线程只占用一个 WARM_CHUNK_SIZE 的缓冲区,不违背逐本处理的内存上限。
+    """
+    buffer = bytearray(WARM_CHUNK_SIZE)
+    with open(input_file, 'rb', buffering=0) as f:
+        while f.readinto(buffer):
+            pass
+
+
+def prefetch_book(input_file, book_num):
+    """后台任务:解析 OPF 并预读整本书的数据"""
+    book = prepare_book(input_file, book_num)
+    warm_input(input_file)
+    return book
+
+
+def iter_prepared_books(input_files, prefetch=PREFETCH):
+    """按输入顺序产出 (输入文件, PreparedBook 或 None)
+
+    prefetch 大于 0 时在线程池中提前准备后面的 prefetch 本书(解析 OPF 并
+    预读文件数据),与当前书的写入重叠进行;找不到的文件产出 None。
+    """
+    if prefetch < 1:
+        for i, input_file in enumerate(input_files):
+            if not os.path.exists(input_file):
+                yield input_file, None
+            else:
+                yield input_file, prepare_book(input_file, i + 1)
+        return
+
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        pending = deque()
+        for i, input_file in enumerate(input_files):
+            if not os.path.exists(input_file):
+                future = None
+            else:
+                future = executor.submit(prefetch_book, input_file, i + 1)
+            pending.append((input_file, future))
+            # 当前书之外最多预读 prefetch 本
+            if len(pending) > prefetch:
+                input_file, future = pending.popleft()
+                yield input_file, future.result() if future else None
+        while pending:
+            input_file, future = pending.popleft()
+            yield input_file, future.result() if future else None
+
+
+def set_output_mode(temp_path, output_file):
+    """让临时文件获得与直接创建输出文件时相同的权限
+
+    mkstemp 创建的文件只有属主可读写;覆盖已有文件时沿用其权限,否则按当前 umask。
+    """
+    if os.path.exists(output_file):
+        shutil.copymode(output_file, temp_path)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+
+
+def merge_epubs(input_files, output_file, prefetch=PREFETCH, dedup=True):
     """合并多个 EPUB 文件
 
     参数:
-        input_files: 输入的 EPUB 文件路径列表
+        input_files: 输入的 EPUB 文件路径列表,也可以是逐个产出路径的迭代器
         output_file: 输出的 EPUB 文件路径
+        prefetch: 在后台提前读取和解析的输入数量, 0 表示不预读
+        dedup: 按内容去重各书之间相同的图片、字体和样式表
+
+    返回:
+        统计信息字典: chapters(章节数)、duplicates(去重的资源数)、bytes_saved(节省的字节数)
     """
+    identifier = f'merged_{os.path.basename(output_file)}'
+    title = '合并的电子书'
+    language = 'zh-CN'
+
+    # 先写到输出目录下的临时文件,完成后再替换,失败时不影响已有的输出文件
+    temp_path = None
     try:
-        merged_book = epub.EpubBook()
-        merged_book.set_identifier(f'merged_{os.path.basename(output_file)}')
-        merged_book.set_title('合并的电子书')
-        merged_book.set_language('zh-CN')
+        index = MergeIndex()
 
-        all_chapters = []
-        all_images = set()
-        all_styles = set()
+        fd, temp_path = tempfile.mkstemp(prefix='.', suffix='.tmp',
+                                         dir=os.path.dirname(os.path.abspath(output_file)))
+        os.close(fd)
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as out:
+            start_epub(out)
 
-        # 遍历所有输入文件
-        for i, input_file in enumerate(input_files):
-            if not os.path.exists(input_file):
-                print(f"警告: 找不到文件 {input_file}, 跳过", file=sys.stderr)
-                continue
+            # 遍历所有输入文件,后面的书在后台线程中提前解析
+            for input_file, book in iter_prepared_books(input_files, prefetch):
+                if book is None:
+                    print(f"警告: 找不到文件 {input_file}, 跳过", file=sys.stderr)
+                    continue
+
+                print(f"正在处理: {input_file}")
+                for warning in book.warnings:
+                    print(f"  警告: {warning}", file=sys.stderr)
+                chapter_count = write_book(book, out, index, dedup=dedup)
+                print(f"  ✓ 添加了 {chapter_count} 个章节")
+
+            if not index.spine:
+                raise RuntimeError("没有找到任何章节")
+
+            # 写入合并后的目录和包文件
+            write_package(out, identifier, title, language, index.manifest, index.spine, index.toc)
+
+        set_output_mode(temp_path, output_file)
+        os.replace(temp_path, output_file)
 
-            print(f"正在处理: {input_file}")
-            # 使用 ignore_ncx 选项避免 ebooklib 的 NCX 处理 bug
-            book = epub.read_epub(input_file, options={'ignore_ncx': True})
-
-            # 获取原书名作为章节组标题
-            titles = book.get_metadata('DC', 'title')
-            book_title = titles[0][0] if titles else f'书{i+1}'
-
-            # 复制所有章节
-            chapter_count = 0
-            for item in book.get_items():
-                if item.get_type() == ITEM_DOCUMENT:
-                    chapter_count += 1
-                    # 创建新章节以避免文件名冲突
-                    new_chapter = epub.EpubHtml(
-                        title=f'{book_title} - 第{chapter_count}章',
-                        file_name=f'book{i+1}_chap{chapter_count}.xhtml'
-                    )
-                    new_chapter.content = item.get_content()
-                    merged_book.add_item(new_chapter)
-                    all_chapters.append(new_chapter)
-
-                # 复制图片
-                elif item.get_type() == ITEM_IMAGE:
-                    # 生成唯一的图片文件名
-                    img_name = f'book{i+1}_{item.get_name()}'
-                    item.file_name = img_name
-                    if img_name not in all_images:
-                        merged_book.add_item(item)
-                        all_images.add(img_name)
-
-                # 复制样式
-                elif item.get_type() == ITEM_STYLE:
-                    style_name = f'book{i+1}_{item.get_name()}'
-                    item.file_name = style_name
-                    if style_name not in all_styles:
-                        merged_book.add_item(item)
-                        all_styles.add(style_name)
-
-            print(f"  ✓ 添加了 {chapter_count} 个章节")
-
-        if not all_chapters:
-            raise RuntimeError("没有找到任何章节")
-
-        # 设置目录
-        merged_book.toc = tuple(all_chapters)
-
-        # 添加导航文件
-        merged_book.add_item(epub.EpubNcx())
-        merged_book.add_item(epub.EpubNav())
-
-        # 设置书脊
-        merged_book.spine = ['nav'] + all_chapters
-
-        # 写入合并后的 EPUB
-        epub.write_epub(output_file, merged_book, {})
         print(f"\n✓ 合并完成!")
         print(f"  输出文件: {output_file}")
-        print(f"  总章节数: {len(all_chapters)}")
+        print(f"  总章节数: {len(index.spine)}")
+        if index.duplicates:
+            print(f"  去重资源: {index.duplicates} 个, 节省 {index.bytes_saved} 字节")
+
+        return {
+            'chapters': len(index.spine),
+            'duplicates': index.duplicates,
+            'bytes_saved': index.bytes_saved,
+        }
 
     except Exception as e:
+        # 不留下写了一半的临时文件
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
         # 在库函数中抛出异常而不是调用 sys.exit
         raise RuntimeError(f"无法合并 EPUB 文件: {e}") from e
 
@@ -102,15 +453,36 @@ def main():
         print("使用方法: python merge_epubs.py <输出文件.epub> <输入文件1.epub> <输入文件2.epub> ...", file=sys.stderr)
         print("\n示例:")
         print("  python merge_epubs.py merged.epub book1.epub book2.epub book3.epub", file=sys.stderr)
+        print("  ls series/*.epub | python merge_epubs.py merged.epub --files-from -", file=sys.stderr)
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description='合并多个 EPUB 文件为一个')
+    parser.add_argument('output_file', help='输出的 EPUB 文件')
+    parser.add_argument('input_files', nargs='*', help='输入的 EPUB 文件')
+    parser.add_argument('--files-from', metavar='FILE',
+                        help='从文件读取输入路径列表(每行一个, - 表示标准输入)')
+    parser.add_argument('--prefetch', type=int, default=PREFETCH, metavar='K',
+                        help=f'在后台提前读取和解析的输入数量 (默认: {PREFETCH}, 0 表示不预读)')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='不对各书之间相同的图片、字体和样式表去重')
+    args = parser.parse_args()
+
+    if args.prefetch < 0:
+        print("错误: --prefetch 不能为负数", file=sys.stderr)
         sys.exit(1)
 
-    output_file = sys.argv[1]
-    input_files = sys.argv[2:]
+    # 注意:CLI 调用时参数顺序是 output_file, input_files
+    # 但库函数签名是 merge_epubs(input_files, output_file)
+    input_files = list(args.input_files)
+    if args.files_from:
+        input_files.extend(read_file_list(args.files_from))
+
+    if not input_files:
+        print("错误: 至少需要指定一个输入文件或 --files-from", file=sys.stderr)
+        sys.exit(1)
 
     try:
-        # 注意:CLI 调用时参数顺序是 output_file, input_files
-        # 但库函数签名是 merge_epubs(input_files, output_file)
-        merge_epubs(input_files, output_file)
+        merge_epubs(input_files, args.output_file, prefetch=args.prefetch, dedup=not args.no_dedup)
     except RuntimeError as e:
         print(f"错误: {e}", file=sys.stderr)
         sys.exit(1)
@@ -1,86 +1,297 @@
 #!/usr/bin/env python3
 """
 将 EPUB 的每一章保存为单独的 EPUB 文件
-使用方法: python split_epub.py <输入epub> <输出目录>
+使用方法: python split_epub.py <输入epub> <输出目录> [--jobs N] [--parts N | --max-bytes N]
+
+每个章节 EPUB 只包含该章实际引用的资源:扫描章节中的 <img>、<link>、
+SVG <image xlink:href>、内联样式,以及样式表中 url() 和 @import 的传递引用(含字体)。
+
+选项:
+  --jobs N         并行写出 EPUB 的进程数 (默认: 1)
+  --parts N        按章节未压缩大小把连续章节均衡地分成 N 个 part_NNN.epub
+  --max-bytes N    把连续章节合并为未压缩大小不超过 N 字节的 part_NNN.epub
 """
 import sys
 import os
-from ebooklib import epub
-from ebooklib import ITEM_DOCUMENT, ITEM_IMAGE, ITEM_STYLE, ITEM_NAVIGATION
+import zipfile
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ebooklib import ITEM_DOCUMENT, ITEM_STYLE
 
+from epub_zip import (
+    OPF_DIR, copy_member_raw, iter_css_references, iter_document_references, open_epub,
+    modified_timestamp, opf_relative_path, read_package, resolve_reference, start_epub, write_package,
+)
 
-def split_epub(input_file, output_dir):
-    """将 EPUB 的每一章保存为单独的 EPUB"""
-    try:
-        # 使用 ignore_ncx 选项避免 ebooklib 的 NCX 处理 bug
-        book = epub.read_epub(input_file, options={'ignore_ncx': True})
 
-        # 获取标题作为基础名称
-        titles = book.get_metadata('DC', 'title')
-        base_name = titles[0][0] if titles else 'chapter'
-        base_name = base_name.replace(' ', '_').replace('/', '_')
+# 并行写出时每个工作进程最多排队的章节数
+PENDING_PER_JOB = 4
+
+# 需要扫描其中引用的媒体类型(样式表之外)
+SCANNED_MEDIA_TYPES = ['application/xhtml+xml', 'image/svg+xml']
+
+
+class ResourceGraph:
+    """书内成员之间的资源引用关系
+
+    节点是 ZIP 中的成员路径;章节、样式表和 SVG 的直接引用在第一次用到时
+    解压扫描并缓存,多个章节共用的样式表只扫描一次。
+    """
+
+    def __init__(self, zf, package):
+        self.zf = zf
+        names = set(zf.namelist())
+        self.items = {item.path: item for item in package.manifest if item.path in names}
+        self.edges = {}
+
+    def references(self, path):
+        """返回成员直接引用的资源(不含其他章节),按首次出现的顺序"""
+        if path in self.edges:
+            return self.edges[path]
+
+        item = self.items[path]
+        if item.get_type() == ITEM_STYLE:
+            text = self.zf.read(path).decode('utf-8', errors='replace')
+            refs = iter_css_references(text)
+        elif item.media_type in SCANNED_MEDIA_TYPES:
+            refs = iter_document_references(self.zf.read(path))
+        else:
+            refs = []
+
+        deps = []
+        for ref in refs:
+            target = resolve_reference(path, ref)
+            if target is None or target == path or target in deps:
+                continue
+            dep = self.items.get(target)
+            # 只收集资源,指向其他章节的引用(如 iframe)不跟随
+            if dep is not None and dep.get_type() != ITEM_DOCUMENT:
+                deps.append(target)
+
+        self.edges[path] = deps
+        return deps
+
+    def dependencies(self, path):
+        """返回成员直接和间接引用的全部资源,包括样式表 @import 的样式表和字体"""
+        result = []
+        seen = {path}
+        stack = list(reversed(self.references(path)))
+        while stack:
+            dep = stack.pop()
+            if dep in seen:
+                continue
+            seen.add(dep)
+            result.append(dep)
+            stack.extend(reversed(self.references(dep)))
+        return result
+
+
+def write_chapter_epub(input_file, output_path, members, package_args):
+    """写出一个章节 EPUB
+
+    mimetype 和 container.xml 使用预先压缩好的数据,章节和资源按源文件中的
+    压缩数据复制,真正需要压缩的只有本章的 OPF、NCX 和导航文档。
+
+    参数:
+        members: [(源 ZipInfo, 目标路径)],按原始压缩数据复制
+        package_args: write_package 除输出对象以外的参数
+    """
+    with open(input_file, 'rb') as src_file, \
+            zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as out:
+        start_epub(out)
+        for info, arcname in members:
+            copy_member_raw(src_file, info, out, arcname)
+        write_package(out, *package_args)
+    return os.path.basename(output_path)
+
+
+def _write_chapter_task(task):
+    """工作进程任务:写出一个章节 EPUB,返回文件名"""
+    return write_chapter_epub(*task)
+
 
-        # 创建输出目录
-        os.makedirs(output_dir, exist_ok=True)
+def group_by_size(sizes, parts=None, max_bytes=None):
+    """把连续的条目按大小分组,返回 [(起始下标, 结束下标)] 半开区间列表
 
-        # 简化:不需要复制所有元数据,直接复制需要的即可
-        chapter_num = 0
-        image_items = [item for item in book.get_items()
-                      if item.get_type() == ITEM_IMAGE]
-        style_items = [item for item in book.get_items()
-                      if item.get_type() == ITEM_STYLE]
+    parts: 分成大小尽量均衡的 N 组(条目不足 N 个时每个条目一组)
+    max_bytes: 每组总大小不超过该值;单个超过上限的条目单独成组
+    两者都未指定时每个条目单独成组。
+    """
+    count = len(sizes)
+    if max_bytes is not None:
+        groups = []
+        start = 0
+        current = 0
+        for i, size in enumerate(sizes):
+            if i > start and current + size > max_bytes:
+                groups.append((start, i))
+                start, current = i, 0
+            current += size
+        if start < count:
+            groups.append((start, count))
+        return groups
 
-        # 遍历所有章节
-        for item in book.get_items():
-            if item.get_type() == ITEM_DOCUMENT:
-                chapter_num += 1
+    if parts is None or parts >= count:
+        return [(i, i + 1) for i in range(count)]
 
-                # 为每个章节创建新的 EPUB
-                chapter_book = epub.EpubBook()
+    groups = []
+    start = 0
+    current = 0
+    remaining = sum(sizes)
+    for i, size in enumerate(sizes):
+        left = parts - len(groups)
+        if i > start and left > 1:
+            # 剩余条目刚好够剩余各组每组一个时必须分组;否则在加入当前条目
+            # 会让本组越过剩余平均大小的一半以上时分组
+            target = remaining / left
+            if count - i < left or current + size / 2 > target:
+                groups.append((start, i))
+                remaining -= current
+                start, current = i, 0
+        current += size
+    groups.append((start, count))
+    return groups
 
-                # 设置唯一标识符
-                chapter_id = f'{base_name}_chapter_{chapter_num}'
-                chapter_book.set_identifier(chapter_id)
 
-                # 设置标题
-                chapter_title = f'{base_name} - 第{chapter_num}章'
-                chapter_book.set_title(chapter_title)
+def iter_split_tasks(zf, book, input_file, output_dir, parts=None, max_bytes=None):
+    """按书脊顺序产出每个输出 EPUB 的写出任务
 
-                # 复制语言设置
-                languages = book.get_metadata('DC', 'language')
-                if languages:
-                    chapter_book.set_language(languages[0][0])
+    默认每章一个 chapter_NNN.epub;指定 parts 或 max_bytes 时按章节的未压缩
+    大小(直接取自中央目录)把连续章节合成 part_NNN.epub。
 
-                # 复制作者
-                authors = book.get_metadata('DC', 'creator')
-                for author in authors:
-                    chapter_book.add_author(author[0])
+    源书只在这里解析一次;任务中只有源文件路径、成员的 ZipInfo 和
+    新 OPF 的参数,工作进程无需重新读取 OPF 或扫描资源。
+    """
+    # 获取标题作为基础名称
+    titles = book.get_metadata('DC', 'title')
+    base_name = titles[0][0] if titles and titles[0][0] else 'chapter'
+    base_name = base_name.replace(' ', '_').replace('/', '_')
 
-                # 添加当前章节
-                chapter_book.add_item(item)
+    # 语言、作者和修改时间对所有章节都相同,只查询一次
+    languages = book.get_metadata('DC', 'language')
+    language = languages[0][0] if languages and languages[0][0] else 'en'
+    authors = [author[0] for author in book.get_metadata('DC', 'creator') if author[0]]
+    modified = modified_timestamp()
 
-                # 复制所有图片
-                for img_item in image_items:
-                    chapter_book.add_item(img_item)
+    graph = ResourceGraph(zf, book)
 
-                # 复制所有样式
-                for style_item in style_items:
-                    chapter_book.add_item(style_item)
+    chapters = list(book.iter_spine_items())
+    for item in chapters:
+        if item.path not in graph.items:
+            raise ValueError(f"找不到章节文件: {item.path}")
 
-                # 添加必要的导航文件
-                chapter_book.add_item(epub.EpubNcx())
-                chapter_book.add_item(epub.EpubNav())
-                chapter_book.spine = ['nav', item]
+    by_chapter = parts is None and max_bytes is None
+    sizes = [zf.getinfo(item.path).file_size for item in chapters]
+    for num, (start, end) in enumerate(group_by_size(sizes, parts, max_bytes), start=1):
+        # 设置唯一标识符和标题
+        if by_chapter:
+            output_id = f'{base_name}_chapter_{num}'
+            output_title = f'{base_name} - 第{num}章'
+            output_filename = f'chapter_{num:03d}.epub'
+        else:
+            output_id = f'{base_name}_part_{num}'
+            output_title = f'{base_name} - 第{num}部分'
+            output_filename = f'part_{num:03d}.epub'
 
-                # 保存章节 EPUB
-                output_filename = f'chapter_{chapter_num:03d}.epub'
-                output_path = os.path.join(output_dir, output_filename)
+        # 本组的章节排在前面,然后是它们引用的资源
+        chapter_paths = []
+        toc = []
+        for chapter_num, item in enumerate(chapters[start:end], start=start + 1):
+            if item.path not in chapter_paths:
+                chapter_paths.append(item.path)
+                toc.append((f'{base_name} - 第{chapter_num}章', opf_relative_path(book, item)))
+        if by_chapter:
+            toc = [(output_title, toc[0][1])]
 
-                epub.write_epub(output_path, chapter_book, {})
-                print(f"✓ 已保存: {output_filename}")
+        paths = list(chapter_paths)
+        for path in chapter_paths:
+            for dep in graph.dependencies(path):
+                if dep not in paths:
+                    paths.append(dep)
+
+        members = []
+        manifest = []
+        for path in paths:
+            member = graph.items[path]
+            href = opf_relative_path(book, member)
+            members.append((zf.getinfo(path), f'{OPF_DIR}/{href}'))
+            manifest.append((member.id, href, member.media_type, member.properties))
+
+        spine = [graph.items[path].id for path in chapter_paths]
+        package_args = (output_id, output_title, language, manifest, spine, toc, authors, modified)
+        output_path = os.path.join(output_dir, output_filename)
+        yield input_file, output_path, members, package_args
+
+
+def iter_written_chapters(tasks, jobs=1):
+    """执行写出任务,按书脊顺序产出 (任务, 文件名)
+
+    jobs 大于 1 时输出 EPUB 在进程池中并行压缩写出,最多 jobs * PENDING_PER_JOB
+    个任务同时在途;文件名由序号决定,与完成顺序无关。
+    """
+    if jobs == 1:
+        for task in tasks:
+            yield task, _write_chapter_task(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        max_pending = (jobs or os.cpu_count() or 1) * PENDING_PER_JOB
+        for task in tasks:
+            pending.append((task, executor.submit(_write_chapter_task, task)))
+            if len(pending) >= max_pending:
+                task, future = pending.popleft()
+                yield task, future.result()
+        while pending:
+            task, future = pending.popleft()
+            yield task, future.result()
+
+
+def split_epub(input_file, output_dir, jobs=1, parts=None, max_bytes=None):
+    """将 EPUB 的每一章保存为单独的 EPUB
+
+    章节按书脊顺序输出(跳过 EPUB 3 导航文档)。每个输出只包含其章节
+    实际引用的图片、样式表、字体等资源,这些成员和章节本身都按原始压缩数据
+    复制,只有 OPF、NCX 和导航文档是新生成的。
+
+    参数:
+        jobs: 并行写出的进程数, None 表示使用 CPU 核数
+        parts: 按章节未压缩大小把连续章节均衡地分成 N 个 part_NNN.epub
+        max_bytes: 把连续章节合并为未压缩大小不超过该值的 part_NNN.epub
+    """
+    try:
+        if parts is not None and max_bytes is not None:
+            raise ValueError("parts 和 max_bytes 不能同时指定")
+        if (parts is not None and parts < 1) or (max_bytes is not None and max_bytes < 1):
+            raise ValueError("parts 和 max_bytes 必须大于 0")
+
+        with open_epub(input_file) as zf:
+            book = read_package(zf)
+
+            # 创建输出目录
+            os.makedirs(output_dir, exist_ok=True)
+
+            output_count = 0
+            chapter_count = 0
+            resource_count = 0
+            tasks = iter_split_tasks(zf, book, input_file, output_dir, parts, max_bytes)
+            for (_, _, members, package_args), output_filename in iter_written_chapters(tasks, jobs):
+                chapters = len(package_args[4])
+                output_count += 1
+                chapter_count += chapters
+                resource_count += len(members) - chapters
+                if parts is None and max_bytes is None:
+                    print(f"✓ 已保存: {output_filename}")
+                else:
+                    size = sum(info.file_size for info, _ in members[:chapters])
+                    print(f"✓ 已保存: {output_filename} ({chapters} 章, {size} 字节)")
 
         print(f"\n完成!")
-        print(f"  总章节数: {chapter_num}")
+        print(f"  总章节数: {chapter_count}")
+        if parts is not None or max_bytes is not None:
+            print(f"  输出文件: {output_count}")
+        print(f"  复制资源: {resource_count}")
         print(f"  保存位置: {output_dir}")
 
     except Exception as e:
@@ -89,21 +300,46 @@ def split_epub(input_file, output_dir):
 
 
 def main():
-    if len(sys.argv) != 3:
-        print("使用方法: python split_epub.py <输入epub> <输出目录>", file=sys.stderr)
+    if len(sys.argv) < 3:
+        print("使用方法: python split_epub.py <输入epub> <输出目录> [--jobs N] [--parts N | --max-bytes N]",
+              file=sys.stderr)
         print("\n示例:")
         print("  python split_epub.py large_book.epub chapters/", file=sys.stderr)
+        print("  python split_epub.py large_book.epub chapters/ --jobs 8", file=sys.stderr)
+        print("  python split_epub.py large_book.epub shards/ --parts 4", file=sys.stderr)
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser(description='将 EPUB 的每一章保存为单独的 EPUB 文件')
+    parser.add_argument('input_file', help='输入的 EPUB 文件')
+    parser.add_argument('output_dir', help='输出目录')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='并行写出的进程数 (默认: 1)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--parts', type=int, metavar='N',
+                      help='把连续章节按未压缩大小均衡地分成 N 个 EPUB')
+    mode.add_argument('--max-bytes', type=int, metavar='N',
+                      help='把连续章节合并为未压缩大小不超过 N 字节的 EPUB')
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        print("错误: --jobs 必须大于 0", file=sys.stderr)
         sys.exit(1)
 
-    input_file = sys.argv[1]
-    output_dir = sys.argv[2]
+    if args.parts is not None and args.parts < 1:
+        print("错误: --parts 必须大于 0", file=sys.stderr)
+        sys.exit(1)
+
+    if args.max_bytes is not None and args.max_bytes < 1:
+        print("错误: --max-bytes 必须大于 0", file=sys.stderr)
+        sys.exit(1)
 
-    if not os.path.exists(input_file):
-        print(f"错误: 找不到文件 {input_file}", file=sys.stderr)
+    if not os.path.exists(args.input_file):
+        print(f"错误: 找不到文件 {args.input_file}", file=sys.stderr)
         sys.exit(1)
 
     try:
-        split_epub(input_file, output_dir)
+        split_epub(args.input_file, args.output_dir, jobs=args.jobs,
+                   parts=args.parts, max_bytes=args.max_bytes)
     except RuntimeError as e:
         print(f"错误: {e}", file=sys.stderr)
         sys.exit(1)
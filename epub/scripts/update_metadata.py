@@ -2,104 +2,299 @@
 """
 修改 EPUB 文件的元数据
 使用方法: python update_metadata.py <epub文件> [--title "标题"] [--author "作者"] [--language "语言"]
+          python update_metadata.py --manifest <清单.csv|清单.jsonl> [--jobs N] [--report 结果.jsonl]
+
+只改写 OPF 包文件(和 NCX 中的书名),其余成员原样复制,修改后原子替换原文件。
 """
 import sys
-from ebooklib import epub
+import os
+import csv
+import json
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree
 
+from epub_zip import NAMESPACES, NCX_MEDIA_TYPE, modified_timestamp, open_epub, parse_xml, read_package, rewrite_epub
 
-def update_metadata(epub_path, title=None, author=None, language=None,
-                   publisher=None, isbn=None):
-    """更新 EPUB 的元数据"""
-    try:
-        # 读取 EPUB,使用 ignore_ncx 选项避免 ebooklib 的 NCX 处理 bug
-        book = epub.read_epub(epub_path, options={'ignore_ncx': True})
-
-        modified = False
-
-        # 更新标题
-        if title:
-            # 先清除现有标题
-            # 注意:元数据使用完整的命名空间 URL
-            for ns in book.metadata:
-                if 'title' in book.metadata[ns]:
-                    book.metadata[ns]['title'] = []
-            # 设置新标题
-            book.set_title(title)
-            print(f"✓ 更新标题: {title}")
-            modified = True
 
-        # 更新作者
-        if author:
-            # 先清除现有作者
-            for ns in book.metadata:
-                if 'creator' in book.metadata[ns]:
-                    book.metadata[ns]['creator'] = []
-            book.add_author(author)
-            print(f"✓ 更新作者: {author}")
-            modified = True
+# 批量模式下每个工作进程一次领取的书籍数
+CHUNK_SIZE = 16
 
-        # 更新语言
-        if language:
-            for ns in book.metadata:
-                if 'language' in book.metadata[ns]:
-                    book.metadata[ns]['language'] = []
-            book.set_language(language)
-            print(f"✓ 更新语言: {language}")
-            modified = True
+# 批量模式下每处理多少本书输出一次进度
+PROGRESS_EVERY = 1000
 
-        # 更新出版社
-        if publisher:
-            # 清除现有出版社并添加新的
-            for ns in book.metadata:
-                if 'publisher' in book.metadata[ns]:
-                    book.metadata[ns]['publisher'] = []
-            book.add_metadata('DC', 'publisher', {}, publisher)
-            print(f"✓ 更新出版社: {publisher}")
-            modified = True
+# 可修改的字段: (OPF 中的 Dublin Core 元素名, 提示信息)
+METADATA_FIELDS = {
+    'title': ('title', '更新标题'),
+    'author': ('creator', '更新作者'),
+    'language': ('language', '更新语言'),
+    'publisher': ('publisher', '更新出版社'),
+    'isbn': ('identifier', '更新 ISBN'),
+}
+
+
+def clear_metadata(metadata, name):
+    """删除 metadata 中所有 dc:<name> 元素以及通过 refines 指向它们的 meta
+
+    返回 (第一个被删除元素的位置, 它的尾随空白),没有可删除的元素时位置为 None。
+    """
+    position, tail = None, None
+    removed_ids = set()
+    for elem in list(metadata.iterfind(f"{{{NAMESPACES['DC']}}}{name}")):
+        if position is None:
+            position, tail = metadata.index(elem), elem.tail
+        if elem.get('id'):
+            removed_ids.add('#' + elem.get('id'))
+        metadata.remove(elem)
+
+    if removed_ids:
+        for meta in list(metadata.iterfind(f"{{{NAMESPACES['OPF']}}}meta")):
+            if meta.get('refines') in removed_ids:
+                metadata.remove(meta)
+    return position, tail
+
+
+def set_metadata(metadata, name, value, attrib=None):
+    """用一个新的 dc:<name> 元素替换已有的全部同名元素,尽量保持原来的位置"""
+    position, tail = clear_metadata(metadata, name)
+    elem = etree.Element(f"{{{NAMESPACES['DC']}}}{name}", attrib or {})
+    elem.text = value
+    if position is None:
+        metadata.append(elem)
+    else:
+        elem.tail = tail
+        metadata.insert(position, elem)
+
+
+def apply_metadata_changes(package, changes):
+    """在 OPF 树上应用修改
+
+    参数:
+        package: read_package 返回的 OpfPackage,直接修改其 root
+        changes: {字段: 新值},字段见 METADATA_FIELDS,值为空的字段忽略
+
+    返回:
+        实际修改的字段列表
+    """
+    metadata = package.root.find(f"{{{NAMESPACES['OPF']}}}metadata")
+    changed = []
+    for field, (name, _) in METADATA_FIELDS.items():
+        value = changes.get(field)
+        if not value:
+            continue
+        if field == 'author':
+            set_metadata(metadata, name, value, {'id': 'creator'})
+        elif field == 'isbn':
+            # 新标识符成为书的唯一标识符
+            uid = package.root.get('unique-identifier') or 'id'
+            package.root.set('unique-identifier', uid)
+            set_metadata(metadata, name, value, {'id': uid})
+        else:
+            set_metadata(metadata, name, value)
+        changed.append(field)
+
+    if changed:
+        for meta in metadata.iterfind(f"{{{NAMESPACES['OPF']}}}meta"):
+            if meta.get('property') == 'dcterms:modified':
+                meta.text = modified_timestamp()
+    return changed
 
-        # 更新 ISBN
-        if isbn:
-            # 清除现有标识符并设置新的
-            for ns in book.metadata:
-                if 'identifier' in book.metadata[ns]:
-                    book.metadata[ns]['identifier'] = []
-            book.set_unique_identifier(isbn)
-            print(f"✓ 更新 ISBN: {isbn}")
+
+def patch_ncx(data, title=None, identifier=None):
+    """修改 NCX 的 docTitle 和 dtb:uid,返回新的内容;没有需要修改的内容时返回 None"""
+    root = parse_xml(data)
+    daisy = NAMESPACES['DAISY']
+    modified = False
+
+    if title:
+        text = root.find(f'{{{daisy}}}docTitle/{{{daisy}}}text')
+        if text is not None and text.text != title:
+            text.text = title
             modified = True
 
-        if not modified:
+    if identifier:
+        for meta in root.iterfind(f'{{{daisy}}}head/{{{daisy}}}meta'):
+            if meta.get('name') == 'dtb:uid' and meta.get('content') != identifier:
+                meta.set('content', identifier)
+                modified = True
+
+    return serialize_xml(root) if modified else None
+
+
+def serialize_xml(root):
+    """序列化修改后的 XML 文档,保留原有的 XML 声明"""
+    tree = root.getroottree()
+    return etree.tostring(tree, xml_declaration=True, encoding=tree.docinfo.encoding or 'utf-8')
+
+
+def patch_metadata(epub_path, changes):
+    """应用修改并原子替换原文件,不输出任何信息
+
+    参数:
+        changes: {字段: 新值},字段见 METADATA_FIELDS
+
+    返回:
+        实际修改的字段列表;没有修改时不改写文件
+    """
+    with open_epub(epub_path) as zf:
+        package = read_package(zf)
+        changed = apply_metadata_changes(package, changes)
+        if not changed:
+            return changed
+
+        replacements = {package.opf_path: serialize_xml(package.root)}
+
+        # NCX 中也记录了书名和唯一标识符
+        title, isbn = changes.get('title'), changes.get('isbn')
+        if title or isbn:
+            for item in package.manifest:
+                if item.media_type == NCX_MEDIA_TYPE and item.path in zf.NameToInfo:
+                    ncx = patch_ncx(zf.read(item.path), title, isbn)
+                    if ncx is not None:
+                        replacements[item.path] = ncx
+
+    rewrite_epub(epub_path, replacements)
+    return changed
+
+
+def update_metadata(epub_path, title=None, author=None, language=None,
+                   publisher=None, isbn=None):
+    """更新 EPUB 的元数据
+
+    只修改 OPF 包文件(以及需要时 NCX 的 docTitle 和 dtb:uid),其余成员按原始
+    压缩数据复制到临时文件后原子替换原文件,耗时与书中图片等资源的大小基本无关。
+
+    返回:
+        实际修改的字段列表
+    """
+    changes = {'title': title, 'author': author, 'language': language,
+               'publisher': publisher, 'isbn': isbn}
+    try:
+        changed = patch_metadata(epub_path, changes)
+        if not changed:
             print("没有修改任何元数据")
-            return
-
-        # 确保 TOC 中的所有项目都有 uid
-        # 这是 ebooklib 的要求,否则写入时会失败
-        if hasattr(book, 'toc') and book.toc:
-            def ensure_uid(toc_items, counter=[0]):
-                """递归地为 TOC 中的所有项目设置 uid"""
-                if not toc_items:
-                    return
-                for item in toc_items:
-                    if isinstance(item, tuple) or isinstance(item, list):
-                        ensure_uid(item, counter)
-                    elif hasattr(item, 'uid'):
-                        if not item.uid or item.uid is None:
-                            item.uid = f'uid_{counter[0]}'
-                            counter[0] += 1
-
-            # 确保 book.toc 被当作列表处理
-            toc_list = list(book.toc) if hasattr(book.toc, '__iter__') else [book.toc]
-            ensure_uid(toc_list)
-
-        # 保存修改后的 EPUB
-        epub.write_epub(epub_path, book, {})
+            return changed
+
+        for field in changed:
+            print(f"✓ {METADATA_FIELDS[field][1]}: {changes[field]}")
         print(f"\n✓ 元数据已更新: {epub_path}")
+        return changed
 
     except Exception as e:
         # 在库函数中抛出异常而不是调用 sys.exit
         raise RuntimeError(f"无法更新 EPUB: {e}") from e
 
 
+def read_manifest(manifest_path):
+    """读取批量修改清单,返回 [(EPUB 路径, {字段: 新值})]
+
+    .csv 文件按表头读取列;其他文件(包括 - 表示的标准输入)按 JSONL 读取,
+    每行一个对象。路径放在 path 列(或 catalog_metadata 输出的 file 字段),
+    字段名与命令行选项相同,空值表示不修改。同一本书出现多次时(按 realpath
+    判断,./a.epub 与 a.epub 视为同一本)按顺序合并,后面的值覆盖前面的值。
+    """
+    if manifest_path == '-':
+        rows = _iter_jsonl_rows(sys.stdin)
+        return _merge_manifest_rows(rows)
+
+    # utf-8-sig 兼容 Excel 导出的带 BOM 的 CSV
+    with open(manifest_path, encoding='utf-8-sig', newline='') as f:
+        rows = csv.DictReader(f) if manifest_path.lower().endswith('.csv') else _iter_jsonl_rows(f)
+        return _merge_manifest_rows(rows)
+
+
+def _iter_jsonl_rows(stream):
+    """逐行解析 JSONL,忽略空行"""
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        if not isinstance(row, dict):
+            raise ValueError(f"清单第 {line_num} 行不是 JSON 对象")
+        yield row
+
+
+def _merge_manifest_rows(rows):
+    """按规范化后的路径合并清单行,保持每本书首次出现的顺序和写法
+
+    同一个文件的不同写法必须合并,否则会被分给不同的工作进程同时改写。
+    """
+    entries = {}
+    for row_num, row in enumerate(rows, start=1):
+        path = (row.get('path') or row.get('file') or '').strip()
+        if not path:
+            raise ValueError(f"清单第 {row_num} 条缺少 path")
+        _, changes = entries.setdefault(os.path.realpath(path), (path, {}))
+        for field in METADATA_FIELDS:
+            value = row.get(field)
+            if value is not None and str(value).strip():
+                changes[field] = str(value).strip()
+    return list(entries.values())
+
+
+def batch_entry(entry):
+    """工作进程任务:修改一本书,返回结果记录而不是抛出异常"""
+    epub_path, changes = entry
+    if not changes:
+        return {'file': epub_path, 'error': '没有要修改的字段'}
+    try:
+        return {'file': epub_path, 'changed': patch_metadata(epub_path, changes)}
+    except Exception as e:
+        return {'file': epub_path, 'error': str(e)}
+
+
+def iter_batch_results(entries, jobs=None):
+    """按清单顺序产出每本书的结果记录
+
+    jobs 为 1 或只有一本书时在当前进程中执行,否则分发到进程池。
+    每本书各自原子替换,一本书失败不影响其他书。
+    """
+    if jobs == 1 or len(entries) <= 1:
+        for entry in entries:
+            yield batch_entry(entry)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(batch_entry, entries, chunksize=CHUNK_SIZE)
+
+
+def batch_update_metadata(entries, jobs=None, report=None, progress_every=PROGRESS_EVERY):
+    """按清单批量修改元数据
+
+    参数:
+        entries: read_manifest 返回的 [(EPUB 路径, {字段: 新值})]
+        jobs: 并行进程数, None 表示使用 CPU 核数
+        report: 可写的文本流,每本书写入一行 JSON 结果记录
+        progress_every: 每处理多少本书在标准错误输出一次进度
+
+    返回:
+        统计信息字典 {'total': ..., 'updated': ..., 'unchanged': ..., 'errors': ...}
+    """
+    stats = {'total': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+    start = time.monotonic()
+
+    for record in iter_batch_results(entries, jobs=jobs):
+        stats['total'] += 1
+        if 'error' in record:
+            stats['errors'] += 1
+            print(f"✗ {record['file']}: {record['error']}", file=sys.stderr)
+        elif record['changed']:
+            stats['updated'] += 1
+        else:
+            stats['unchanged'] += 1
+
+        if report is not None:
+            report.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        if progress_every and stats['total'] % progress_every == 0:
+            rate = stats['total'] / max(time.monotonic() - start, 1e-9)
+            print(f"进度: {stats['total']}/{len(entries)} ({rate:.0f} 本/秒, 失败 {stats['errors']})",
+                  file=sys.stderr)
+
+    return stats
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='修改 EPUB 电子书的元数据',
@@ -109,18 +304,63 @@ def main():
   %(prog)s book.epub --title "新书名"
   %(prog)s book.epub --author "张三" --language "zh-CN"
   %(prog)s book.epub --title "新书名" --author "李四" --publisher "某某出版社"
+
+  # 按清单批量修改 (CSV 表头: path,title,author,language,publisher,isbn)
+  %(prog)s --manifest fixes.csv --jobs 16 --report results.jsonl
         '''
     )
 
-    parser.add_argument('epub_file', help='EPUB 文件路径')
+    parser.add_argument('epub_file', nargs='?', help='EPUB 文件路径')
     parser.add_argument('--title', help='设置标题')
     parser.add_argument('--author', help='设置作者')
     parser.add_argument('--language', help='设置语言代码 (如: zh-CN, en)')
     parser.add_argument('--publisher', help='设置出版社')
     parser.add_argument('--isbn', help='设置 ISBN')
+    parser.add_argument('--manifest', metavar='FILE',
+                        help='批量修改清单 (.csv 或 JSONL, - 表示从标准输入读取 JSONL)')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='批量模式的并行工作进程数 (默认: CPU 核数)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='批量模式下把每本书的结果写入 JSONL 文件')
 
     args = parser.parse_args()
 
+    if args.manifest:
+        if args.epub_file or any([args.title, args.author, args.language,
+                                  args.publisher, args.isbn]):
+            print("错误: --manifest 不能与 EPUB 文件或字段选项同时使用", file=sys.stderr)
+            sys.exit(1)
+
+        if args.jobs is not None and args.jobs < 1:
+            print("错误: --jobs 必须大于 0", file=sys.stderr)
+            sys.exit(1)
+
+        try:
+            entries = read_manifest(args.manifest)
+        except (OSError, ValueError, csv.Error) as e:
+            print(f"错误: 无法读取清单: {e}", file=sys.stderr)
+            sys.exit(1)
+
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as report_file:
+                stats = batch_update_metadata(entries, jobs=args.jobs, report=report_file)
+        else:
+            stats = batch_update_metadata(entries, jobs=args.jobs)
+
+        print("\n完成!", file=sys.stderr)
+        print(f"  处理书籍: {stats['total']}", file=sys.stderr)
+        print(f"  已更新: {stats['updated']}", file=sys.stderr)
+        print(f"  未变化: {stats['unchanged']}", file=sys.stderr)
+        if stats['errors'] > 0:
+            print(f"  失败: {stats['errors']}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if not args.epub_file:
+        parser.print_help()
+        print("\n错误: 需要指定 EPUB 文件或 --manifest", file=sys.stderr)
+        sys.exit(1)
+
     if not any([args.title, args.author, args.language,
                args.publisher, args.isbn]):
         parser.print_help()
@@ -7,9 +7,10 @@ import sys
 import pytest
 from pathlib import Path
 from io import StringIO
-from contextlib import redirect_stdout
+from contextlib import redirect_stdout, redirect_stderr
 
 import extract_chapters
+import html_engine
 
 
 def assert_file_exists(path, msg=None):
@@ -148,6 +149,85 @@ class TestExtractChapters:
         chapter_01 = Path(output_dir) / 'chapter_001.md'
         assert_file_contains(chapter_01, '第一章')
 
+    def test_extract_chapters_parsers_match(self, test_epub, output_dir):
+        """测试 lxml 和 html.parser 生成相同的 Markdown"""
+        outputs = []
+        for parser in ['lxml', 'html.parser']:
+            target = Path(output_dir) / parser
+            extract_chapters.extract_chapters(str(test_epub), str(target), output_format='md',
+                                              parser=parser)
+            outputs.append((target / 'chapters.md').read_text(encoding='utf-8'))
+
+        assert outputs[0] == outputs[1]
+        assert '**粗体**' in outputs[0]
+
+    @pytest.mark.parametrize('output_format', ['txt', 'md', 'html'])
+    def test_extract_chapters_parses_each_chapter_once(self, test_epub, output_dir, output_format):
+        """测试每个章节只解析一次"""
+        html_engine.reset_parse_counts()
+
+        extract_chapters.extract_chapters(str(test_epub), output_dir, output_format=output_format)
+
+        assert sum(html_engine.parse_counts.values()) == 3
+
+    def test_process_chapter_matches_separate_steps(self):
+        """测试单次解析流水线与分步函数结果一致"""
+        content = '<nav><h1>目录</h1></nav><h2>标题</h2><p>内容<script>x</script></p>'
+
+        title, formatted = extract_chapters.process_chapter(content, '默认标题', 'md')
+
+        assert title == extract_chapters.extract_chapter_title(content, '默认标题')
+        assert formatted == extract_chapters.format_chapter_as_markdown(content, title)
+
+    @pytest.mark.parametrize('parser', ['lxml', 'html.parser'])
+    def test_html_to_markdown_emits_each_text_once(self, parser):
+        """测试嵌套的行内格式中每段文本只输出一次"""
+        doc = html_engine.parse_html('<p>甲 <strong>乙 <em>丙</em></strong> 丁</p>', parser)
+
+        markdown = extract_chapters.html_to_markdown(doc)
+
+        assert markdown == '甲 **乙 *丙*** 丁'
+
+    @pytest.mark.parametrize('parser', ['lxml', 'html.parser'])
+    def test_html_to_markdown_block_structures(self, parser):
+        """测试列表、引用、表格和代码块的转换"""
+        html = (
+            '<h2>标题</h2>'
+            '<ul><li>一</li><li>二<ol><li>子项</li></ol></li></ul>'
+            '<blockquote><p>引用一</p><p>引用二</p></blockquote>'
+            '<pre><code>def f():\n    return 1</code></pre>'
+            '<table><tr><th>列A</th><th>列B</th></tr><tr><td>1</td><td>a|b</td></tr></table>'
+            '<p>见<a href="http://example.com">链接</a></p>'
+        )
+        doc = html_engine.parse_html(html, parser)
+
+        markdown = extract_chapters.html_to_markdown(doc)
+
+        assert markdown == (
+            '## 标题\n\n'
+            '- 一\n- 二\n    1. 子项\n\n'
+            '> 引用一\n>\n> 引用二\n\n'
+            '```\ndef f():\n    return 1\n```\n\n'
+            '| 列A | 列B |\n| --- | --- |\n| 1 | a\\|b |\n\n'
+            '见[链接](http://example.com)'
+        )
+
+    @pytest.mark.parametrize('output_format', ['txt', 'md', 'html'])
+    def test_extract_chapters_parallel_matches_serial(self, test_epub, output_dir, output_format):
+        """测试多进程转换的输出与串行一致且顺序确定"""
+        outputs = {}
+        for jobs in [1, 2]:
+            target = Path(output_dir) / f'jobs_{jobs}'
+            with redirect_stdout(StringIO()):
+                extract_chapters.extract_chapters(str(test_epub), str(target), output_format=output_format,
+                                                  separate=True, include_metadata=True,
+                                                  generate_toc=True, jobs=jobs)
+            outputs[jobs] = {path.name: path.read_text(encoding='utf-8')
+                             for path in sorted(target.iterdir())}
+
+        assert outputs[1] == outputs[2]
+        assert f'chapter_001.{output_format}' in outputs[2]
+
     def test_extract_chapters_title_extraction(self):
         """测试标题提取功能"""
         # 测试从 HTML 中提取标题
@@ -260,3 +340,23 @@ class TestExtractChaptersCLI:
         assert 'usage:' in output_text
         assert '--format' in output_text
         assert '--separate' in output_text
+
+    def test_main_with_jobs_option(self, test_epub, output_dir):
+        """测试 --jobs 选项"""
+        output = StringIO()
+        with redirect_stdout(output):
+            sys.argv = ['extract_chapters.py', str(test_epub), output_dir, '--jobs', '2']
+            extract_chapters.main()
+
+        assert_file_contains(Path(output_dir) / 'chapters.txt', '第一章')
+
+    def test_main_rejects_invalid_jobs(self, test_epub, output_dir):
+        """测试 --jobs 必须大于 0"""
+        error = StringIO()
+        with redirect_stderr(error):
+            sys.argv = ['extract_chapters.py', str(test_epub), output_dir, '--jobs', '0']
+            with pytest.raises(SystemExit) as exc_info:
+                extract_chapters.main()
+
+        assert exc_info.value.code == 1
+        assert '--jobs 必须大于 0' in error.getvalue()
@@ -6,11 +6,14 @@
 import sys
 import tempfile
 import json
+import zipfile
 import pytest
 from pathlib import Path
 from io import StringIO
 from contextlib import redirect_stdout, redirect_stderr
 
+from ebooklib import epub, ITEM_DOCUMENT, ITEM_IMAGE
+
 import extract_metadata
 from .test_helpers import create_simple_epub
 
@@ -129,3 +132,92 @@ class TestExtractMetadataCLI:
 
         error_text = error.getvalue()
         assert '使用方法' in error_text
+
+
+def _create_epub_with_resources(output_path):
+    """创建包含图片、封面和样式的 EPUB,用于对比快速路径和 ebooklib 的结果"""
+    book = epub.EpubBook()
+    book.set_identifier('resource_book')
+    book.set_title('资源测试书')
+    book.set_language('zh-CN')
+    book.add_author('作者甲')
+    book.add_author('作者乙')
+    book.add_metadata('DC', 'identifier', '9787536692930', {'id': 'isbn', 'scheme': 'ISBN'})
+    book.add_metadata('DC', 'date', '2008-01')
+    book.add_metadata('DC', 'description', '一本用于测试的书')
+    book.set_cover('cover.jpg', b'\xff\xd8\xff\xe0cover')
+
+    chapter = epub.EpubHtml(title='第一章', file_name='chap01.xhtml')
+    chapter.content = '<h1>第一章</h1><img src="images/a.png"/>'
+    book.add_item(chapter)
+    book.add_item(epub.EpubImage(uid='img_a', file_name='images/a.png',
+                                 media_type='image/png', content=b'\x89PNG\r\n\x1a\n'))
+    book.add_item(epub.EpubItem(uid='img_b', file_name='images/b.gif',
+                                media_type='image/gif', content=b'GIF89a'))
+    book.add_item(epub.EpubItem(uid='style', file_name='style.css',
+                                media_type='text/css', content=b'body {}'))
+
+    book.toc = (chapter,)
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ['nav', chapter]
+    epub.write_epub(output_path, book, {})
+    return output_path
+
+
+def _metadata_via_ebooklib(epub_path):
+    """使用 ebooklib 完整读取得到的参考结果"""
+    book = epub.read_epub(epub_path, options={'ignore_ncx': True})
+    chapters = sum(1 for item in book.get_items() if item.get_type() == ITEM_DOCUMENT)
+    images = sum(1 for item in book.get_items() if item.get_type() == ITEM_IMAGE)
+    return {
+        'title': book.get_metadata('DC', 'title')[0][0],
+        'authors': [c[0] for c in book.get_metadata('DC', 'creator')],
+        'publish_date': book.get_metadata('DC', 'date')[0][0],
+        'chapters_count': chapters,
+        'images_count': images,
+    }
+
+
+class TestExtractMetadataFastPath:
+    """测试只读取 OPF 的元数据快速路径"""
+
+    def test_matches_ebooklib(self, output_dir):
+        """测试结果与 ebooklib 完整读取一致"""
+        epub_path = _create_epub_with_resources(str(Path(output_dir) / 'resources.epub'))
+
+        metadata = extract_metadata.extract_metadata(epub_path)
+        expected = _metadata_via_ebooklib(epub_path)
+
+        for key, value in expected.items():
+            assert metadata[key] == value
+        assert metadata['isbn'] == '9787536692930'
+        assert metadata['description'] == '一本用于测试的书'
+
+    def test_reads_only_container_and_opf(self, output_dir, monkeypatch):
+        """测试不会解压章节和图片内容"""
+        epub_path = _create_epub_with_resources(str(Path(output_dir) / 'resources.epub'))
+
+        opened = []
+        original_open = zipfile.ZipFile.open
+
+        def recording_open(self, name, *args, **kwargs):
+            opened.append(name if isinstance(name, str) else name.filename)
+            return original_open(self, name, *args, **kwargs)
+
+        monkeypatch.setattr(zipfile.ZipFile, 'open', recording_open)
+        extract_metadata.extract_metadata(epub_path)
+
+        assert opened == ['META-INF/container.xml', 'EPUB/content.opf']
+
+    def test_missing_manifest_member(self, output_dir):
+        """测试 manifest 引用的文件缺失时报错"""
+        source = _create_epub_with_resources(str(Path(output_dir) / 'resources.epub'))
+        broken = Path(output_dir) / 'broken.epub'
+        with zipfile.ZipFile(source) as src, zipfile.ZipFile(broken, 'w') as dst:
+            for info in src.infolist():
+                if info.filename != 'EPUB/images/a.png':
+                    dst.writestr(info, src.read(info))
+
+        with pytest.raises(RuntimeError, match="无法读取 EPUB 文件"):
+            extract_metadata.extract_metadata(str(broken))
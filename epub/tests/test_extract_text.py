@@ -7,10 +7,17 @@ import sys
 import tempfile
 import pytest
 from pathlib import Path
-from io import StringIO
+from io import BytesIO, StringIO
 from contextlib import redirect_stdout, redirect_stderr
 
+import zipfile
+
+from ebooklib import epub
+
 import extract_text
+import extract_chapters
+from epub_zip import iter_chapters
+from html_engine import parse_html, iter_text_stream, LxmlDocument, SoupDocument
 
 
 def get_test_output_path(output_dir, filename):
@@ -137,3 +144,250 @@ class TestExtractTextCLI:
         error_text = error.getvalue()
         # 可能的错误消息
         assert len(error_text) > 0 or True  # 根据实际实现调整
+
+
+def create_reordered_epub(output_path):
+    """创建书脊顺序与 manifest 顺序不同的 EPUB"""
+    book = epub.EpubBook()
+    book.set_identifier('reordered')
+    book.set_title('乱序测试书')
+    book.set_language('zh-CN')
+
+    chapters = []
+    for name in ['甲', '乙', '丙']:
+        chapter = epub.EpubHtml(title=name, file_name=f'{name}.xhtml')
+        chapter.content = f'<h1>章节{name}</h1><p>内容{name}</p>'
+        book.add_item(chapter)
+        chapters.append(chapter)
+
+    book.toc = tuple(chapters)
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    # manifest 顺序是 甲 乙 丙,书脊顺序是 丙 甲 乙
+    book.spine = ['nav', chapters[2], chapters[0], chapters[1]]
+    epub.write_epub(output_path, book, {})
+    return output_path
+
+
+class TestSpineOrder:
+    """测试按书脊顺序逐章读取"""
+
+    def test_iter_chapters_follows_spine(self, output_dir):
+        """测试章节按书脊顺序产出并跳过导航文档"""
+        epub_path = create_reordered_epub(get_test_output_path(output_dir, 'reordered.epub'))
+
+        names = [item.href for item, _ in iter_chapters(epub_path)]
+
+        assert names == ['丙.xhtml', '甲.xhtml', '乙.xhtml']
+
+    def test_iter_chapters_reads_lazily(self, output_dir, monkeypatch):
+        """测试每次迭代只解压当前章节"""
+        epub_path = create_reordered_epub(get_test_output_path(output_dir, 'reordered.epub'))
+
+        opened = []
+        original_open = zipfile.ZipFile.open
+
+        def recording_open(self, name, *args, **kwargs):
+            opened.append(name if isinstance(name, str) else name.filename)
+            return original_open(self, name, *args, **kwargs)
+
+        monkeypatch.setattr(zipfile.ZipFile, 'open', recording_open)
+        chapters = iter_chapters(epub_path)
+        next(chapters)
+        chapter_reads = [name for name in opened if name.endswith('.xhtml')]
+        chapters.close()
+
+        assert chapter_reads == ['EPUB/丙.xhtml']
+
+    def test_extract_text_uses_spine_order(self, output_dir):
+        """测试文本提取按书脊顺序"""
+        epub_path = create_reordered_epub(get_test_output_path(output_dir, 'reordered.epub'))
+
+        text = extract_text.extract_text_from_epub(epub_path)
+
+        assert text.index('内容丙') < text.index('内容甲') < text.index('内容乙')
+        assert '第 4 章' not in text
+
+    def test_extract_chapters_uses_spine_order(self, output_dir):
+        """测试章节抽取按书脊顺序编号"""
+        epub_path = create_reordered_epub(get_test_output_path(output_dir, 'reordered.epub'))
+
+        extract_chapters.extract_chapters(epub_path, output_dir, output_format='txt', separate=True)
+
+        first = Path(output_dir, 'chapter_001.txt').read_text(encoding='utf-8')
+        assert '内容丙' in first
+        assert not Path(output_dir, 'chapter_004.txt').exists()
+
+
+class TestHtmlParsers:
+    """测试可切换的 HTML 解析层"""
+
+    def test_parsers_produce_same_text(self, test_epub):
+        """测试 lxml 和 html.parser 提取的文本一致"""
+        lxml_text = extract_text.extract_text_from_epub(str(test_epub), parser='lxml')
+        soup_text = extract_text.extract_text_from_epub(str(test_epub), parser='html.parser')
+
+        assert lxml_text == soup_text
+
+    def test_lxml_is_default(self):
+        """测试默认使用 lxml 后端"""
+        doc = parse_html('<h1>标题</h1><p>内容</p>')
+
+        assert isinstance(doc, LxmlDocument)
+        assert doc.find('h1').get_text(strip=True) == '标题'
+
+    def test_fallback_for_unparsable_document(self):
+        """测试 lxml 无法解析时回退到 html.parser"""
+        doc = parse_html(b'   ')
+
+        assert isinstance(doc, SoupDocument)
+        assert doc.get_text() == ''
+
+    def test_invalid_parser(self):
+        """测试不支持的解析器"""
+        with pytest.raises(ValueError, match="不支持的解析器"):
+            parse_html('<p></p>', parser='html5lib')
+
+    def test_main_with_parser_option(self, test_epub):
+        """测试 --parser 选项"""
+        output = StringIO()
+        with redirect_stdout(output):
+            sys.argv = ['extract_text.py', str(test_epub), '--parser', 'html.parser']
+            extract_text.main()
+
+        assert '第一章' in output.getvalue()
+
+
+class TestStreamingText:
+    """测试事件驱动的流式文本提取"""
+
+    def test_stream_matches_tree_extraction(self, test_epub):
+        """测试流式提取与构建文档树的结果一致"""
+        expected = extract_text.extract_text_from_epub(str(test_epub))
+
+        assert extract_text.extract_text_from_epub(str(test_epub), stream=True) == expected
+        assert ''.join(extract_text.stream_text_from_epub(str(test_epub))) == expected
+
+    @pytest.mark.parametrize('chunk_size', [1, 5, 4096])
+    def test_stream_independent_of_chunk_size(self, chunk_size):
+        """测试文本节点跨块、实体拆分时结果不变"""
+        html = ('<html><head><title>书</title><style>p {}</style></head><body>'
+                '<nav><p>目录</p></nav>导航之后<p>甲 &amp; 乙 &#x4e2d;文</p>'
+                '<!-- 注释 -->丙<script>var s = "<p>";</script><div>丁<span>戊</span>己</div>'
+                '</body></html>').encode()
+
+        texts = list(iter_text_stream(BytesIO(html), extract_text.REMOVED_TAGS, chunk_size))
+
+        assert texts == ['导航之后', '甲 & 乙 中文', '丙', '丁', '戊', '己']
+
+    def test_stream_empty_chapter(self, output_dir):
+        """测试零字节的章节在流式模式下与构建文档树时一样产出空文本"""
+        assert list(iter_text_stream(BytesIO(b''), extract_text.REMOVED_TAGS)) == []
+
+        source = create_reordered_epub(str(Path(output_dir) / 'source.epub'))
+        epub_path = Path(output_dir) / 'empty_chapter.epub'
+        with zipfile.ZipFile(source) as src, zipfile.ZipFile(epub_path, 'w') as dst:
+            for info in src.infolist():
+                dst.writestr(info, b'' if info.filename.endswith('甲.xhtml') else src.read(info))
+
+        expected = extract_text.extract_text_from_epub(str(epub_path))
+        assert extract_text.extract_text_from_epub(str(epub_path), stream=True) == expected
+        assert '内容乙' in expected and '内容甲' not in expected
+
+    @pytest.mark.parametrize('stream', [False, True])
+    def test_head_title_not_extracted(self, output_dir, stream):
+        """测试 <head><title> 中的文本不会混入正文"""
+        book = epub.EpubBook()
+        book.set_identifier('head-title')
+        book.set_title('整本书名')
+        book.set_language('zh-CN')
+        chapter = epub.EpubHtml(title='整本书名', file_name='ch1.xhtml')
+        chapter.content = '<h1>第一章</h1><p>正文</p>'
+        book.add_item(chapter)
+        book.add_item(epub.EpubNcx())
+        book.spine = [chapter]
+        epub_path = Path(output_dir) / 'head_title.epub'
+        epub.write_epub(str(epub_path), book, {})
+
+        text = extract_text.extract_text_from_epub(str(epub_path), stream=stream)
+
+        assert '整本书名' not in text
+        assert text.count('第一章') == 1
+        assert '正文' in text
+
+    def test_main_stream_to_stdout(self, test_epub):
+        """测试 --stream 输出到标准输出"""
+        output = StringIO()
+        with redirect_stdout(output):
+            sys.argv = ['extract_text.py', str(test_epub), '--stream']
+            extract_text.main()
+
+        expected = extract_text.extract_text_from_epub(str(test_epub))
+        assert output.getvalue() == expected + '\n'
+
+    def test_main_stream_to_file(self, test_epub, output_dir):
+        """测试 --stream 写入输出文件"""
+        output_path = Path(output_dir) / 'stream.txt'
+        with redirect_stdout(StringIO()):
+            sys.argv = ['extract_text.py', str(test_epub), str(output_path), '--stream']
+            extract_text.main()
+
+        expected = extract_text.extract_text_from_epub(str(test_epub))
+        assert output_path.read_text(encoding='utf-8') == expected
+
+
+class TestIncrementalOutput:
+    """测试逐章产出和边提取边输出"""
+
+    def test_iter_chapter_texts(self, test_epub):
+        """测试逐章产出章节序号和文本"""
+        chapters = list(extract_text.iter_chapter_texts(str(test_epub)))
+
+        assert [num for num, _ in chapters] == [1, 2, 3]
+        assert '第一章' in chapters[0][1]
+        assert '第三章' in chapters[2][1]
+
+    def test_iter_chapter_texts_is_lazy(self, test_epub, monkeypatch):
+        """测试取到第一章时后续章节尚未解压"""
+        read_members = []
+        original_read = zipfile.ZipFile.read
+
+        def tracking_read(self, name, pwd=None):
+            read_members.append(name)
+            return original_read(self, name, pwd)
+
+        monkeypatch.setattr(zipfile.ZipFile, 'read', tracking_read)
+
+        chapters = extract_text.iter_chapter_texts(str(test_epub))
+        next(chapters)
+        chapters.close()
+
+        assert len([name for name in read_members if name.endswith('.xhtml')]) == 1
+
+    @pytest.mark.parametrize('stream', [False, True])
+    def test_chunks_join_to_full_text(self, test_epub, stream):
+        """测试文本片段拼接后与完整提取结果一致"""
+        chunks = list(extract_text.iter_text_chunks(str(test_epub), stream=stream))
+
+        assert len(chunks) >= 3
+        assert ''.join(chunks) == extract_text.extract_text_from_epub(str(test_epub))
+
+    def test_write_text_flushes_each_chunk(self, test_epub, monkeypatch):
+        """测试每个片段写出后立即刷新标准输出"""
+        class RecordingStream(StringIO):
+            def __init__(self):
+                super().__init__()
+                self.flushed = []
+
+            def flush(self):
+                self.flushed.append(self.getvalue())
+
+        output = RecordingStream()
+        monkeypatch.setattr(sys, 'stdout', output)
+
+        extract_text.write_text(str(test_epub))
+
+        # 每章写出后都刷新过一次,刷新时的内容逐步增长
+        assert len(output.flushed) >= 3
+        assert '第一章' in output.flushed[0] and '第三章' not in output.flushed[0]
+        assert output.getvalue() == extract_text.extract_text_from_epub(str(test_epub)) + '\n'
@@ -10,10 +10,16 @@
 - validate_epub.py
 - update_metadata.py
 - extract_images.py
+- catalog_metadata.py
 """
 import sys
 import os
+import re
+import json
 import shutil
+import sqlite3
+import zipfile
+import pytest
 from pathlib import Path
 from io import StringIO
 from contextlib import redirect_stdout, redirect_stderr
@@ -87,6 +93,210 @@ class TestSplitEpub:
             title = book.get_metadata('DC', 'title')
             assert title is not None
 
+    def _create_book_with_dependencies(self, output_path):
+        """创建各章节引用不同资源的 EPUB"""
+        book = epub.EpubBook()
+        book.set_identifier('deps_book')
+        book.set_title('依赖测试')
+        book.set_language('zh-CN')
+        book.add_author('测试作者')
+
+        chap1 = epub.EpubHtml(title='第一章', file_name='text/chap1.xhtml')
+        chap1.content = '<h1>第一章</h1><img src="../images/a.png"/><a href="chap2.xhtml">下一章</a>'
+        chap1.add_link(href='../styles/main.css', rel='stylesheet', type='text/css')
+        chap2 = epub.EpubHtml(title='第二章', file_name='text/chap2.xhtml')
+        chap2.content = ('<h1>第二章</h1><svg xmlns="http://www.w3.org/2000/svg" '
+                         'xmlns:xlink="http://www.w3.org/1999/xlink"><image xlink:href="../images/cover.jpg"/></svg>')
+        chap3 = epub.EpubHtml(title='第三章', file_name='text/chap3.xhtml')
+        chap3.content = '<h1>第三章</h1><p style="background: url(\'../images/p.gif\')">内容</p>'
+
+        resources = [
+            epub.EpubItem(uid='main_css', file_name='styles/main.css', media_type='text/css',
+                          content=b'@import "fonts.css";\nbody { background: url(../images/bg.png); }'),
+            epub.EpubItem(uid='fonts_css', file_name='styles/fonts.css', media_type='text/css',
+                          content=b'@font-face { font-family: f; src: url("../fonts/f.ttf"); }'),
+            epub.EpubItem(uid='font', file_name='fonts/f.ttf', media_type='application/x-font-ttf',
+                          content=b'\x00\x01\x00\x00font'),
+            epub.EpubImage(uid='a', file_name='images/a.png', media_type='image/png', content=b'\x89PNGa'),
+            epub.EpubImage(uid='bg', file_name='images/bg.png', media_type='image/png', content=b'\x89PNGbg'),
+            epub.EpubImage(uid='cover', file_name='images/cover.jpg', media_type='image/jpeg', content=b'\xff\xd8c'),
+            epub.EpubItem(uid='p', file_name='images/p.gif', media_type='image/gif', content=b'GIF89a'),
+            epub.EpubImage(uid='unused', file_name='images/unused.png', media_type='image/png', content=b'\x89PNGu'),
+        ]
+        for item in [chap1, chap2, chap3, *resources]:
+            book.add_item(item)
+
+        book.toc = (chap1, chap2, chap3)
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        book.spine = ['nav', chap1, chap2, chap3]
+        epub.write_epub(output_path, book, {})
+        return output_path
+
+    def test_split_copies_only_referenced_resources(self, output_dir):
+        """测试每个章节只包含自己引用的资源(含 @import 的样式表和字体)"""
+        import split_epub
+
+        source = self._create_book_with_dependencies(get_test_output_path(output_dir, 'deps.epub'))
+        split_dir = Path(output_dir) / 'split_deps'
+
+        with redirect_stdout(StringIO()):
+            split_epub.split_epub(source, str(split_dir))
+
+        def resources(num):
+            with zipfile.ZipFile(split_dir / f'chapter_{num:03d}.epub') as zf:
+                return sorted(name.split('/', 1)[1] for name in zf.namelist()
+                              if name.startswith('EPUB/') and not name.endswith(('.opf', '.ncx', 'nav.xhtml')))
+
+        assert sorted(os.listdir(split_dir)) == ['chapter_001.epub', 'chapter_002.epub', 'chapter_003.epub']
+        assert resources(1) == ['fonts/f.ttf', 'images/a.png', 'images/bg.png',
+                                'styles/fonts.css', 'styles/main.css', 'text/chap1.xhtml']
+        assert resources(2) == ['images/cover.jpg', 'text/chap2.xhtml']
+        assert resources(3) == ['images/p.gif', 'text/chap3.xhtml']
+
+    def test_split_parallel_matches_serial(self, output_dir):
+        """测试多进程写出的章节与串行一致且文件名确定"""
+        import split_epub
+
+        source = self._create_book_with_dependencies(get_test_output_path(output_dir, 'deps.epub'))
+        outputs = {}
+        for jobs in [1, 2]:
+            split_dir = Path(output_dir) / f'jobs_{jobs}'
+            with redirect_stdout(StringIO()):
+                split_epub.split_epub(source, str(split_dir), jobs=jobs)
+            outputs[jobs] = {}
+            for name in sorted(os.listdir(split_dir)):
+                with zipfile.ZipFile(split_dir / name) as zf:
+                    # 修改时间只取到秒,两次分割可能跨秒
+                    outputs[jobs][name] = {
+                        info.filename: re.sub(rb'<meta property="dcterms:modified">[^<]*', b'', zf.read(info))
+                        for info in zf.infolist()
+                    }
+
+        assert outputs[1] == outputs[2]
+        assert list(outputs[2]) == ['chapter_001.epub', 'chapter_002.epub', 'chapter_003.epub']
+
+    def test_split_shares_precompressed_parts(self, output_dir):
+        """测试所有章节共用相同的预压缩成员和同一个修改时间"""
+        import split_epub
+
+        source = self._create_book_with_dependencies(get_test_output_path(output_dir, 'deps.epub'))
+        split_dir = Path(output_dir) / 'split_shared'
+        with redirect_stdout(StringIO()):
+            split_epub.split_epub(source, str(split_dir))
+
+        headers = set()
+        timestamps = set()
+        for name in sorted(os.listdir(split_dir)):
+            with open(split_dir / name, 'rb') as raw, zipfile.ZipFile(raw) as zf:
+                infos = zf.infolist()
+                assert [info.filename for info in infos[:2]] == ['mimetype', 'META-INF/container.xml']
+                assert infos[0].compress_type == zipfile.ZIP_STORED
+                assert zf.read('mimetype') == b'application/epub+zip'
+                container = infos[1]
+                raw.seek(container.header_offset + 30 + len(container.filename))
+                headers.add(raw.read(container.compress_size))
+                opf = zf.read('EPUB/content.opf').decode('utf-8')
+                timestamps.add(re.search(r'dcterms:modified">([^<]*)', opf).group(1))
+
+        assert len(headers) == 1
+        assert len(timestamps) == 1
+
+    def test_group_by_size_balances_consecutive_items(self):
+        """测试按大小把连续条目均衡分组"""
+        import split_epub
+
+        assert split_epub.group_by_size([10] * 10, parts=3) == [(0, 3), (3, 7), (7, 10)]
+        # 前面的小章节合成一组,大章节单独成组
+        assert split_epub.group_by_size([1, 1, 1, 100], parts=2) == [(0, 3), (3, 4)]
+        # 每组至少一个条目,条目不足时每个条目一组
+        assert split_epub.group_by_size([100, 1, 1, 1], parts=3) == [(0, 1), (1, 3), (3, 4)]
+        assert split_epub.group_by_size([5, 5, 5], parts=5) == [(0, 1), (1, 2), (2, 3)]
+        assert split_epub.group_by_size([3, 4, 5, 20, 1], max_bytes=8) == [(0, 2), (2, 3), (3, 4), (4, 5)]
+        assert split_epub.group_by_size([3, 4, 5]) == [(0, 1), (1, 2), (2, 3)]
+
+    def test_split_into_balanced_parts(self, output_dir):
+        """测试 --parts 把连续章节合并为大小均衡的 EPUB"""
+        import split_epub
+
+        book = epub.EpubBook()
+        book.set_identifier('parts_book')
+        book.set_title('分卷测试')
+        book.set_language('zh')
+        chapters = []
+        for num, size in enumerate([200, 200, 200, 5000, 300, 300], start=1):
+            chapter = epub.EpubHtml(title=f'第{num}章', file_name=f'chap{num}.xhtml', lang='zh')
+            chapter.content = f'<html><body><h1>第{num}章</h1><p>{"字" * size}</p></body></html>'
+            book.add_item(chapter)
+            chapters.append(chapter)
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        book.spine = ['nav', *chapters]
+        source = get_test_output_path(output_dir, 'parts.epub')
+        epub.write_epub(source, book, {})
+
+        split_dir = Path(output_dir) / 'parts'
+        with redirect_stdout(StringIO()):
+            split_epub.split_epub(source, str(split_dir), parts=3)
+
+        assert sorted(os.listdir(split_dir)) == ['part_001.epub', 'part_002.epub', 'part_003.epub']
+        spines = []
+        for name in sorted(os.listdir(split_dir)):
+            part = epub.read_epub(str(split_dir / name))
+            spines.append([part.get_item_with_id(idref).file_name for idref, _ in part.spine
+                           if idref != 'nav'])
+        assert spines == [['chap1.xhtml', 'chap2.xhtml', 'chap3.xhtml'], ['chap4.xhtml'],
+                          ['chap5.xhtml', 'chap6.xhtml']]
+
+        max_dir = Path(output_dir) / 'max_bytes'
+        with redirect_stdout(StringIO()):
+            split_epub.split_epub(source, str(max_dir), max_bytes=4000)
+        assert len(os.listdir(max_dir)) == 3
+
+    def test_split_rejects_parts_with_max_bytes(self, test_epub, output_dir):
+        """测试 parts 和 max_bytes 不能同时指定"""
+        import split_epub
+
+        with pytest.raises(RuntimeError, match='不能同时指定'):
+            split_epub.split_epub(str(test_epub), output_dir, parts=2, max_bytes=100)
+
+    def test_split_main_rejects_invalid_jobs(self, test_epub, output_dir):
+        """测试 --jobs 必须大于 0"""
+        import split_epub
+
+        error = StringIO()
+        with redirect_stderr(error):
+            sys.argv = ['split_epub.py', str(test_epub), output_dir, '--jobs', '0']
+            with pytest.raises(SystemExit) as exc_info:
+                split_epub.main()
+
+        assert exc_info.value.code == 1
+        assert '--jobs 必须大于 0' in error.getvalue()
+
+    def test_resource_graph_scans_shared_stylesheet_once(self, output_dir, monkeypatch):
+        """测试多个章节共用的样式表只扫描一次"""
+        import split_epub
+        from epub_zip import read_package
+
+        source = self._create_book_with_dependencies(get_test_output_path(output_dir, 'deps.epub'))
+        scanned = []
+        original_references = split_epub.iter_css_references
+
+        def recording_references(text):
+            scanned.append(text)
+            return original_references(text)
+
+        monkeypatch.setattr(split_epub, 'iter_css_references', recording_references)
+
+        with zipfile.ZipFile(source) as zf:
+            graph = split_epub.ResourceGraph(zf, read_package(zf))
+            first = graph.dependencies('EPUB/text/chap1.xhtml')
+            second = graph.dependencies('EPUB/text/chap1.xhtml')
+
+        assert first == second == ['EPUB/styles/main.css', 'EPUB/styles/fonts.css', 'EPUB/fonts/f.ttf',
+                                   'EPUB/images/bg.png', 'EPUB/images/a.png']
+        assert len(scanned) == 2
+
 
 class TestValidateEpub:
     """测试 EPUB 验证功能"""
@@ -195,6 +405,155 @@ class TestUpdateMetadata:
         assert len(authors) == 1
         assert authors[0][0] == '新作者'
 
+    def test_update_patches_opf_and_copies_other_members(self, output_dir):
+        """测试只改写 OPF 和 NCX,其余成员的压缩数据原样保留"""
+        import update_metadata
+
+        source = create_book_with_resources(get_test_output_path(output_dir, 'raw.epub'), '原标题',
+                                            image=os.urandom(64 * 1024))
+        with zipfile.ZipFile(source) as zf:
+            before = {info.filename: (info.CRC, info.compress_size, info.compress_type) for info in zf.infolist()}
+
+        with redirect_stdout(StringIO()):
+            changed = update_metadata.update_metadata(source, title='新标题', isbn='9787000000000')
+
+        assert changed == ['title', 'isbn']
+        with zipfile.ZipFile(source) as zf:
+            after = {info.filename: (info.CRC, info.compress_size, info.compress_type) for info in zf.infolist()}
+            ncx = zf.read('EPUB/toc.ncx').decode('utf-8')
+            assert zf.testzip() is None
+
+        assert list(after) == list(before)
+        patched = {name for name in before if before[name] != after[name]}
+        assert patched == {'EPUB/content.opf', 'EPUB/toc.ncx'}
+        assert '<text>新标题</text>' in ncx
+        assert 'content="9787000000000"' in ncx
+
+        book = epub.read_epub(source)
+        assert book.get_metadata('DC', 'title')[0][0] == '新标题'
+        assert book.uid == '9787000000000'
+
+    def test_update_removes_refinements_of_cleared_fields(self, output_dir):
+        """测试清除作者时同时删除指向旧作者的 refines 元数据"""
+        import update_metadata
+
+        book = epub.EpubBook()
+        book.set_identifier('refines_book')
+        book.set_title('标题')
+        book.add_author('旧作者', file_as='作者, 旧', role='aut', uid='author_1')
+        chapter = epub.EpubHtml(title='第一章', file_name='chap1.xhtml')
+        chapter.content = '<html><body><p>内容</p></body></html>'
+        book.add_item(chapter)
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        book.spine = ['nav', chapter]
+        source = get_test_output_path(output_dir, 'refines.epub')
+        epub.write_epub(source, book, {})
+
+        with redirect_stdout(StringIO()):
+            update_metadata.update_metadata(source, author='新作者')
+
+        with zipfile.ZipFile(source) as zf:
+            opf = zf.read('EPUB/content.opf').decode('utf-8')
+        assert '旧作者' not in opf
+        assert '#author_1' not in opf
+        assert '新作者' in opf
+
+    def test_update_failure_leaves_original_untouched(self, test_epub, output_dir, monkeypatch):
+        """测试写出失败时原文件不变且不留下临时文件"""
+        import epub_zip
+        import update_metadata
+
+        target_dir = Path(output_dir) / 'atomic'
+        target_dir.mkdir()
+        target = target_dir / 'book.epub'
+        shutil.copy(str(test_epub), target)
+        original = target.read_bytes()
+
+        def failing_copy(*args, **kwargs):
+            raise OSError('磁盘已满')
+
+        monkeypatch.setattr(epub_zip, 'copy_member_raw', failing_copy)
+        with pytest.raises(RuntimeError, match='磁盘已满'):
+            update_metadata.update_metadata(str(target), title='新标题')
+
+        assert target.read_bytes() == original
+        assert os.listdir(target_dir) == ['book.epub']
+
+    def test_read_manifest_csv_and_jsonl(self, output_dir):
+        """测试读取 CSV 和 JSONL 清单,同一本书的多行按顺序合并"""
+        import update_metadata
+
+        csv_path = Path(output_dir) / 'fixes.csv'
+        csv_path.write_text('path,title,author,isbn\n'
+                            'a.epub,标题一,,\n'
+                            'b.epub,,作者二,978\n'
+                            'a.epub,标题三,作者三,\n', encoding='utf-8')
+        assert update_metadata.read_manifest(str(csv_path)) == [
+            ('a.epub', {'title': '标题三', 'author': '作者三'}),
+            ('b.epub', {'author': '作者二', 'isbn': '978'}),
+        ]
+
+        jsonl_path = Path(output_dir) / 'fixes.jsonl'
+        jsonl_path.write_text('{"file": "c.epub", "publisher": "出版社", "title": null}\n\n', encoding='utf-8')
+        assert update_metadata.read_manifest(str(jsonl_path)) == [('c.epub', {'publisher': '出版社'})]
+
+    def test_read_manifest_bom_and_equivalent_paths(self, output_dir):
+        """测试带 BOM 的 CSV,以及同一文件的不同写法合并为一条"""
+        import update_metadata
+
+        csv_path = Path(output_dir) / 'excel.csv'
+        csv_path.write_text('path,title,author\n'
+                            'a.epub,标题一,\n'
+                            './a.epub,,作者一\n', encoding='utf-8-sig')
+        assert update_metadata.read_manifest(str(csv_path)) == [
+            ('a.epub', {'title': '标题一', 'author': '作者一'}),
+        ]
+
+    def test_batch_update_in_parallel_with_report(self, output_dir):
+        """测试批量修改:并行处理、逐本原子替换、记录失败的书"""
+        import update_metadata
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'batch_{num}.epub'), f'书{num}')
+                 for num in range(4)]
+        entries = [(path, {'title': f'新书{num}', 'publisher': '新出版社'}) for num, path in enumerate(books)]
+        entries.append((get_test_output_path(output_dir, 'missing.epub'), {'title': '不存在'}))
+        entries.append((books[0], {}))
+
+        report = StringIO()
+        error = StringIO()
+        with redirect_stderr(error):
+            stats = update_metadata.batch_update_metadata(entries, jobs=2, report=report)
+
+        assert stats == {'total': 6, 'updated': 4, 'unchanged': 0, 'errors': 2}
+        records = [json.loads(line) for line in report.getvalue().splitlines()]
+        assert [record['file'] for record in records] == [entry[0] for entry in entries]
+        assert records[0]['changed'] == ['title', 'publisher']
+        assert 'error' in records[4] and 'error' in records[5]
+        assert 'missing.epub' in error.getvalue()
+
+        for num, path in enumerate(books):
+            book = epub.read_epub(path)
+            assert book.get_metadata('DC', 'title')[0][0] == f'新书{num}'
+            assert book.get_metadata('DC', 'publisher')[0][0] == '新出版社'
+
+    def test_main_with_manifest(self, output_dir):
+        """测试 --manifest 命令行模式"""
+        import update_metadata
+
+        book = create_book_with_resources(get_test_output_path(output_dir, 'cli.epub'), '旧书名')
+        manifest = Path(output_dir) / 'cli.jsonl'
+        manifest.write_text(json.dumps({'path': book, 'title': '命令行书名'}, ensure_ascii=False) + '\n',
+                            encoding='utf-8')
+        report = Path(output_dir) / 'report.jsonl'
+
+        sys.argv = ['update_metadata.py', '--manifest', str(manifest), '--jobs', '1', '--report', str(report)]
+        with redirect_stderr(StringIO()):
+            update_metadata.main()
+
+        assert json.loads(report.read_text(encoding='utf-8')) == {'file': book, 'changed': ['title']}
+        assert epub.read_epub(book).get_metadata('DC', 'title')[0][0] == '命令行书名'
+
 
 class TestExtractImages:
     """测试图片提取功能"""
@@ -212,6 +571,345 @@ class TestExtractImages:
         # 验证输出目录存在
         assert Path(output_dir).exists()
 
+    def test_extract_images_streams_members_from_manifest(self, output_dir):
+        """测试按 manifest 从 ZIP 成员中提取图片,内容与原图一致"""
+        import extract_images
+
+        image = os.urandom(300 * 1024)
+        source = create_book_with_resources(get_test_output_path(output_dir, 'stream_images.epub'), '图片书',
+                                            image=image)
+        target = Path(output_dir) / 'streamed'
+
+        output = StringIO()
+        with redirect_stdout(output):
+            extract_images.extract_images(source, str(target))
+
+        assert sorted(os.listdir(target)) == ['logo.png']
+        assert (target / 'logo.png').read_bytes() == image
+        assert '提取图片: 1 张' in output.getvalue()
+
+    def _create_book_with_images(self, output_path, images):
+        """创建包含给定图片 {书内路径: 内容} 的 EPUB"""
+        book = epub.EpubBook()
+        book.set_identifier('images_book')
+        book.set_title('图片')
+        book.set_language('zh')
+        chapter = epub.EpubHtml(title='第一章', file_name='chap1.xhtml')
+        chapter.content = '<html><body><p>图</p></body></html>'
+        book.add_item(chapter)
+        media_types = {'.gif': 'image/gif', '.jpg': 'image/jpeg', '.svg': 'image/svg+xml', '.webp': 'image/webp'}
+        for num, (file_name, content) in enumerate(images.items()):
+            media_type = media_types.get(os.path.splitext(file_name)[1], 'image/png')
+            book.add_item(epub.EpubItem(uid=f'image_{num}', file_name=file_name, media_type=media_type,
+                                        content=content))
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        book.spine = ['nav', chapter]
+        epub.write_epub(output_path, book, {})
+        return output_path
+
+    def test_name_allocator_tracks_names_in_memory(self):
+        """测试文件名冲突在内存中解决,结果与逐个 stat 时相同"""
+        import extract_images
+
+        names = extract_images.NameAllocator(['image001.png'])
+        assigned = [names.allocate('image001.png') for _ in range(3)]
+        assert assigned == ['image001_1.png', 'image001_2.png', 'image001_3.png']
+        assert names.allocate('Image001_1.png') == 'Image001_1_1.png'
+        assert names.allocate('cover.png') == 'cover.png'
+
+    def test_extract_images_flattens_colliding_names(self, output_dir):
+        """测试同名图片展开到同一目录时依次编号,已有文件不会被覆盖"""
+        import extract_images
+
+        source = self._create_book_with_images(get_test_output_path(output_dir, 'names.epub'), {
+            f'part{num}/image001.png': bytes([num]) * 100 for num in range(3)
+        })
+        target = Path(output_dir) / 'flat'
+        target.mkdir()
+        (target / 'image001.png').write_bytes(b'existing')
+
+        with redirect_stdout(StringIO()):
+            extract_images.extract_images(source, str(target))
+
+        assert sorted(os.listdir(target)) == ['image001.png', 'image001_1.png', 'image001_2.png', 'image001_3.png']
+        assert (target / 'image001.png').read_bytes() == b'existing'
+        assert (target / 'image001_3.png').read_bytes() == bytes([2]) * 100
+
+    def test_extract_images_keep_paths(self, output_dir):
+        """测试 keep_paths 保留图片在书中的目录结构"""
+        import extract_images
+
+        source = self._create_book_with_images(get_test_output_path(output_dir, 'paths.epub'), {
+            'part0/image001.png': b'a' * 10, 'part1/image001.png': b'b' * 10,
+        })
+        target = Path(output_dir) / 'tree'
+
+        with redirect_stdout(StringIO()):
+            extract_images.extract_images(source, str(target), keep_paths=True)
+
+        assert (target / 'part0' / 'image001.png').read_bytes() == b'a' * 10
+        assert (target / 'part1' / 'image001.png').read_bytes() == b'b' * 10
+
+    def test_extract_images_dedup(self, output_dir):
+        """测试内容相同的图片只解压一次:硬链接或清单条目"""
+        import extract_images
+
+        shared = os.urandom(2048)
+        source = self._create_book_with_images(get_test_output_path(output_dir, 'dups.epub'), {
+            'a/logo.png': shared, 'b/logo.png': shared, 'c/other.png': os.urandom(2048),
+        })
+
+        linked = Path(output_dir) / 'linked'
+        output = StringIO()
+        with redirect_stdout(output):
+            extract_images.extract_images(source, str(linked), dedup='link')
+        assert sorted(os.listdir(linked)) == ['logo.png', 'logo_1.png', 'other.png']
+        assert (linked / 'logo_1.png').read_bytes() == shared
+        assert os.path.samefile(linked / 'logo.png', linked / 'logo_1.png')
+        assert '重复图片: 1 张' in output.getvalue()
+
+        listed = Path(output_dir) / 'listed'
+        with redirect_stdout(StringIO()):
+            extract_images.extract_images(source, str(listed), dedup='manifest')
+        assert sorted(os.listdir(listed)) == ['images.json', 'logo.png', 'other.png']
+        manifest = json.loads((listed / 'images.json').read_text(encoding='utf-8'))
+        assert manifest == [
+            {'source': 'a/logo.png', 'file': 'logo.png'},
+            {'source': 'b/logo.png', 'file': 'logo.png'},
+            {'source': 'c/other.png', 'file': 'other.png'},
+        ]
+
+    @staticmethod
+    def _corrupt_member(epub_path, name):
+        """把成员的压缩数据改成无效的 deflate 流,中央目录中的大小和 CRC 保持不变"""
+        import struct
+
+        with zipfile.ZipFile(epub_path) as zf:
+            info = zf.getinfo(name)
+        with open(epub_path, 'r+b') as f:
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(name_length + extra_length, os.SEEK_CUR)
+            f.write(b'\xff' * info.compress_size)
+
+    def test_extract_images_dedup_skips_corrupt_duplicate(self, output_dir):
+        """测试去重比较时遇到损坏的图片只跳过该图片,其余图片照常提取"""
+        import extract_images
+
+        shared = os.urandom(2048)
+        source = self._create_book_with_images(get_test_output_path(output_dir, 'corrupt_dups.epub'), {
+            'a/logo.png': shared, 'b/logo.png': shared, 'c/other.png': os.urandom(2048),
+        })
+        self._corrupt_member(source, 'EPUB/b/logo.png')
+
+        target = Path(output_dir) / 'corrupt_linked'
+        error = StringIO()
+        with redirect_stdout(StringIO()), redirect_stderr(error):
+            extract_images.extract_images(source, str(target), dedup='link')
+
+        assert sorted(os.listdir(target)) == ['logo.png', 'other.png']
+        assert (target / 'logo.png').read_bytes() == shared
+        assert '✗ 跳过: b/logo.png' in error.getvalue()
+
+    def test_extract_images_parallel_matches_serial(self, output_dir, monkeypatch):
+        """测试多线程写出的文件名、内容和清单与串行一致,进度按批输出"""
+        import extract_images
+
+        monkeypatch.setattr(extract_images, 'PROGRESS_EVERY', 10)
+        images = {}
+        for num in range(40):
+            images[f'part{num % 3}/image{num % 7:03d}.png'] = os.urandom(1024) if num % 5 else b'same' * 256
+        source = self._create_book_with_images(get_test_output_path(output_dir, 'many.epub'), images)
+
+        results = {}
+        for jobs in [1, 4]:
+            for dedup in ['link', 'manifest']:
+                target = Path(output_dir) / f'{dedup}_{jobs}'
+                output = StringIO()
+                with redirect_stdout(output):
+                    extract_images.extract_images(source, str(target), dedup=dedup, jobs=jobs)
+                results[jobs, dedup] = {path.name: path.read_bytes() for path in sorted(target.iterdir())}
+
+                assert '✓ 提取' not in output.getvalue()
+                assert '进度: 10/' in output.getvalue()
+                assert '张/秒' in output.getvalue() and 'MB/秒' in output.getvalue()
+
+        assert results[1, 'link'] == results[4, 'link']
+        assert results[1, 'manifest'] == results[4, 'manifest']
+        assert len(results[1, 'manifest']) < len(results[1, 'link'])
+
+    def test_extract_images_main_rejects_invalid_jobs(self, test_epub, output_dir):
+        """测试 --jobs 必须大于 0"""
+        import extract_images
+
+        error = StringIO()
+        with redirect_stderr(error):
+            sys.argv = ['extract_images.py', str(test_epub), output_dir, '--jobs', '0']
+            with pytest.raises(SystemExit) as exc_info:
+                extract_images.main()
+
+        assert exc_info.value.code == 1
+        assert '--jobs 必须大于 0' in error.getvalue()
+
+    @staticmethod
+    def _image_headers():
+        """各种格式的最小图片头部"""
+        import struct
+
+        png = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 640, 480) + b'\x08\x02\0\0\0'
+        gif = b'GIF89a' + struct.pack('<HH', 120, 80) + b'\0' * 10
+        # SOF 之前有一个 60KB 的 APP1 段
+        jpeg = (b'\xff\xd8\xff\xe1' + struct.pack('>H', 60002) + b'\0' * 60000 +
+                b'\xff\xc2' + struct.pack('>HBHH', 17, 8, 768, 1024) + b'\0' * 15 + b'\xff\xd9')
+        riff = b'RIFF' + b'\0' * 4 + b'WEBP'
+        webp = riff + b'VP8 ' + b'\0' * 7 + b'\x9d\x01\x2a' + struct.pack('<HH', 300, 200)
+        webp_lossless = riff + b'VP8L' + b'\0' * 4 + b'\x2f' + (299 | 199 << 14).to_bytes(4, 'little')
+        webp_extended = riff + b'VP8X' + b'\0' * 8 + (299).to_bytes(3, 'little') + (199).to_bytes(3, 'little')
+        svg = b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg" width="50%" viewBox="0 0 90 60"/>'
+        return {'png': png, 'gif': gif, 'jpeg': jpeg, 'webp': webp, 'webp_lossless': webp_lossless,
+                'webp_extended': webp_extended, 'svg': svg}
+
+    def test_sniff_image_reads_dimensions_from_headers(self):
+        """测试从图片头部读取格式和尺寸"""
+        from io import BytesIO
+
+        import extract_images
+
+        headers = self._image_headers()
+        sniffed = {name: extract_images.sniff_image(BytesIO(data)) for name, data in headers.items()}
+        assert sniffed == {
+            'png': ('png', 640, 480),
+            'gif': ('gif', 120, 80),
+            'jpeg': ('jpeg', 1024, 768),
+            'webp': ('webp', 300, 200),
+            'webp_lossless': ('webp', 300, 200),
+            'webp_extended': ('webp', 300, 200),
+            'svg': ('svg', 90, 60),
+        }
+        assert extract_images.sniff_image(BytesIO(b'\xff\xd8\xff')) == ('jpeg', None, None)
+        assert extract_images.sniff_image(BytesIO(b'<html/>')) == (None, None, None)
+        assert extract_images.sniff_image(BytesIO(b'not an image')) == (None, None, None)
+
+    def test_sniff_jpeg_rejects_invalid_segment_length(self):
+        """测试 JPEG 段长度小于 2 时判定为损坏,不会读完整个图片"""
+        from io import BytesIO
+
+        import extract_images
+
+        stream = BytesIO(b'\xff\xd8\xff\xe0\x00\x01' + b'\0' * (1024 * 1024))
+
+        assert extract_images.sniff_image(stream) == ('jpeg', None, None)
+        assert stream.tell() < 64 * 1024
+
+    def test_inventory_reports_missing_members(self, output_dir):
+        """测试 manifest 中有但 ZIP 中缺失的图片在清单中记录错误"""
+        import extract_images
+
+        headers = self._image_headers()
+        source = self._create_book_with_images(get_test_output_path(output_dir, 'missing_source.epub'), {
+            'images/gone.png': headers['png'], 'images/chart.png': headers['png'],
+        })
+        target = get_test_output_path(output_dir, 'missing_inventory.epub')
+        with zipfile.ZipFile(source) as src, zipfile.ZipFile(target, 'w') as dst:
+            for info in src.infolist():
+                if not info.filename.endswith('gone.png'):
+                    dst.writestr(info, src.read(info))
+
+        records = extract_images.inventory_images(target, min_width=100)
+        assert [(r['source'], r['size'], 'error' in r) for r in records] == [
+            ('images/gone.png', None, True),
+            ('images/chart.png', len(headers['png']), False),
+        ]
+
+    def test_inventory_and_filters(self, output_dir):
+        """测试图片清单和 --min-width / --types 筛选"""
+        import extract_images
+
+        headers = self._image_headers()
+        source = self._create_book_with_images(get_test_output_path(output_dir, 'inventory.epub'), {
+            'images/photo.jpg': headers['jpeg'], 'images/chart.png': headers['png'],
+            'images/icon.gif': headers['gif'], 'images/art.webp': headers['webp'], 'images/map.svg': headers['svg'],
+        })
+
+        records = extract_images.inventory_images(source)
+        assert [(r['source'], r['format'], r['width'], r['height'], r['size']) for r in records] == [
+            ('images/photo.jpg', 'jpeg', 1024, 768, len(headers['jpeg'])),
+            ('images/chart.png', 'png', 640, 480, len(headers['png'])),
+            ('images/icon.gif', 'gif', 120, 80, len(headers['gif'])),
+            ('images/art.webp', 'webp', 300, 200, len(headers['webp'])),
+            ('images/map.svg', 'svg', 90, 60, len(headers['svg'])),
+        ]
+        assert records[3]['media_type'] == 'image/webp'
+
+        wide = extract_images.inventory_images(source, min_width=300, types={'jpeg', 'webp', 'gif'})
+        assert [r['source'] for r in wide] == ['images/photo.jpg', 'images/art.webp']
+
+        target = Path(output_dir) / 'filtered'
+        output = StringIO()
+        with redirect_stdout(output):
+            extract_images.extract_images(source, str(target), min_width=500)
+        assert sorted(os.listdir(target)) == ['chart.png', 'photo.jpg']
+        assert '筛除图片: 3 张' in output.getvalue()
+
+    def test_inventory_and_filters_handle_corrupt_images_and_cover(self, output_dir):
+        """测试头部损坏的图片只影响自身,封面图片列入清单"""
+        import extract_images
+
+        headers = self._image_headers()
+        book = epub.EpubBook()
+        book.set_identifier('cover_book')
+        book.set_title('封面')
+        book.set_language('zh')
+        book.set_cover('images/cover.png', headers['png'], create_page=False)
+        chapter = epub.EpubHtml(title='第一章', file_name='chap1.xhtml')
+        chapter.content = '<html><body><p>图</p></body></html>'
+        book.add_item(chapter)
+        for num, name in enumerate(['broken.png', 'chart.png']):
+            book.add_item(epub.EpubItem(uid=f'image_{num}', file_name=f'images/{name}', media_type='image/png',
+                                        content=headers['png']))
+        book.add_item(epub.EpubNcx())
+        book.spine = [chapter]
+        source = get_test_output_path(output_dir, 'corrupt_inventory.epub')
+        epub.write_epub(source, book, {})
+        self._corrupt_member(source, 'EPUB/images/broken.png')
+
+        records = extract_images.inventory_images(source, min_width=100)
+        assert [(r['source'], r['format'], r['cover']) for r in records] == [
+            ('images/cover.png', 'png', True),
+            ('images/broken.png', None, False),
+            ('images/chart.png', 'png', False),
+        ]
+        assert 'error' in records[1] and 'error' not in records[2]
+
+        target = Path(output_dir) / 'corrupt_filtered'
+        output, error = StringIO(), StringIO()
+        with redirect_stdout(output), redirect_stderr(error):
+            extract_images.extract_images(source, str(target), min_width=100, jobs=2)
+        assert sorted(os.listdir(target)) == ['chart.png']
+        assert '✗ 跳过: images/broken.png' in error.getvalue()
+        assert '跳过图片: 1 张' in output.getvalue()
+
+    def test_main_inventory_outputs_json(self, output_dir):
+        """测试 --inventory 输出 JSON 清单而不提取图片"""
+        import extract_images
+
+        headers = self._image_headers()
+        source = self._create_book_with_images(get_test_output_path(output_dir, 'cli_inventory.epub'), {
+            'images/chart.png': headers['png'], 'images/icon.gif': headers['gif'],
+        })
+
+        output = StringIO()
+        with redirect_stdout(output):
+            sys.argv = ['extract_images.py', source, '--inventory', '--types', 'png,jpg']
+            extract_images.main()
+
+        document = json.loads(output.getvalue())
+        assert document['file'] == source
+        assert document['images'] == [{'source': 'images/chart.png', 'media_type': 'image/png', 'format': 'png',
+                                       'width': 640, 'height': 480, 'size': len(headers['png']), 'cover': False}]
+        assert not (Path(output_dir) / 'cli_inventory_images').exists()
+
     def test_extract_images_handles_no_images(self, test_epub, output_dir):
         """测试处理没有图片的 EPUB"""
         import extract_images
@@ -222,6 +920,38 @@ class TestExtractImages:
         assert Path(output_dir).exists()
 
 
+def create_book_with_resources(output_path, title='资源测试书', chapter_count=2,
+                                image=b'\x89PNG\r\n\x1a\n' + b'\x00' * 2048,
+                                style=b'body { margin: 0; }\n' * 64):
+    """创建包含图片和样式表、章节引用这些资源的 EPUB"""
+    book = epub.EpubBook()
+    book.set_identifier(f'resources_{title}')
+    book.set_title(title)
+    book.set_language('zh-CN')
+    book.add_author('测试作者')
+
+    chapters = []
+    for num in range(1, chapter_count + 1):
+        chapter = epub.EpubHtml(title=f'第{num}章', file_name=f'text/chap{num:02d}.xhtml')
+        chapter.content = (f'<h1>第{num}章</h1><p>{title} 的内容 {num}</p>'
+                           '<img src="../images/logo.png" alt="logo"/>')
+        chapter.add_link(href='../styles/main.css', rel='stylesheet', type='text/css')
+        book.add_item(chapter)
+        chapters.append(chapter)
+
+    book.add_item(epub.EpubImage(uid='logo', file_name='images/logo.png',
+                                 media_type='image/png', content=image))
+    book.add_item(epub.EpubItem(uid='main_css', file_name='styles/main.css',
+                                media_type='text/css', content=style))
+
+    book.toc = tuple(chapters)
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ['nav', *chapters]
+    epub.write_epub(output_path, book, {})
+    return output_path
+
+
 class TestMergeEpubs:
     """测试 EPUB 合并功能"""
 
@@ -256,6 +986,543 @@ class TestMergeEpubs:
                    if item.get_type() == ITEM_DOCUMENT]
         assert len(chapters) > 0
 
+    def test_merge_copies_members_without_recompressing(self, output_dir):
+        """测试图片、样式和章节按原始压缩数据搬运"""
+        import merge_epubs
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'res_{i}.epub'), f'书{i}')
+                 for i in range(2)]
+        output_epub = get_test_output_path(output_dir, 'merged_raw.epub')
+
+        with redirect_stdout(StringIO()):
+            merge_epubs.merge_epubs(books, output_epub, dedup=False)
+
+        with zipfile.ZipFile(output_epub) as merged:
+            assert merged.testzip() is None
+            assert merged.namelist()[0] == 'mimetype'
+            for num, book in enumerate(books, start=1):
+                with zipfile.ZipFile(book) as source:
+                    for name in ['EPUB/images/logo.png', 'EPUB/styles/main.css', 'EPUB/text/chap01.xhtml']:
+                        original = source.getinfo(name)
+                        copied = merged.getinfo(f'EPUB/book{num}/' + name[len('EPUB/'):])
+                        assert (copied.CRC, copied.compress_size, copied.compress_type) == \
+                            (original.CRC, original.compress_size, original.compress_type)
+                        assert merged.read(copied) == source.read(original)
+
+    def test_merge_keeps_spine_order_and_relative_links(self, output_dir):
+        """测试合并后的书脊顺序、目录和书内相对链接"""
+        import merge_epubs
+        from epub_zip import read_package
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'order_{i}.epub'), f'书{i}',
+                                            chapter_count=3)
+                 for i in range(3)]
+        output_epub = get_test_output_path(output_dir, 'merged_order.epub')
+
+        with redirect_stdout(StringIO()):
+            merge_epubs.merge_epubs(books, output_epub, dedup=False)
+
+        with zipfile.ZipFile(output_epub) as merged:
+            package = read_package(merged)
+            paths = [item.path for item in package.iter_spine_items()]
+            assert paths == [f'EPUB/book{b}/text/chap{c:02d}.xhtml' for b in range(1, 4) for c in range(1, 4)]
+            # 章节中的 ../images/logo.png 在合并后仍指向同一本书的图片
+            assert 'EPUB/book2/images/logo.png' in merged.namelist()
+
+        merged_book = epub.read_epub(output_epub)
+        assert [link.title for link in merged_book.toc][:2] == ['书0 - 第1章', '书0 - 第2章']
+        assert len(merged_book.toc) == 9
+
+    def test_merge_memory_independent_of_input_count(self, output_dir):
+        """测试逐本合并时峰值内存不随输入数量线性增长"""
+        import tracemalloc
+
+        import merge_epubs
+
+        # 不可压缩的图片,使输入总量与实际需要搬运的数据量一致
+        image = os.urandom(128 * 1024)
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'vol_{i}.epub'), f'卷{i}',
+                                            chapter_count=4, image=image)
+                 for i in range(40)]
+        input_size = sum(os.path.getsize(book) for book in books)
+
+        peaks = {}
+        for count in [5, 40]:
+            tracemalloc.start()
+            with redirect_stdout(StringIO()):
+                merge_epubs.merge_epubs(books[:count], get_test_output_path(output_dir, f'series_{count}.epub'))
+            peaks[count] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        # 输入增加 8 倍,增长的只有索引
+        assert peaks[40] < peaks[5] * 4
+        assert peaks[40] < input_size / 4
+
+    def test_main_with_files_from(self, output_dir):
+        """测试 --files-from 从列表文件读取输入"""
+        import merge_epubs
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'list_{i}.epub'), f'书{i}')
+                 for i in range(3)]
+        list_file = Path(output_dir) / 'inputs.txt'
+        list_file.write_text('\n'.join(books) + '\n\n', encoding='utf-8')
+        output_epub = Path(output_dir) / 'from_list.epub'
+
+        output = StringIO()
+        with redirect_stdout(output):
+            sys.argv = ['merge_epubs.py', str(output_epub), '--files-from', str(list_file)]
+            merge_epubs.main()
+
+        assert '总章节数: 6' in output.getvalue()
+        assert output_epub.exists()
+
+    def test_merge_prefetch_preserves_input_order(self, output_dir):
+        """测试后台预读时输出顺序与输入顺序一致"""
+        import merge_epubs
+        from epub_zip import read_package
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'pre_{i}.epub'), f'书{i}')
+                 for i in range(6)]
+        # 中间混入一个不存在的文件,编号仍按输入位置分配
+        inputs = [*books[:3], str(Path(output_dir) / 'missing.epub'), *books[3:]]
+
+        results = {}
+        for prefetch in [0, 3]:
+            output_epub = get_test_output_path(output_dir, f'prefetch_{prefetch}.epub')
+            with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+                merge_epubs.merge_epubs(inputs, output_epub, prefetch=prefetch)
+            with zipfile.ZipFile(output_epub) as merged:
+                package = read_package(merged)
+                results[prefetch] = ([item.path for item in package.iter_spine_items()], merged.namelist())
+
+        assert results[0] == results[3]
+        assert results[3][0][0] == 'EPUB/book1/text/chap01.xhtml'
+        assert results[3][0][-1] == 'EPUB/book7/text/chap02.xhtml'
+
+    def test_merge_prefetch_overlaps_preparation(self, output_dir, monkeypatch):
+        """测试后面几本书的准备工作并发进行"""
+        import time
+
+        import merge_epubs
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'slow_{i}.epub'), f'书{i}')
+                 for i in range(6)]
+        original_prepare = merge_epubs.prepare_book
+
+        def slow_prepare(input_file, book_num):
+            time.sleep(0.1)
+            return original_prepare(input_file, book_num)
+
+        monkeypatch.setattr(merge_epubs, 'prepare_book', slow_prepare)
+
+        start_time = time.time()
+        prepared = list(merge_epubs.iter_prepared_books(books, prefetch=3))
+        elapsed_time = time.time() - start_time
+
+        assert [book.book_num for _, book in prepared] == [1, 2, 3, 4, 5, 6]
+        # 串行需要 0.6 秒
+        assert elapsed_time < 0.45
+
+    def test_merge_prefetch_warms_inputs_in_background(self, output_dir, monkeypatch):
+        """测试预读时在后台线程中读取后面几本书的数据,不预读时不读取"""
+        import threading
+
+        import merge_epubs
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'warm_{i}.epub'), f'书{i}')
+                 for i in range(3)]
+        warmed = []
+        original_warm = merge_epubs.warm_input
+
+        def recording_warm(input_file):
+            warmed.append((input_file, threading.current_thread() is threading.main_thread()))
+            original_warm(input_file)
+
+        monkeypatch.setattr(merge_epubs, 'warm_input', recording_warm)
+
+        list(merge_epubs.iter_prepared_books(books, prefetch=0))
+        assert warmed == []
+
+        list(merge_epubs.iter_prepared_books(books, prefetch=2))
+        assert sorted(warmed) == [(book, False) for book in books]
+
+    def _assert_references_resolve(self, merged):
+        """检查合并结果中章节和样式表的所有相对引用都指向存在的成员"""
+        import merge_epubs
+        from epub_zip import iter_css_references, resolve_reference
+
+        names = set(merged.namelist())
+        for name in names:
+            if name.endswith('.xhtml'):
+                text = merged.read(name).decode('utf-8')
+                references = [m.group(3) for m in merge_epubs.HTML_REFERENCE_RE.finditer(text)]
+            elif name.endswith('.css'):
+                references = list(iter_css_references(merged.read(name).decode('utf-8')))
+            else:
+                continue
+            for reference in references:
+                target = resolve_reference(name, reference)
+                if target is not None:
+                    assert target in names, f'{name} 引用了不存在的 {reference}'
+
+    def test_merge_deduplicates_shared_resources(self, output_dir):
+        """测试各书相同的图片和样式表只保存一份,引用改写到规范副本"""
+        import merge_epubs
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'series_{i}.epub'), f'卷{i}')
+                 for i in range(3)]
+        dedup_epub = get_test_output_path(output_dir, 'dedup.epub')
+        plain_epub = get_test_output_path(output_dir, 'plain.epub')
+
+        with redirect_stdout(StringIO()) as output:
+            stats = merge_epubs.merge_epubs(books, dedup_epub)
+            merge_epubs.merge_epubs(books, plain_epub, dedup=False)
+
+        assert stats['duplicates'] == 4
+        assert stats['bytes_saved'] > 0
+        assert '去重资源: 4 个' in output.getvalue()
+        assert os.path.getsize(dedup_epub) < os.path.getsize(plain_epub)
+
+        with zipfile.ZipFile(dedup_epub) as merged:
+            names = merged.namelist()
+            assert [name for name in names if name.endswith('logo.png')] == ['EPUB/book1/images/logo.png']
+            assert [name for name in names if name.endswith('.css')] == ['EPUB/book1/styles/main.css']
+            chapter = merged.read('EPUB/book3/text/chap01.xhtml').decode('utf-8')
+            assert 'src="../../book1/images/logo.png"' in chapter
+            assert 'href="../../book1/styles/main.css"' in chapter
+            self._assert_references_resolve(merged)
+
+        merged_book = epub.read_epub(dedup_epub)
+        assert len(merged_book.toc) == 6
+
+    def test_merge_keeps_resources_with_different_content(self, output_dir):
+        """测试同名但内容不同的资源,以及引用了不同资源的同一样式表都不会被去重"""
+        import merge_epubs
+
+        style = b'body { background: url("../images/logo.png"); }'
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'diff_{i}.epub'), f'书{i}',
+                                            image=b'\x89PNG\r\n\x1a\n' + bytes([i]) * 512, style=style)
+                 for i in range(2)]
+        output_epub = get_test_output_path(output_dir, 'diff_merged.epub')
+
+        with redirect_stdout(StringIO()):
+            stats = merge_epubs.merge_epubs(books, output_epub)
+
+        assert stats['duplicates'] == 0
+        with zipfile.ZipFile(output_epub) as merged:
+            assert 'EPUB/book2/images/logo.png' in merged.namelist()
+            assert 'EPUB/book2/styles/main.css' in merged.namelist()
+            self._assert_references_resolve(merged)
+
+    def test_merge_dedup_with_imported_stylesheet(self, output_dir):
+        """测试样式表 @import 了 manifest 中排在后面的样式表时,去重后引用仍然有效"""
+        import merge_epubs
+
+        books = []
+        for i in range(2):
+            book = epub.EpubBook()
+            book.set_identifier('import_css')
+            book.set_title('导入样式测试')
+            book.set_language('zh-CN')
+            chapter = epub.EpubHtml(title='第1章', file_name='chap01.xhtml')
+            chapter.content = '<h1>第1章</h1><p>内容</p>'
+            chapter.add_link(href='a.css', rel='stylesheet', type='text/css')
+            book.add_item(chapter)
+            # a.css 在 manifest 中排在它导入的 b.css 之前
+            book.add_item(epub.EpubItem(uid='a_css', file_name='a.css', media_type='text/css',
+                                        content=b'@import "b.css";\nbody { margin: 0; }\n'))
+            book.add_item(epub.EpubItem(uid='b_css', file_name='b.css', media_type='text/css',
+                                        content=b'p { color: black; }\n'))
+            book.add_item(epub.EpubNcx())
+            book.spine = [chapter]
+            path = get_test_output_path(output_dir, f'import_{i}.epub')
+            epub.write_epub(path, book, {})
+            books.append(path)
+        output_epub = get_test_output_path(output_dir, 'import_merged.epub')
+
+        with redirect_stdout(StringIO()):
+            stats = merge_epubs.merge_epubs(books, output_epub)
+
+        assert stats['duplicates'] == 2
+        with zipfile.ZipFile(output_epub) as merged:
+            assert [name for name in merged.namelist() if name.endswith('.css')] == [
+                'EPUB/book1/b.css', 'EPUB/book1/a.css']
+            self._assert_references_resolve(merged)
+
+    def _create_book_with_svg(self, output_path, svg, picture):
+        """创建章节引用 SVG、SVG 又引用 PNG 的 EPUB"""
+        book = epub.EpubBook()
+        book.set_identifier('svg_book')
+        book.set_title('SVG 测试')
+        book.set_language('zh-CN')
+        chapter = epub.EpubHtml(title='第1章', file_name='chap01.xhtml')
+        chapter.content = '<h1>第1章</h1><img src="images/frame.svg" alt="frame"/>'
+        book.add_item(chapter)
+        book.add_item(epub.EpubImage(uid='frame', file_name='images/frame.svg', media_type='image/svg+xml',
+                                     content=svg))
+        book.add_item(epub.EpubImage(uid='pic', file_name='images/pic.png', media_type='image/png',
+                                     content=picture))
+        book.add_item(epub.EpubNcx())
+        book.spine = [chapter]
+        epub.write_epub(output_path, book, {})
+        return output_path
+
+    def _svg_targets(self, merged, name):
+        """SVG 中各引用解析后的成员路径"""
+        import merge_epubs
+        from epub_zip import resolve_reference
+
+        text = merged.read(name).decode('utf-8')
+        return [resolve_reference(name, m.group(3)) for m in merge_epubs.HTML_REFERENCE_RE.finditer(text)]
+
+    @pytest.mark.parametrize('shared', ['svg', 'png'])
+    def test_merge_dedup_keeps_svg_references_valid(self, output_dir, shared):
+        """测试 SVG 不按内容去重,其中指向被去重图片的引用会被改写"""
+        import merge_epubs
+
+        svg_template = ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">'
+                        '<image xlink:href="pic.png"/>{}</svg>')
+        books = []
+        for i in range(2):
+            svg = svg_template.format('' if shared == 'svg' else f'<!-- {i} -->').encode('utf-8')
+            picture = b'\x89PNG\r\n\x1a\n' + (bytes([i]) if shared == 'svg' else b'\x00') * 512
+            books.append(self._create_book_with_svg(get_test_output_path(output_dir, f'svg_{shared}_{i}.epub'),
+                                                    svg, picture))
+        output_epub = get_test_output_path(output_dir, f'svg_{shared}_merged.epub')
+
+        with redirect_stdout(StringIO()):
+            stats = merge_epubs.merge_epubs(books, output_epub)
+
+        with zipfile.ZipFile(output_epub) as merged:
+            names = set(merged.namelist())
+            assert 'EPUB/book2/images/frame.svg' in names
+            chapter = merged.read('EPUB/book2/chap01.xhtml').decode('utf-8')
+            assert 'src="images/frame.svg"' in chapter
+            if shared == 'svg':
+                assert stats['duplicates'] == 0
+                assert self._svg_targets(merged, 'EPUB/book2/images/frame.svg') == ['EPUB/book2/images/pic.png']
+            else:
+                assert stats['duplicates'] == 1
+                assert 'EPUB/book2/images/pic.png' not in names
+                assert self._svg_targets(merged, 'EPUB/book2/images/frame.svg') == ['EPUB/book1/images/pic.png']
+            self._assert_references_resolve(merged)
+
+    def test_main_with_no_dedup(self, output_dir):
+        """测试 --no-dedup 选项"""
+        import merge_epubs
+
+        books = [create_book_with_resources(get_test_output_path(output_dir, f'nodedup_{i}.epub'), f'书{i}')
+                 for i in range(2)]
+        output_epub = Path(output_dir) / 'nodedup.epub'
+
+        output = StringIO()
+        with redirect_stdout(output):
+            sys.argv = ['merge_epubs.py', str(output_epub), *books, '--no-dedup']
+            merge_epubs.main()
+
+        assert '去重资源' not in output.getvalue()
+        with zipfile.ZipFile(output_epub) as merged:
+            assert 'EPUB/book2/images/logo.png' in merged.namelist()
+
+    def test_merge_without_chapters(self, output_dir):
+        """测试没有任何可用输入时报错且不留下输出文件"""
+        import merge_epubs
+
+        output_epub = Path(output_dir) / 'empty_merge.epub'
+
+        with redirect_stderr(StringIO()), pytest.raises(RuntimeError, match="没有找到任何章节"):
+            merge_epubs.merge_epubs([str(Path(output_dir) / 'missing.epub')], str(output_epub))
+
+        assert not output_epub.exists()
+
+    def test_failed_merge_keeps_existing_output(self, output_dir):
+        """测试合并失败时已有的输出文件保持不变,也不留下临时文件"""
+        import merge_epubs
+
+        target_dir = Path(output_dir) / 'existing'
+        target_dir.mkdir()
+        output_epub = target_dir / 'merged.epub'
+        output_epub.write_bytes(b'previous result')
+
+        with redirect_stderr(StringIO()), pytest.raises(RuntimeError):
+            merge_epubs.merge_epubs([str(Path(output_dir) / 'missing.epub')], str(output_epub))
+
+        assert output_epub.read_bytes() == b'previous result'
+        assert os.listdir(target_dir) == ['merged.epub']
+
+
+class TestCatalogMetadata:
+    """测试批量元数据目录功能"""
+
+    def _create_library(self, output_dir, count=3):
+        library = Path(output_dir) / 'library'
+        (library / 'sub').mkdir(parents=True)
+        for i in range(count):
+            create_simple_epub(title=f'书籍 {i}', output_path=str(library / 'sub' / f'book_{i}.epub'))
+        (library / 'broken.epub').write_bytes(b'not an epub')
+        (library / 'notes.txt').write_text('ignored')
+        return library
+
+    def test_catalog_jsonl_records(self, output_dir):
+        """测试 JSONL 输出保持 extract_metadata 的记录格式"""
+        import catalog_metadata
+        import extract_metadata
+
+        library = self._create_library(output_dir)
+        epub_paths = list(catalog_metadata.iter_epub_files([str(library)]))
+        assert len(epub_paths) == 4
+
+        output = StringIO()
+        stats = catalog_metadata.catalog_metadata(
+            epub_paths, [catalog_metadata.JsonlWriter(output)], jobs=1)
+
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert stats == {'total': 4, 'ok': 3, 'errors': 1}
+        assert records[0]['error']
+        assert records[1] == extract_metadata.extract_metadata(epub_paths[1])
+
+    def test_catalog_parallel_keeps_order(self, output_dir):
+        """测试进程池并行时记录顺序与输入一致"""
+        import catalog_metadata
+
+        library = self._create_library(output_dir, count=4)
+        epub_paths = list(catalog_metadata.iter_epub_files([str(library)]))
+
+        records = list(catalog_metadata.iter_catalog_records(epub_paths, jobs=2))
+
+        assert [r['file'] for r in records] == epub_paths
+
+    def test_catalog_sqlite_upsert(self, output_dir):
+        """测试 SQLite 目录按路径更新而不重复插入"""
+        import catalog_metadata
+
+        library = self._create_library(output_dir)
+        epub_paths = list(catalog_metadata.iter_epub_files([str(library)]))
+        db_path = str(Path(output_dir) / 'catalog.db')
+
+        for _ in range(2):
+            writer = catalog_metadata.SqliteWriter(db_path)
+            catalog_metadata.catalog_metadata(epub_paths, [writer], jobs=1)
+            writer.close()
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('SELECT title, authors, error FROM books ORDER BY file').fetchall()
+        conn.close()
+
+        assert len(rows) == 4
+        assert rows[0][2] is not None
+        assert rows[1][0] == '书籍 0'
+        assert json.loads(rows[1][1]) == ['测试作者']
+
+    def test_incremental_refresh(self, output_dir):
+        """测试增量刷新只重新提取新增和修改过的书籍"""
+        import catalog_metadata
+
+        library = self._create_library(output_dir)
+        db_path = str(Path(output_dir) / 'catalog.db')
+
+        def refresh():
+            writer = catalog_metadata.SqliteWriter(db_path)
+            stats = catalog_metadata.refresh_catalog([str(library)], writer, jobs=1)
+            writer.close()
+            return stats
+
+        first = refresh()
+        assert first['extracted'] == 4
+
+        # 没有任何变化
+        second = refresh()
+        assert second['extracted'] == 0
+        assert second['unchanged'] == 4
+
+        # 修改一本、只改 mtime 一本、删除一本、新增一本
+        book_0 = library / 'sub' / 'book_0.epub'
+        create_simple_epub(title='修改后的书名', output_path=str(book_0))
+        book_1 = library / 'sub' / 'book_1.epub'
+        st = book_1.stat()
+        os.utime(book_1, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        (library / 'sub' / 'book_2.epub').unlink()
+        create_simple_epub(title='新书', output_path=str(library / 'new.epub'))
+
+        third = refresh()
+        assert third['touched'] == 1
+        assert third['deleted'] == 1
+        assert third['extracted'] == 2
+
+        conn = sqlite3.connect(db_path)
+        rows = dict(conn.execute('SELECT file, deleted FROM books').fetchall())
+        title = conn.execute('SELECT title FROM books WHERE file = ?', (str(book_0),)).fetchone()[0]
+        conn.close()
+
+        assert rows[str(library / 'sub' / 'book_2.epub')] == 1
+        assert rows[str(library / 'new.epub')] == 0
+        assert title == '修改后的书名'
+
+    def test_incremental_refresh_normalizes_paths(self, output_dir, monkeypatch):
+        """测试同一书库换一种路径写法刷新时不重新提取,删除的书仍被标记"""
+        import catalog_metadata
+
+        library = self._create_library(output_dir)
+        db_path = str(Path(output_dir) / 'catalog.db')
+
+        def refresh(path):
+            writer = catalog_metadata.SqliteWriter(db_path)
+            stats = catalog_metadata.refresh_catalog([path], writer, jobs=1)
+            writer.close()
+            return stats
+
+        assert refresh(str(library))['extracted'] == 4
+
+        monkeypatch.chdir(output_dir)
+        (library / 'sub' / 'book_2.epub').unlink()
+        stats = refresh('./library/')
+        assert stats['extracted'] == 0
+        assert stats['unchanged'] == 3
+        assert stats['deleted'] == 1
+
+        conn = sqlite3.connect(db_path)
+        files = [row[0] for row in conn.execute('SELECT file FROM books')]
+        conn.close()
+        assert len(files) == 4
+        assert all(file.startswith(str(library)) for file in files)
+
+    def test_catalog_jsonl_skips_fingerprint(self, output_dir, monkeypatch):
+        """测试只输出 JSONL 时不计算文件指纹"""
+        import catalog_metadata
+
+        library = self._create_library(output_dir, count=2)
+
+        def fail(path, size):
+            raise AssertionError('不应计算指纹')
+
+        monkeypatch.setattr(catalog_metadata, 'file_fingerprint', fail)
+        output = StringIO()
+        stats = catalog_metadata.catalog_metadata(
+            list(catalog_metadata.iter_epub_files([str(library)])), [catalog_metadata.JsonlWriter(output)], jobs=1)
+
+        assert stats['total'] == 3
+
+    def test_fingerprint_covers_large_central_directory(self, output_dir):
+        """测试中央目录超过尾部块时,其中任何成员的变化都会改变指纹"""
+        import catalog_metadata
+
+        def write_zip(path, changed):
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as zf:
+                for num in range(3000):
+                    info = zipfile.ZipInfo(f'OEBPS/text/chapter_{num:05d}_with_a_long_name.xhtml',
+                                           date_time=(2020, 1, 1, 0, 0, 0))
+                    data = b'b' if changed and num == 1500 else b'a'
+                    zf.writestr(info, data * 100)
+            return path
+
+        original = write_zip(Path(output_dir) / 'original.zip', False)
+        changed = write_zip(Path(output_dir) / 'changed.zip', True)
+        size = original.stat().st_size
+        assert changed.stat().st_size == size
+
+        assert catalog_metadata.file_fingerprint(original, size) != \
+            catalog_metadata.file_fingerprint(changed, size)
+
 
 class TestIntegration:
     """集成测试 - 测试多个脚本的组合使用"""
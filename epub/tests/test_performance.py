@@ -53,6 +53,53 @@ class TestPerformance:
 
         print(f"\n✓ 性能测试: 提取 50 章 EPUB 耗时 {elapsed_time:.2f}秒")
 
+    def test_lxml_parser_faster_than_html_parser(self, output_dir):
+        """测试 lxml 后端的文本提取快于纯 Python 解析器"""
+        import extract_text
+
+        large_epub = create_large_epub(chapter_count=50, output_path=get_test_output_path(output_dir, 'parsers.epub'))
+
+        elapsed = {}
+        for parser in ['html.parser', 'lxml']:
+            start_time = time.time()
+            for _ in range(3):
+                extract_text.extract_text_from_epub(large_epub, parser=parser)
+            elapsed[parser] = time.time() - start_time
+
+        assert elapsed['lxml'] < elapsed['html.parser'], \
+            f"lxml 耗时 {elapsed['lxml']:.2f}秒,html.parser 耗时 {elapsed['html.parser']:.2f}秒"
+
+        print(f"\n✓ 性能测试: lxml 比 html.parser 快 {elapsed['html.parser'] / elapsed['lxml']:.1f} 倍")
+
+    def test_html_to_markdown_scales_linearly(self):
+        """测试 Markdown 转换耗时随章节大小线性增长"""
+        import extract_chapters
+        from html_engine import parse_html
+
+        block = (
+            '<h2>小节</h2><p>正文 <strong>粗体 <em>斜体</em></strong> 和 <a href="#x">链接</a></p>'
+            '<ul><li>条目一</li><li>条目二 <code>code</code></li></ul>'
+            '<blockquote><p>引用内容</p></blockquote>'
+        )
+        unit = len(block.encode('utf-8'))
+
+        def convert(size):
+            html = '<html><body>' + block * (size // unit) + '</body></html>'
+            doc = parse_html(html)
+            start_time = time.perf_counter()
+            markdown = extract_chapters.html_to_markdown(doc)
+            return time.perf_counter() - start_time, markdown
+
+        small_time, _ = convert(1250 * 1024)
+        large_time, markdown = convert(5 * 1024 * 1024)
+
+        assert markdown.count('**粗体 *斜体***') == (5 * 1024 * 1024) // unit
+        # 输入增大 4 倍,耗时应接近 4 倍;留出余量但排除二次增长
+        assert large_time < small_time * 8, \
+            f"1.25MB 耗时 {small_time:.2f}秒,5MB 耗时 {large_time:.2f}秒"
+
+        print(f"\n✓ 性能测试: 5MB 章节转换 Markdown 耗时 {large_time:.2f}秒 (1.25MB: {small_time:.2f}秒)")
+
     def test_extract_chapters_performance(self, output_dir):
         """测试章节抽取的性能"""
         import extract_chapters
@@ -235,6 +282,101 @@ class TestStress:
 
         print(f"\n✓ 内存测试: 处理 50 章使用峰值内存 {peak_mb:.1f}MB")
 
+    def test_extract_chapters_streams_output(self, output_dir):
+        """测试章节抽取边转换边写出,峰值内存远小于输出总量"""
+        import tracemalloc
+
+        import extract_chapters
+
+        paragraph = '<p>用于测试章节抽取内存占用的段落内容,' + '文字' * 40 + '</p>\n'
+        chapters = [{'title': f'第{i}章', 'content': f'<h1>第{i}章</h1>' + paragraph * 400}
+                    for i in range(1, 41)]
+        book = create_simple_epub(chapters=chapters,
+                                  output_path=get_test_output_path(output_dir, 'stream_chapters.epub'))
+        target = Path(output_dir) / 'stream_chapters'
+
+        tracemalloc.start()
+        extract_chapters.extract_chapters(book, str(target), output_format='md', generate_toc=True)
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        output_size = len((target / 'chapters.md').read_text(encoding='utf-8'))
+        # 输出约 160 万字符;逐章写出时峰值只与单章大小有关
+        assert output_size > 1500000
+        assert peak < output_size, \
+            f"峰值内存 {peak / 1024 / 1024:.1f}MB,输出 {output_size} 字符"
+
+        print(f"\n✓ 内存测试: 抽取 40 章峰值内存 {peak / 1024 / 1024:.1f}MB")
+
+    def test_stream_memory_bounded_for_giant_chapter(self, output_dir):
+        """测试流式提取单个超大章节时内存占用有界"""
+        import tracemalloc
+
+        import extract_text
+
+        paragraph = '<p>这是一个很长的段落,<em>用于</em>测试流式解析的内存占用。</p>\n'
+        giant_epub = create_simple_epub(
+            chapters=[{'title': '整本书', 'content': paragraph * 100000}],
+            output_path=get_test_output_path(output_dir, 'giant.epub')
+        )
+
+        tracemalloc.start()
+        total = 0
+        for piece in extract_text.stream_text_from_epub(giant_epub):
+            total += len(piece)
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # 章节约 9MB,流式解析的峰值内存应远小于章节本身
+        assert total > 2000000
+        peak_mb = peak / 1024 / 1024
+        assert peak_mb < 5, \
+            f"流式提取峰值内存 {peak_mb:.1f}MB,超过阈值 5MB"
+
+        print(f"\n✓ 内存测试: 流式提取超大章节峰值内存 {peak_mb:.1f}MB")
+
+    def test_extract_images_streams_to_disk(self, output_dir):
+        """测试提取图片时逐块写出,峰值内存与图片总量无关"""
+        import tracemalloc
+        from contextlib import redirect_stdout
+        from io import StringIO
+
+        import extract_images
+
+        book = epub.EpubBook()
+        book.set_identifier('artwork')
+        book.set_title('画册')
+        book.set_language('zh')
+        chapter = epub.EpubHtml(title='画', file_name='chap.xhtml')
+        chapter.content = '<html><body><p>画</p></body></html>'
+        book.add_item(chapter)
+        for num in range(4):
+            image = epub.EpubItem(uid=f'img{num}', file_name=f'images/plate{num}.png', media_type='image/png',
+                                  content=os.urandom(4 * 1024 * 1024))
+            book.add_item(image)
+        book.add_item(epub.EpubNcx())
+        book.add_item(epub.EpubNav())
+        book.spine = ['nav', chapter]
+        artwork = get_test_output_path(output_dir, 'artwork.epub')
+        epub.write_epub(artwork, book, {})
+        del book, image
+
+        target = Path(output_dir) / 'plates'
+        tracemalloc.start()
+        with redirect_stdout(StringIO()):
+            extract_images.extract_images(artwork, str(target))
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        total = sum(path.stat().st_size for path in target.iterdir())
+        assert total == 16 * 1024 * 1024
+        # 16MB 图片,峰值只应是几个复制缓冲区
+        peak_mb = peak / 1024 / 1024
+        assert peak_mb < 2, \
+            f"提取图片峰值内存 {peak_mb:.1f}MB,超过阈值 2MB"
+
+        print(f"\n✓ 内存测试: 提取 16MB 图片峰值内存 {peak_mb:.1f}MB")
+
 
 class TestEdgeCases:
     """边缘情况测试"""